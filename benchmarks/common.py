@@ -0,0 +1,32 @@
+"""Timing helpers shared by the benchmarks."""
+
+import timeit
+from collections.abc import Callable
+from typing import Any
+
+
+def result(benchmark: str, case: str, value: float, unit: str) -> dict[str, Any]:
+    """Return a benchmark result as saved by the suite.
+
+    Args:
+        benchmark (str): Name of the measurement, e.g. ``transition``.
+        case (str): Environment or machine measured, e.g. ``office_world``.
+        value (float): Measured value.
+        unit (str): Unit of the value. Rates end in ``/s`` and are better when
+            higher, every other unit is a time and is better when lower.
+
+    Returns:
+        dict[str, Any]: The result.
+    """
+    return {"benchmark": benchmark, "case": case, "value": value, "unit": unit}
+
+
+def best_time(fn: Callable[[], Any], repeat: int = 3) -> float:
+    """Return the best time of a call of ``fn`` in seconds.
+
+    ``fn`` is called often enough for each of the ``repeat`` measurements to
+    take at least 0.2 seconds.
+    """
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
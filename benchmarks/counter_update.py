@@ -0,0 +1,75 @@
+"""Micro-benchmark of the per-step counter update in `transition`.
+
+Compares the NumPy-based counter update used previously with the plain-int
+tuple arithmetic now used by `CountingRewardMachine.transition`, and times a
+full transition of the Office World counting reward machine.
+
+Run from the repository root with `python -m benchmarks.counter_update`.
+"""
+
+import timeit
+from operator import add
+
+import numpy as np
+
+from benchmarks.common import result
+from examples.crm.tabular.core.label import Symbol
+from examples.crm.tabular.core.machine import OfficeWorldCountingRewardMachine
+
+NUMBER = 200_000
+WIDTHS = (1, 2, 4)
+
+
+def numpy_update(c: tuple[int, ...], c_delta: tuple[int, ...]) -> tuple:
+    """Counter update used before tuple-native arithmetic."""
+    return tuple(np.array(c) + np.array(c_delta))
+
+
+def tuple_update(c: tuple[int, ...], c_delta: tuple[int, ...]) -> tuple:
+    """Counter update used by `CountingRewardMachine.transition`."""
+    return tuple(map(add, c, c_delta))
+
+
+def per_call_ns(stmt, number: int = NUMBER) -> float:
+    """Return the best per-call time of a statement in nanoseconds."""
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1e9
+
+
+def collect(number: int = NUMBER) -> list[dict]:
+    """Return the per-call time of each counter update as suite results."""
+    results = []
+    for width in WIDTHS:
+        c = tuple(range(1, width + 1))
+        c_delta = tuple(-1 for _ in range(width))
+        for name, update in (("numpy", numpy_update), ("tuple", tuple_update)):
+            ns = per_call_ns(lambda c=c, d=c_delta, f=update: f(c, d), number)
+            results.append(result(f"counter_update_{name}", f"width_{width}", ns, "ns"))
+    return results
+
+
+def main() -> None:
+    """Run the benchmark."""
+    timings = {(r["benchmark"], r["case"]): r["value"] for r in collect()}
+    print(f"{'counter width':>14} {'numpy (ns)':>12} {'tuple (ns)':>12} {'speedup':>8}")
+    for width in WIDTHS:
+        numpy_ns = timings["counter_update_numpy", f"width_{width}"]
+        tuple_ns = timings["counter_update_tuple", f"width_{width}"]
+        print(
+            f"{width:>14} {numpy_ns:>12.0f} {tuple_ns:>12.0f} "
+            + f"{numpy_ns / tuple_ns:>7.1f}x"
+        )
+
+    crm = OfficeWorldCountingRewardMachine()
+    props = {Symbol.C}
+    transition_ns = per_call_ns(lambda: crm.transition(1, (2, 1), props))
+    crm.compile()
+    compiled_ns = per_call_ns(lambda: crm.transition(1, (2, 1), props))
+    print(f"\nOffice World transition: {transition_ns:.0f} ns")
+    print(f"Office World compiled transition: {compiled_ns:.0f} ns")
+
+    _, c_next, _ = crm.transition(1, (2, 1), props)
+    print(f"Counter element type: {type(c_next[0]).__name__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark of counterfactual rollout collection in the SB3 agents.
+
+Times environment steps of each counterfactual agent on Puck World with
+learning disabled, so only action selection, the environment step and
+counterfactual experience generation and storage are measured. Every agent
+shares the rollout loop of `CounterfactualMixin`.
+
+Run from the repository root with `python -m benchmarks.counterfactual_rollout`.
+"""
+
+import time
+from collections.abc import Callable
+
+import gymnasium as gym
+
+from examples.crm.continuous.core import PuckWorld as ContinuousPuckWorld
+from examples.crm.continuous.core import (
+    PuckWorldCountingRewardMachine as ContinuousPuckWorldCountingRewardMachine,
+)
+from examples.crm.continuous.core import (
+    PuckWorldCrossProduct as ContinuousPuckWorldCrossProduct,
+)
+from examples.crm.continuous.core import (
+    PuckWorldLabellingFunction as ContinuousPuckWorldLabellingFunction,
+)
+from examples.crm.discrete.core import (
+    PuckWorld,
+    PuckWorldCountingRewardMachine,
+    PuckWorldCrossProduct,
+    PuckWorldLabellingFunction,
+)
+from pycrm.agents.sb3.ddpg import CounterfactualDDPG
+from pycrm.agents.sb3.dqn import CounterfactualDQN
+from pycrm.agents.sb3.sac import CounterfactualSAC
+from pycrm.agents.sb3.td3 import CounterfactualTD3
+
+STEPS = 2_000
+
+
+def discrete_env() -> PuckWorldCrossProduct:
+    """Return the discrete-action Puck World cross product."""
+    return PuckWorldCrossProduct(
+        ground_env=PuckWorld(),
+        machine=PuckWorldCountingRewardMachine(),
+        lf=PuckWorldLabellingFunction(),
+        max_steps=1000,
+    )
+
+
+def continuous_env() -> ContinuousPuckWorldCrossProduct:
+    """Return the continuous-action Puck World cross product."""
+    return ContinuousPuckWorldCrossProduct(
+        ground_env=ContinuousPuckWorld(),
+        machine=ContinuousPuckWorldCountingRewardMachine(),
+        lf=ContinuousPuckWorldLabellingFunction(),
+        max_steps=1000,
+    )
+
+
+AGENTS = (
+    (CounterfactualDQN, discrete_env),
+    (CounterfactualSAC, continuous_env),
+    (CounterfactualTD3, continuous_env),
+    (CounterfactualDDPG, continuous_env),
+)
+
+
+def measure(
+    agent_cls: type, make_env: Callable[[], gym.Env], steps: int, learn: bool = False
+) -> tuple[float, float]:
+    """Time the environment steps of an agent.
+
+    Args:
+        agent_cls (type): Counterfactual agent to train.
+        make_env (Callable[[], gym.Env]): Function returning the environment.
+        steps (int): Number of environment steps.
+        learn (bool): Whether the agent also trains, after 100 warm-up steps.
+
+    Returns:
+        tuple[float, float]: Environment steps per second and counterfactual
+            transitions stored per step.
+    """
+    agent = agent_cls(
+        "MlpPolicy",
+        make_env(),
+        learning_starts=100 if learn else 10 * steps,
+        device="cpu",
+        seed=0,
+    )
+    start = time.perf_counter()
+    agent.learn(total_timesteps=steps)
+    elapsed = time.perf_counter() - start
+    return agent.num_timesteps / elapsed, agent.counterfactual_stored / steps
+
+
+def main() -> None:
+    """Run the benchmark."""
+    print(f"{'agent':>20} {'ms / step':>10} {'cf / step':>10}")
+    for agent_cls, make_env in AGENTS:
+        steps_per_second, counterfactuals = measure(agent_cls, make_env, STEPS)
+        print(
+            f"{agent_cls.__name__:>20} {1e3 / steps_per_second:>10.3f} "
+            + f"{counterfactuals:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
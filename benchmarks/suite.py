@@ -0,0 +1,329 @@
+"""Benchmark suite of the counting reward machine hot path.
+
+Measures each stage of an environment step in isolation on the bundled
+examples and on generated machines of increasing size:
+
+- ``construction`` and ``compile``: seconds to construct the machine and to
+  construct and compile its transition table, with cold compiler caches.
+- ``transition`` and ``transition_compiled``: ``CountingRewardMachine.transition``
+  calls per second, on the configurations and labels of a random rollout.
+- ``labelling``: ``LabellingFunction.__call__`` calls per second.
+- ``step`` and ``step_compiled``: ``CrossProduct.step`` calls per second.
+- ``counterfactual``: rows per second of ``generate_counterfactual_experience``.
+- ``rollout`` and ``end_to_end``: environment steps per second of the
+  counterfactual SB3 agents on Puck World, without and with training.
+- ``counter_update_*``: the counter update micro-benchmark.
+
+Results are saved as JSON, by default to ``benchmarks/results/<version>.json``,
+so results of releases can be compared with ``--compare``.
+
+Run from the repository root with `python -m benchmarks.suite`.
+"""
+
+import argparse
+import importlib.metadata
+import json
+import platform
+import re
+import subprocess
+import time
+from collections.abc import Callable
+from functools import partial
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import torch
+
+from benchmarks import counter_update, counterfactual_rollout
+from benchmarks.common import best_time, result
+from benchmarks.synthetic import SyntheticCrossProduct, make_synthetic
+from examples.crm.discrete.core import PuckWorldCountingRewardMachine
+from examples.crm.tabular.core.crossproduct import OfficeWorldCrossProduct
+from examples.crm.tabular.core.ground import OfficeWorld
+from examples.crm.tabular.core.label import OfficeWorldLabellingFunction
+from examples.crm.tabular.core.machine import OfficeWorldCountingRewardMachine
+from examples.introduction.core.crossproduct import LetterWorldCrossProduct
+from examples.introduction.core.ground import LetterWorld
+from examples.introduction.core.label import LetterWorldLabellingFunction
+from examples.introduction.core.machine import LetterWorldCountingRewardMachine
+from pycrm.agents.sb3.dqn import CounterfactualDQN
+from pycrm.agents.sb3.sac import CounterfactualSAC
+from pycrm.automaton.compiler import _compile_transition_expression
+from pycrm.crossproduct import CrossProduct
+from pycrm.label.bitmask import prop_bits
+
+ROOT = Path(__file__).parent.parent
+SYNTHETIC = {n: make_synthetic(n) for n in (10, 100, 1000)}
+
+
+def make_office_world() -> OfficeWorldCrossProduct:
+    """Return the tabular Office World cross product."""
+    return OfficeWorldCrossProduct(
+        ground_env=OfficeWorld(),
+        crm=OfficeWorldCountingRewardMachine(),
+        lf=OfficeWorldLabellingFunction(),
+        max_steps=500,
+    )
+
+
+def make_letter_world() -> LetterWorldCrossProduct:
+    """Return the Letter World cross product."""
+    return LetterWorldCrossProduct(
+        ground_env=LetterWorld(),
+        crm=LetterWorldCountingRewardMachine(),
+        lf=LetterWorldLabellingFunction(),
+        max_steps=500,
+    )
+
+
+# Case name to functions returning the cross product and a new machine
+CASES: dict[str, tuple[Callable[[], CrossProduct], Callable[[], Any]]] = {
+    "office_world": (make_office_world, OfficeWorldCountingRewardMachine),
+    "letter_world": (make_letter_world, LetterWorldCountingRewardMachine),
+    "puck_world": (
+        counterfactual_rollout.discrete_env,
+        PuckWorldCountingRewardMachine,
+    ),
+    **{
+        f"synthetic_{n}": (partial(SyntheticCrossProduct, synthetic), synthetic.machine)
+        for n, synthetic in SYNTHETIC.items()
+    },
+}
+
+
+def record(env: CrossProduct, n: int, seed: int = 0) -> list[tuple]:
+    """Record the transitions of a random rollout.
+
+    Returns:
+        list[tuple]: Machine state, counter configuration, ground observation,
+            action, next ground observation and labels of each step.
+    """
+    np.random.seed(seed)
+    env.action_space.seed(seed)
+    env.reset(seed=seed)
+    transitions = []
+    for _ in range(n):
+        u, c = env.u, env.c
+        action = env.action_space.sample()
+        _, _, terminated, truncated, _ = env.step(action)
+        transitions.append(
+            (u, c, env._ground_obs, action, env._ground_obs_next, env.props)
+        )
+        if terminated or truncated:
+            env.reset()
+    return transitions
+
+
+def measure_case(
+    name: str,
+    make_env: Callable[[], CrossProduct],
+    make_machine: Callable[[], Any],
+    n: int,
+    repeat: int,
+) -> list[dict]:
+    """Return the results of every hot path benchmark of a case."""
+    results = []
+
+    def add(benchmark: str, fn: Callable[[], Any], count: int = 0) -> None:
+        seconds = best_time(fn, repeat)
+        if count:
+            results.append(result(benchmark, name, count / seconds, "calls/s"))
+        else:
+            results.append(result(benchmark, name, seconds, "s"))
+
+    def construct() -> Any:
+        # Transition formulas are cached across machines, so clear the caches to
+        # time compiling them rather than a cache lookup
+        _compile_transition_expression.cache_clear()
+        prop_bits.cache_clear()
+        return make_machine()
+
+    add("construction", construct)
+    add("compile", lambda: construct().compile())
+
+    transitions = record(make_env(), n)
+    crm = make_machine()
+    configurations = [(u, c, props) for u, c, *_, props in transitions]
+
+    def transition() -> None:
+        for u, c, props in configurations:
+            crm.transition(u, c, props)
+
+    add("transition", transition, n)
+    crm.compile()
+    add("transition_compiled", transition, n)
+
+    lf = make_env().lf
+    labelled = [
+        (obs, action, next_obs) for _, _, obs, action, next_obs, _ in transitions
+    ]
+
+    def labelling() -> None:
+        for obs, action, next_obs in labelled:
+            lf(obs, action, next_obs)
+
+    add("labelling", labelling, n)
+
+    env = make_env()
+    actions = [action for _, _, _, action, _, _ in transitions]
+
+    def step() -> None:
+        np.random.seed(0)
+        env.reset(seed=0)
+        for action in actions:
+            _, _, terminated, truncated, _ = env.step(action)
+            if terminated or truncated:
+                env.reset()
+
+    add("step", step, n)
+    env.crm.compile()
+    add("step_compiled", step, n)
+
+    rows = sum(
+        len(env.generate_counterfactual_experience(obs, action, next_obs)[0])
+        for obs, action, next_obs in labelled
+    )
+
+    def counterfactual() -> None:
+        for obs, action, next_obs in labelled:
+            env.generate_counterfactual_experience(obs, action, next_obs)
+
+    seconds = best_time(counterfactual, repeat)
+    results.append(result("counterfactual", name, rows / seconds, "rows/s"))
+    return results
+
+
+def measure_agents(steps: int) -> list[dict]:
+    """Return the environment steps per second of the counterfactual agents."""
+    results = []
+    for agent_cls, make_env in counterfactual_rollout.AGENTS:
+        steps_per_second, _ = counterfactual_rollout.measure(agent_cls, make_env, steps)
+        results.append(
+            result("rollout", agent_cls.__name__, steps_per_second, "steps/s")
+        )
+    for agent_cls, make_env in (
+        (CounterfactualDQN, counterfactual_rollout.discrete_env),
+        (CounterfactualSAC, counterfactual_rollout.continuous_env),
+    ):
+        steps_per_second, _ = counterfactual_rollout.measure(
+            agent_cls, make_env, steps, learn=True
+        )
+        results.append(
+            result("end_to_end", agent_cls.__name__, steps_per_second, "steps/s")
+        )
+    return results
+
+
+def version() -> str:
+    """Return the version of the package."""
+    try:
+        return importlib.metadata.version("pyrewardmachines")
+    except importlib.metadata.PackageNotFoundError:
+        pyproject = (ROOT / "pyproject.toml").read_text()
+        match = re.search(r'^version = "(.+)"', pyproject, flags=re.MULTILINE)
+        return match.group(1) if match else "unknown"
+
+
+def metadata() -> dict[str, str]:
+    """Return the versions and machine the benchmarks ran on."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = "unknown"
+    return {
+        "version": version(),
+        "commit": commit,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+    }
+
+
+def report(results: list[dict]) -> list[dict]:
+    """Print results as they are measured and return them."""
+    for r in results:
+        print(f"{r['benchmark']:>28} {r['case']:>20} {r['value']:>14.6g} {r['unit']}")
+    return results
+
+
+def compare(results: list[dict], baseline: list[dict]) -> None:
+    """Print the speedup of every result over the same result of a baseline."""
+    previous = {(r["benchmark"], r["case"]): r for r in baseline}
+    print(f"\n{'benchmark':>28} {'case':>20} {'speedup':>8}")
+    for r in results:
+        old = previous.get((r["benchmark"], r["case"]))
+        if old is None or old["unit"] != r["unit"]:
+            continue
+        if r["unit"].endswith("/s"):
+            speedup = r["value"] / old["value"]
+        else:
+            speedup = old["value"] / r["value"]
+        print(f"{r['benchmark']:>28} {r['case']:>20} {speedup:>7.2f}x")
+
+
+def main() -> None:
+    """Run the benchmark suite."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark the counting reward machine hot path"
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="JSON file to save the results to",
+        default=ROOT / "benchmarks" / "results" / f"{version()}.json",
+    )
+    parser.add_argument(
+        "--compare",
+        type=Path,
+        help="JSON results of an earlier run to compare with",
+        default=None,
+    )
+    parser.add_argument(
+        "--cases",
+        nargs="+",
+        choices=list(CASES),
+        help="Cases to benchmark (default: all)",
+        default=list(CASES),
+    )
+    parser.add_argument(
+        "--no-agents",
+        action="store_true",
+        help="Skip the rollout and end-to-end agent benchmarks",
+    )
+    parser.add_argument(
+        "--quick",
+        action="store_true",
+        help="Run fewer, shorter measurements",
+    )
+    args = parser.parse_args()
+
+    n, repeat, steps = (200, 1, 300) if args.quick else (1_000, 3, 2_000)
+    results = []
+    for name in args.cases:
+        results += report(measure_case(name, *CASES[name], n=n, repeat=repeat))
+    if not args.no_agents:
+        results += report(measure_agents(steps))
+    results += report(counter_update.collect(20_000 if args.quick else 200_000))
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(
+        json.dumps({"metadata": metadata(), "results": results}, indent=2) + "\n"
+    )
+    print(f"\nSaved results to {args.output}")
+
+    if args.compare is not None:
+        compare(results, json.loads(args.compare.read_text())["results"])
+
+
+if __name__ == "__main__":
+    main()
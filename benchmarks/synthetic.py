@@ -0,0 +1,75 @@
+"""Synthetic cross products of configurable size for the benchmarks.
+
+Machines and labelling functions come from ``pycrm.automaton.generate_machine``.
+The ground environment emits random proposition indicator observations, which
+the generated labelling functions label.
+"""
+
+import gymnasium as gym
+import numpy as np
+
+from pycrm.automaton import SyntheticMachine, generate_machine
+from pycrm.crossproduct import CrossProduct
+
+
+class PropositionEnv(gym.Env):
+    """Ground environment raising each proposition at random on every step."""
+
+    def __init__(self, n_props: int, probability: float = 0.2) -> None:
+        """Initialise the ground environment.
+
+        Args:
+            n_props (int): Number of propositions.
+            probability (float): Probability of each proposition on a step.
+        """
+        super().__init__()
+        self.n_props = n_props
+        self.probability = probability
+        self.action_space = gym.spaces.Discrete(2)
+        self.observation_space = gym.spaces.Box(
+            low=0, high=1, shape=(n_props,), dtype=np.float32
+        )
+
+    def reset(
+        self, *, seed: int | None = None, options: dict | None = None
+    ) -> tuple[np.ndarray, dict]:
+        """Reset the ground environment."""
+        super().reset(seed=seed, options=options)
+        return np.zeros(self.n_props, dtype=np.float32), {}
+
+    def step(self, action: int) -> tuple[np.ndarray, float, bool, bool, dict]:
+        """Step the ground environment."""
+        obs = np.random.random(self.n_props) < self.probability
+        return obs.astype(np.float32), 0.0, False, False, {}
+
+
+class SyntheticCrossProduct(CrossProduct[np.ndarray, np.ndarray, int, None]):
+    """Cross product of the proposition environment and a generated machine."""
+
+    def __init__(self, synthetic: SyntheticMachine, max_steps: int = 1000) -> None:
+        """Initialise the cross product environment.
+
+        Args:
+            synthetic (SyntheticMachine): Generated machine and labelling
+                functions.
+            max_steps (int): Maximum number of steps per episode.
+        """
+        n_props = len(synthetic.props)  # type: ignore
+        super().__init__(
+            PropositionEnv(n_props),
+            synthetic.machine(),
+            synthetic.labelling_function(),
+            max_steps,
+        )
+        size = n_props + len(self.crm.U) + len(self.crm.F) + len(self.crm.c_0)
+        self.observation_space = gym.spaces.Box(
+            low=0, high=np.inf, shape=(size,), dtype=np.float32
+        )
+        self.action_space = self.ground_env.action_space
+
+
+def make_synthetic(n_states: int) -> SyntheticMachine:
+    """Return the synthetic machine of the benchmarks with ``n_states`` states."""
+    return generate_machine(
+        n_states=n_states, n_props=4, n_counters=2, edges_per_state=4, seed=0
+    )
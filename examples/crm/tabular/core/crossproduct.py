@@ -1,8 +1,11 @@
+from typing import Sequence
+
 import gymnasium as gym
 import numpy as np
+from gymnasium.vector.utils import batch_space
 
 from pycrm.automaton import CountingRewardMachine
-from pycrm.crossproduct import CrossProduct
+from pycrm.crossproduct import CrossProduct, CrossProductVecEnv
 from pycrm.label import LabellingFunction
 
 
@@ -48,3 +51,49 @@ class OfficeWorldCrossProduct(CrossProduct[np.ndarray, np.ndarray, int, None]):
             Ground observation - [agent row, agent col, mail empty].
         """
         return obs[:3]
+
+
+class OfficeWorldCrossProductVecEnv(CrossProductVecEnv):
+    """Vectorised cross product of the Office World environment."""
+
+    def __init__(
+        self,
+        ground_envs: Sequence[gym.Env],
+        crm: CountingRewardMachine,
+        lf: LabellingFunction[np.ndarray, int],
+        max_steps: int,
+    ) -> None:
+        """Initialize the vectorised cross product environment."""
+        super().__init__(ground_envs, crm, lf, max_steps)
+        self.single_observation_space = gym.spaces.Box(
+            low=-1, high=100, shape=(6,), dtype=np.int64
+        )
+        self.observation_space = batch_space(
+            self.single_observation_space, self.num_envs
+        )
+
+    def _get_obs_batch(
+        self, ground_obs: np.ndarray, u: np.ndarray, c: np.ndarray
+    ) -> np.ndarray:
+        """Get the cross product observations of a batch of configurations.
+
+        Args:
+            ground_obs: The ground observations.
+            u: The number of symbols seen by each copy.
+            c: The counter configuration of each copy.
+
+        Returns:
+            Cross product observations - [agent_position, machine state, counter state].
+        """
+        return np.column_stack([ground_obs[:, :3], u, c[:, :2]])
+
+    def to_ground_obs(self, obs: np.ndarray) -> np.ndarray:
+        """Convert cross product observations to ground observations.
+
+        Args:
+            obs: The cross product observations.
+
+        Returns:
+            Ground observations - [agent row, agent col, mail empty].
+        """
+        return obs[..., :3]
@@ -71,3 +71,68 @@ class OfficeWorldLabellingFunction(LabellingFunction[np.ndarray, int]):
         if np.any(np.all(next_obs[:2] == self.DECORATION_COORD_LIST, axis=1)):
             return Symbol.D
         return None
+
+
+class OfficeWorldBatchLabellingFunction(LabellingFunction[np.ndarray, int]):
+    """Labelling function for batches of Office World transitions.
+
+    Labels the same events as ``OfficeWorldLabellingFunction`` with batch event
+    tests, for use with ``OfficeWorldCrossProductVecEnv``.
+    """
+
+    @LabellingFunction.batch_event(Symbol.C)
+    def test_coffee_machine(
+        self, obs: np.ndarray, action: np.ndarray, next_obs: np.ndarray
+    ) -> np.ndarray:
+        """Return where the agent is at the coffee machine."""
+        del obs, action
+        return np.all(
+            next_obs[:, :2] == OfficeWorldLabellingFunction.COFFEE_COORDS, axis=1
+        )
+
+    @LabellingFunction.batch_event(Symbol.M)
+    def test_mail_collected(
+        self, obs: np.ndarray, action: np.ndarray, next_obs: np.ndarray
+    ) -> np.ndarray:
+        """Return where the agent is at the mail before it is empty."""
+        del obs, action
+        at_mail = np.all(
+            next_obs[:, :2] == OfficeWorldLabellingFunction.MAIL_COORDS, axis=1
+        )
+        return at_mail & (next_obs[:, 2] == 0)
+
+    @LabellingFunction.batch_event(Symbol.E)
+    def test_mail_empty(
+        self, obs: np.ndarray, action: np.ndarray, next_obs: np.ndarray
+    ) -> np.ndarray:
+        """Return where the agent is at the mail once it is empty."""
+        del obs, action
+        at_mail = np.all(
+            next_obs[:, :2] == OfficeWorldLabellingFunction.MAIL_COORDS, axis=1
+        )
+        return at_mail & (next_obs[:, 2] == 1)
+
+    @LabellingFunction.batch_event(Symbol.P)
+    def test_people(
+        self, obs: np.ndarray, action: np.ndarray, next_obs: np.ndarray
+    ) -> np.ndarray:
+        """Return where the agent is at the people."""
+        del obs, action
+        return np.all(
+            next_obs[:, :2] == OfficeWorldLabellingFunction.PEOPLE_COORDS, axis=1
+        )
+
+    @LabellingFunction.batch_event(Symbol.D)
+    def test_decoration(
+        self, obs: np.ndarray, action: np.ndarray, next_obs: np.ndarray
+    ) -> np.ndarray:
+        """Return where the agent is at a decoration."""
+        del obs, action
+        return np.any(
+            np.all(
+                next_obs[:, None, :2]
+                == OfficeWorldLabellingFunction.DECORATION_COORD_LIST,
+                axis=2,
+            ),
+            axis=1,
+        )
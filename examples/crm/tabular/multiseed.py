@@ -0,0 +1,67 @@
+import matplotlib.pyplot as plt
+import numpy as np
+
+from examples.crm.tabular.core.crossproduct import OfficeWorldCrossProductVecEnv
+from examples.crm.tabular.core.ground import OfficeWorld
+from examples.crm.tabular.core.label import OfficeWorldBatchLabellingFunction
+from examples.crm.tabular.core.machine import OfficeWorldCountingRewardMachine
+from pycrm.agents.tabular import MultiSeedQLearning
+
+SEEDS = 100
+EPISODES = 5000
+LEARNING_RATE = 0.01
+DISCOUNT_FACTOR = 0.99
+EPSILON = 0.1
+
+
+def train(counterfactual: bool) -> np.ndarray:
+    """Train every seed of a QL or CQL agent in lockstep."""
+    cross_product = OfficeWorldCrossProductVecEnv(
+        ground_envs=[OfficeWorld() for _ in range(SEEDS)],
+        crm=OfficeWorldCountingRewardMachine(),
+        lf=OfficeWorldBatchLabellingFunction(),
+        max_steps=500,
+    )
+    trainer = MultiSeedQLearning(
+        env=cross_product,
+        epsilon=EPSILON,
+        learning_rate=LEARNING_RATE,
+        discount_factor=DISCOUNT_FACTOR,
+        counterfactual=counterfactual,
+        seed=0,
+    )
+    return trainer.learn(total_episodes=EPISODES)
+
+
+def main():
+    """Run the tabular experiment over many seeds in a single process."""
+    # Returns of shape (SEEDS, EPISODES)
+    all_returns_ql = train(counterfactual=False)
+    all_returns_cql = train(counterfactual=True)
+    np.savez("office_world_seeds.npz", ql=all_returns_ql, cql=all_returns_cql)
+
+    # Plot the mean and standard deviation over seeds
+    plt.figure(figsize=(10, 6))
+    for returns, label in [
+        (all_returns_ql, "Q-Learning"),
+        (all_returns_cql, "Counterfactual Q-Learning"),
+    ]:
+        smoothed = np.apply_along_axis(
+            lambda r: np.convolve(r, np.ones((100,)) / 100, mode="valid"), 1, returns
+        )
+        mean, std = smoothed.mean(axis=0), smoothed.std(axis=0)
+        plt.plot(mean, label=label)
+        plt.fill_between(np.arange(len(mean)), mean - std, mean + std, alpha=0.2)
+    plt.title(f"Q-Learning Performance in Office World Environment ({SEEDS} seeds)")
+    plt.xlabel("Episode")
+    plt.ylabel("Average Return (100-episode moving average)")
+    plt.grid(True, linestyle="--", alpha=0.7)
+    plt.legend()
+
+    # Save visualization
+    plt.savefig("office_world_seeds.png")
+    plt.show()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Experiment grids of the examples, for the parallel experiment runner.
+
+Run a grid on every core of a machine with, for example::
+
+    pycrm-experiment examples.experiments:office_world --output office_world.csv
+
+from the root of the repository.
+"""
+
+from stable_baselines3 import DQN, SAC
+
+import examples.crm.continuous.core as continuous
+import examples.crm.discrete.core as discrete
+from examples.crm.tabular.core.crossproduct import OfficeWorldCrossProduct
+from examples.crm.tabular.core.ground import OfficeWorld
+from examples.crm.tabular.core.label import OfficeWorldLabellingFunction
+from examples.crm.tabular.core.machine import OfficeWorldCountingRewardMachine
+from pycrm.agents.sb3.dqn import CounterfactualDQN
+from pycrm.agents.sb3.sac import CounterfactualSAC
+from pycrm.agents.tabular import CounterfactualQLearningAgent, QLearningAgent
+from pycrm.experiment import Job, make_grid
+
+SEEDS = range(100)
+
+
+def make_office_world() -> OfficeWorldCrossProduct:
+    """Return the tabular Office World cross product."""
+    return OfficeWorldCrossProduct(
+        ground_env=OfficeWorld(),
+        crm=OfficeWorldCountingRewardMachine(),
+        lf=OfficeWorldLabellingFunction(),
+        max_steps=500,
+    )
+
+
+def make_discrete_puck_world() -> discrete.PuckWorldCrossProduct:
+    """Return the Puck World cross product with discrete actions."""
+    return discrete.PuckWorldCrossProduct(
+        ground_env=discrete.PuckWorld(),
+        machine=discrete.PuckWorldCountingRewardMachine(),
+        lf=discrete.PuckWorldLabellingFunction(),
+        max_steps=1000,
+    )
+
+
+def make_continuous_puck_world() -> continuous.PuckWorldCrossProduct:
+    """Return the Puck World cross product with continuous actions."""
+    return continuous.PuckWorldCrossProduct(
+        ground_env=continuous.PuckWorld(),
+        machine=continuous.PuckWorldCountingRewardMachine(),
+        lf=continuous.PuckWorldLabellingFunction(),
+        max_steps=100,
+    )
+
+
+def office_world() -> list[Job]:
+    """QL and CQL on Office World for two learning rates."""
+    jobs = []
+    for name, agent_cls in [
+        ("ql", QLearningAgent),
+        ("cql", CounterfactualQLearningAgent),
+    ]:
+        jobs += make_grid(
+            f"office_world/{name}",
+            make_office_world,
+            agent_cls,
+            seeds=SEEDS,
+            learn_kwargs={"total_episodes": 5000},
+            epsilon=[0.1],
+            learning_rate=[0.01, 0.1],
+            discount_factor=[0.99],
+        )
+    return jobs
+
+
+def discrete_puck_world() -> list[Job]:
+    """DQN and C-DQN on Puck World with discrete actions."""
+    jobs = []
+    for name, agent_cls in [("dqn", DQN), ("cdqn", CounterfactualDQN)]:
+        jobs += make_grid(
+            f"puck_world/{name}",
+            make_discrete_puck_world,
+            agent_cls,
+            seeds=SEEDS,
+            learn_kwargs={"total_timesteps": 1_000_000},
+            policy=["MlpPolicy"],
+            exploration_fraction=[0.5],
+            exploration_final_eps=[0.1],
+            buffer_size=[1_000_000],
+            batch_size=[2_500],
+            device=["cpu"],
+        )
+    return jobs
+
+
+def continuous_puck_world() -> list[Job]:
+    """SAC and C-SAC on Puck World with continuous actions."""
+    jobs = []
+    for name, agent_cls in [("sac", SAC), ("csac", CounterfactualSAC)]:
+        jobs += make_grid(
+            f"puck_world/{name}",
+            make_continuous_puck_world,
+            agent_cls,
+            seeds=SEEDS,
+            learn_kwargs={"total_timesteps": 50_000},
+            policy=["MlpPolicy"],
+            buffer_size=[1_000_000],
+            batch_size=[2_500],
+            device=["cpu"],
+        )
+    return jobs
@@ -0,0 +1,3 @@
+from pycrm.agents.sb3.buffer.replay import CounterfactualReplayBuffer
+
+__all__ = ["CounterfactualReplayBuffer"]
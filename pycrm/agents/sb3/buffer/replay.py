@@ -0,0 +1,191 @@
+import numpy as np
+import torch
+from gymnasium import spaces
+from stable_baselines3.common.buffers import ReplayBuffer
+
+
+class CounterfactualReplayBuffer(ReplayBuffer):
+    """Replay buffer supporting bulk insertion of counterfactual transitions.
+
+    Counterfactual experience generation produces many transitions per
+    environment step. ``extend`` writes all of them with a slice assignment per
+    array instead of one ``add`` call per transition.
+
+    Storage is laid out as (buffer_size, n_envs), but the number of
+    counterfactual transitions generated per step need not be a multiple of
+    ``n_envs``. ``extend_rows`` accepts any number of transitions and holds back
+    the remainder that does not fill a complete row until the next call, so
+    every generated transition is eventually stored. ``n_generated`` and
+    ``n_stored`` count the transitions passed to and written by ``extend_rows``.
+    """
+
+    def __init__(
+        self,
+        buffer_size: int,
+        observation_space: spaces.Space,
+        action_space: spaces.Space,
+        device: torch.device | str = "auto",
+        n_envs: int = 1,
+        optimize_memory_usage: bool = False,
+        handle_timeout_termination: bool = True,
+    ) -> None:
+        """Initialise the replay buffer.
+
+        Args:
+            buffer_size (int): Maximum number of transitions.
+            observation_space (spaces.Space): Observation space.
+            action_space (spaces.Space): Action space.
+            device (torch.device | str): PyTorch device.
+            n_envs (int): Number of parallel environments.
+            optimize_memory_usage (bool): Not supported, counterfactual
+                transitions are not consecutive so next observations cannot be
+                recovered from the following row.
+            handle_timeout_termination (bool): Whether to store timeouts.
+        """
+        if optimize_memory_usage:
+            raise ValueError(
+                "CounterfactualReplayBuffer does not support optimize_memory_usage"
+            )
+        super().__init__(
+            buffer_size,
+            observation_space,
+            action_space,
+            device=device,
+            n_envs=n_envs,
+            optimize_memory_usage=optimize_memory_usage,
+            handle_timeout_termination=handle_timeout_termination,
+        )
+        self.n_generated = 0
+        self.n_stored = 0
+        self._pending: tuple[np.ndarray, ...] | None = None
+
+    def extend(
+        self,
+        obs: np.ndarray,
+        next_obs: np.ndarray,
+        action: np.ndarray,
+        reward: np.ndarray,
+        done: np.ndarray,
+        infos: np.ndarray | list | None = None,
+    ) -> None:
+        """Add a block of transitions to the buffer.
+
+        Equivalent to calling ``add`` once for each of the K leading rows of the
+        inputs. If K exceeds the buffer size only the last ``buffer_size`` rows
+        are kept, as they would be by sequential insertion.
+
+        Args:
+            obs (np.ndarray): Observations of shape (K, n_envs, *obs_shape).
+            next_obs (np.ndarray): Next observations of shape
+                (K, n_envs, *obs_shape).
+            action (np.ndarray): Actions of shape (K, n_envs, *action_shape).
+            reward (np.ndarray): Rewards of shape (K, n_envs).
+            done (np.ndarray): Dones of shape (K, n_envs).
+            infos (np.ndarray | list | None): Info dicts of shape (K, n_envs). If
+                omitted, no transition is treated as a timeout.
+        """
+        n = len(obs)
+        if n == 0:
+            return
+
+        obs = np.asarray(obs).reshape((n, self.n_envs, *self.obs_shape))
+        next_obs = np.asarray(next_obs).reshape((n, self.n_envs, *self.obs_shape))
+        action = np.asarray(action).reshape((n, self.n_envs, self.action_dim))
+        reward = np.asarray(reward).reshape((n, self.n_envs))
+        done = np.asarray(done).reshape((n, self.n_envs))
+
+        if infos is not None and self.handle_timeout_termination:
+            flat_infos = np.asarray(infos, dtype=object).ravel()
+            timeouts = np.fromiter(
+                (info.get("TimeLimit.truncated", False) for info in flat_infos),
+                dtype=np.float32,
+                count=len(flat_infos),
+            ).reshape((n, self.n_envs))
+        else:
+            timeouts = np.zeros((n, self.n_envs), dtype=np.float32)
+
+        # Rows overwritten within this block are never stored
+        skip = max(n - self.buffer_size, 0)
+        start = (self.pos + skip) % self.buffer_size
+        n -= skip
+
+        blocks = (
+            (self.observations, obs),
+            (self.next_observations, next_obs),
+            (self.actions, action),
+            (self.rewards, reward),
+            (self.dones, done),
+            (self.timeouts, timeouts),
+        )
+        head = min(n, self.buffer_size - start)
+        for target, values in blocks:
+            target[start : start + head] = values[skip : skip + head]
+            target[: n - head] = values[skip + head :]
+
+        end = start + n
+        if end >= self.buffer_size:
+            self.full = True
+        self.pos = end % self.buffer_size
+
+    def extend_rows(
+        self,
+        obs: np.ndarray,
+        next_obs: np.ndarray,
+        action: np.ndarray,
+        reward: np.ndarray,
+        done: np.ndarray,
+        infos: np.ndarray | list | None = None,
+    ) -> int:
+        """Add any number of transitions to the buffer.
+
+        Transitions fill the buffer row by row, ``n_envs`` at a time. Fewer than
+        ``n_envs`` transitions left over are held back and stored by a later call.
+
+        Args:
+            obs (np.ndarray): Observations of shape (M, *obs_shape).
+            next_obs (np.ndarray): Next observations of shape (M, *obs_shape).
+            action (np.ndarray): Actions of shape (M, *action_shape).
+            reward (np.ndarray): Rewards of shape (M,).
+            done (np.ndarray): Dones of shape (M,).
+            infos (np.ndarray | list | None): Info dicts of shape (M,). If omitted,
+                no transition is treated as a timeout.
+
+        Returns:
+            int: Number of transitions written to the buffer by this call.
+        """
+        m = len(obs)
+        self.n_generated += m
+
+        if infos is None:
+            infos = np.array([{} for _ in range(m)], dtype=object)
+        rows = (
+            np.asarray(obs).reshape((m, *self.obs_shape)),
+            np.asarray(next_obs).reshape((m, *self.obs_shape)),
+            np.asarray(action).reshape((m, self.action_dim)),
+            np.asarray(reward).reshape(m),
+            np.asarray(done).reshape(m),
+            np.asarray(infos, dtype=object).reshape(m),
+        )
+        if self._pending is not None:
+            rows = tuple(
+                np.concatenate((pending, new))
+                for pending, new in zip(self._pending, rows, strict=True)
+            )
+            m = len(rows[0])
+
+        n_complete = m - m % self.n_envs
+        self._pending = (
+            tuple(values[n_complete:] for values in rows) if n_complete < m else None
+        )
+        if n_complete == 0:
+            return 0
+
+        k = n_complete // self.n_envs
+        self.extend(
+            *(
+                values[:n_complete].reshape((k, self.n_envs, *values.shape[1:]))
+                for values in rows
+            )
+        )
+        self.n_stored += n_complete
+        return n_complete
@@ -0,0 +1,3 @@
+from pycrm.agents.sb3.counterfactual.mixin import CounterfactualMixin
+
+__all__ = ["CounterfactualMixin"]
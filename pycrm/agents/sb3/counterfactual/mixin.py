@@ -0,0 +1,436 @@
+from concurrent.futures import Future
+from typing import TypeVar
+
+import numpy as np
+from stable_baselines3.common.buffers import ReplayBuffer
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.noise import ActionNoise
+from stable_baselines3.common.off_policy_algorithm import OffPolicyAlgorithm
+from stable_baselines3.common.type_aliases import (
+    MaybeCallback,
+    RolloutReturn,
+    TrainFreq,
+    TrainFrequencyUnit,
+)
+from stable_baselines3.common.utils import should_collect_more_steps
+from stable_baselines3.common.vec_env import VecEnv
+
+from pycrm.agents.sb3.buffer import CounterfactualReplayBuffer
+from pycrm.agents.sb3.wrapper import (
+    DispatchDummyVecEnv,
+    DispatchFuture,
+    DispatchSubprocVecEnv,
+)
+
+SelfCounterfactualMixin = TypeVar(
+    "SelfCounterfactualMixin", bound="CounterfactualMixin"
+)
+
+
+class CounterfactualMixin(OffPolicyAlgorithm):
+    """Counterfactual experience generation for off-policy SB3 algorithms.
+
+    Replaces ``collect_rollouts`` so that every environment step also stores the
+    counterfactual experience generated by the cross product environments. An
+    algorithm is made counterfactual by listing this mixin before it::
+
+        class CounterfactualDQN(CounterfactualMixin, DQN): ...
+
+    and calling ``_setup_counterfactual`` at the end of ``__init__``.
+
+    With a ``DispatchSubprocVecEnv`` or ``DispatchDummyVecEnv``, counterfactual
+    generation can be pipelined by passing ``pipeline_counterfactuals=True``: the
+    counterfactual experience of a step is generated by the environments while
+    the learner carries on, and is stored just before the next step, or at the
+    end of the rollout while the replay buffer holds fewer than ``batch_size``
+    transitions. Counterfactual experience therefore reaches the replay buffer
+    one step late, so gradient steps taken in between do not sample it. By
+    default it is stored during the step.
+    """
+
+    def _setup_counterfactual(self, pipeline_counterfactuals: bool = False) -> None:
+        """Initialise the counterfactual experience state.
+
+        Args:
+            pipeline_counterfactuals (bool): Whether to store the counterfactual
+                experience of a step before the next step rather than during it,
+                overlapping its generation with learning.
+        """
+        # Check if the environment supports subprocess dispatching
+        self.subproc_dispatch_supported = isinstance(
+            self.env, (DispatchSubprocVecEnv, DispatchDummyVecEnv)
+        )
+
+        # Number of counterfactual transitions generated and stored so far
+        self.counterfactual_generated = 0
+        self.counterfactual_stored = 0
+
+        # Overlap counterfactual generation in subprocesses with learning
+        self.pipeline_counterfactuals = pipeline_counterfactuals
+        self._pending_counterfactuals: DispatchFuture | Future | None = None
+
+    def learn(
+        self: SelfCounterfactualMixin,
+        total_timesteps: int,
+        callback: MaybeCallback = None,
+        log_interval: int = 4,
+        tb_log_name: str = "run",
+        reset_num_timesteps: bool = True,
+        progress_bar: bool = False,
+    ) -> SelfCounterfactualMixin:
+        """Learn, storing counterfactual experience still pending at the end."""
+        model = super().learn(
+            total_timesteps=total_timesteps,
+            callback=callback,
+            log_interval=log_interval,
+            tb_log_name=tb_log_name,
+            reset_num_timesteps=reset_num_timesteps,
+            progress_bar=progress_bar,
+        )
+        self._flush_pending_counterfactuals()
+        return model
+
+    def _excluded_save_params(self) -> list[str]:
+        """Return the attributes not saved, including pending experience handles."""
+        return [*super()._excluded_save_params(), "_pending_counterfactuals"]
+
+    def collect_rollouts(
+        self,
+        env: VecEnv,
+        callback: BaseCallback,
+        train_freq: TrainFreq,
+        replay_buffer: ReplayBuffer,
+        action_noise: ActionNoise | None = None,
+        learning_starts: int = 0,
+        log_interval: int | None = None,
+    ) -> RolloutReturn:
+        """Collect experiences and store them into a ReplayBuffer.
+
+        Args:
+            env: The training environment.
+            callback: Callback that will be called at each step
+                (and at the beginning and end of the rollout).
+            train_freq: How much experience to collect
+                by doing rollouts of current policy.
+                Either TrainFreq(<n>, TrainFrequencyUnit.STEP)
+                or TrainFreq(<n>, TrainFrequencyUnit.EPISODE)
+                with <n> being an integer greater than 0.
+            action_noise: Action noise that will be used for exploration.
+                Required for deterministic policy (e.g. TD3). This can also be used
+                in addition to the stochastic policy for SAC.
+            learning_starts: Number of steps before learning for the warm-up phase.
+            replay_buffer: The buffer to store experiences.
+            log_interval: Log data every log_interval episodes.
+
+        Returns:
+            None
+        """
+        # Switch to eval mode (this affects batch norm / dropout)
+        assert isinstance(env, VecEnv), "You must pass a VecEnv"
+        assert train_freq.frequency > 0, "Should at least collect one step or episode."
+        if env.num_envs > 1:
+            assert train_freq.unit == TrainFrequencyUnit.STEP, (
+                "You must use only one env when doing episodic training."
+            )
+
+        self.policy.set_training_mode(False)
+        if self.use_sde:
+            self.actor.reset_noise(env.num_envs)  # type: ignore
+        num_collected_steps, num_collected_episodes = 0, 0
+
+        callback.on_rollout_start()
+        continue_training = True
+        while should_collect_more_steps(
+            train_freq, num_collected_steps, num_collected_episodes
+        ):
+            if (
+                self.use_sde
+                and self.sde_sample_freq > 0
+                and num_collected_steps % self.sde_sample_freq == 0
+            ):
+                # Sample a new noise matrix
+                self.actor.reset_noise(env.num_envs)  # type: ignore
+
+            # Select action randomly or according to policy
+            actions, buffer_actions = self._sample_action(
+                learning_starts, action_noise, env.num_envs
+            )
+
+            # Rescale and perform action, subprocess workers generate the
+            # counterfactual experience of the step themselves
+            counterfactuals = None
+            dispatch = isinstance(env, (DispatchSubprocVecEnv, DispatchDummyVecEnv))
+            if dispatch and self.pipeline_counterfactuals:
+                new_obs, _, dones, infos, pending = env.step_counterfactual_async(
+                    actions, buffer_actions
+                )
+                counterfactuals = self._swap_pending_counterfactuals(pending)
+            elif dispatch:
+                new_obs, _, dones, infos, counterfactuals = env.step_counterfactual(
+                    actions, buffer_actions
+                )
+            else:
+                new_obs, _, dones, infos = env.step(actions)
+            self.num_timesteps += env.num_envs
+            num_collected_steps += 1
+
+            # Give access to local variables
+            callback.update_locals(locals())
+            # Only stop training if return value is False, not when it is None.
+            if not callback.on_step():
+                return RolloutReturn(
+                    num_collected_steps * env.num_envs,
+                    num_collected_episodes,
+                    continue_training=False,
+                )
+
+            # Retrieve reward and episode length if using Monitor wrapper
+            self._update_info_buffer(infos, dones)
+            self._store_counterfactual_transitions(
+                replay_buffer,
+                buffer_actions,
+                new_obs,  # type: ignore
+                dones,
+                infos,  # type: ignore
+                counterfactuals,
+            )
+            self._update_current_progress_remaining(
+                self.num_timesteps, self._total_timesteps
+            )
+
+            # For DQN, check if the target network should be updated
+            # and update the exploration schedule
+            # For SAC/TD3, the update is dones as the same time as the gradient update
+            # see https://github.com/hill-a/stable-baselines/issues/900
+            self._on_step()
+            for idx, done in enumerate(dones):
+                if done:
+                    # Update stats
+                    num_collected_episodes += 1
+                    self._episode_num += 1
+
+                    if action_noise is not None:
+                        kwargs = {"indices": [idx]} if env.num_envs > 1 else {}
+                        action_noise.reset(**kwargs)
+
+                    # Log training infos
+                    if (
+                        log_interval is not None
+                        and self._episode_num % log_interval == 0
+                    ):
+                        self._dump_logs()
+
+        # Training samples the buffer once the rollout returns, so experience still
+        # pending is stored while the buffer cannot fill a batch
+        if replay_buffer.size() < self.batch_size:
+            self._flush_pending_counterfactuals()
+        callback.on_rollout_end()
+        return RolloutReturn(
+            num_collected_steps * env.num_envs,
+            num_collected_episodes,
+            continue_training,
+        )
+
+    def _generate_counterfactual_experience(
+        self, buffer_actions: np.ndarray, obs_next_terminal: np.ndarray
+    ) -> list[tuple[np.ndarray, ...]]:
+        """Generate counterfactual experience in every environment."""
+        assert isinstance(self.env, VecEnv), "You must pass a VecEnv"
+        assert self._last_obs is not None
+
+        if self.subproc_dispatch_supported:
+            assert isinstance(self.env, (DispatchSubprocVecEnv, DispatchDummyVecEnv)), (
+                "You must pass a DispatchSubprocVecEnv or DispatchDummyVecEnv"
+            )
+
+            # Get ground observations
+            ground_obs = self.env.dispatched_env_method("to_ground_obs", self._last_obs)
+            ground_obs_next = self.env.dispatched_env_method(
+                "to_ground_obs", obs_next_terminal
+            )
+
+            # Generate counterfactual experience
+            return self.env.dispatched_env_method(
+                "generate_counterfactual_experience",
+                ground_obs,
+                buffer_actions,
+                ground_obs_next,
+            )
+
+        # Get ground observations
+        ground_obs = self.env.env_method("to_ground_obs", self._last_obs[0])  # type: ignore
+        ground_obs_next = self.env.env_method("to_ground_obs", obs_next_terminal[0])
+
+        # Generate counterfactual experience
+        return self.env.env_method(
+            "generate_counterfactual_experience",
+            ground_obs[0],
+            buffer_actions[0],
+            ground_obs_next[0],
+        )
+
+    def _store_counterfactual_transitions(
+        self,
+        replay_buffer: ReplayBuffer,
+        buffer_actions: np.ndarray,
+        obs_next: np.ndarray,
+        dones: np.ndarray,
+        infos: list[dict],
+        counterfactuals: list[tuple] | None = None,
+    ) -> None:
+        """Store counterfactual experience in the replay buffer.
+
+        Counterfactual experience is generated here unless it was already
+        generated by the environments during the step.
+        """
+        assert isinstance(self.env, VecEnv), "You must pass a VecEnv"
+
+        if counterfactuals is not None:
+            result = counterfactuals
+        else:
+            # SB3's VecEnv auto-resets on done, so obs_next is the post-reset
+            # observation. Extract the true terminal observations from infos.
+            obs_next_terminal = obs_next.copy()
+            for i, done in enumerate(dones):
+                if done and infos[i].get("terminal_observation") is not None:
+                    obs_next_terminal[i] = infos[i]["terminal_observation"]
+
+            result = self._generate_counterfactual_experience(
+                buffer_actions, obs_next_terminal
+            )
+        if result:
+            self._insert_counterfactuals(replay_buffer, result)
+
+        self._last_obs = obs_next  # type: ignore
+
+    def _swap_pending_counterfactuals(
+        self, pending: DispatchFuture | Future
+    ) -> list[tuple]:
+        """Replace the pending counterfactual experience, returning the previous."""
+        previous, self._pending_counterfactuals = self._pending_counterfactuals, pending
+        return [] if previous is None else previous.result()
+
+    def _flush_pending_counterfactuals(self) -> None:
+        """Store any counterfactual experience still being generated."""
+        if self._pending_counterfactuals is not None:
+            result = self._pending_counterfactuals.result()
+            self._pending_counterfactuals = None
+            self._insert_counterfactuals(self.replay_buffer, result)  # type: ignore
+
+    def _insert_counterfactuals(
+        self, replay_buffer: ReplayBuffer, result: list[tuple]
+    ) -> None:
+        """Insert the counterfactual experience of every environment."""
+        if len(result) == 1:
+            c_obs, c_actions, c_obs_next, c_rewards, c_dones, c_infos = result[0]
+        else:
+            *fields, all_infos = zip(*result, strict=True)
+            c_obs, c_actions, c_obs_next, c_rewards, c_dones = (
+                np.concatenate(arrays) for arrays in fields
+            )
+            # Batches read from shared memory carry no info dicts
+            c_infos = (
+                None
+                if any(infos is None for infos in all_infos)
+                else np.concatenate(all_infos)
+            )
+
+        # Insert counterfactual transitions into replay buffer
+        n_generated = len(c_obs)
+        if isinstance(replay_buffer, CounterfactualReplayBuffer):
+            n_stored = replay_buffer.extend_rows(
+                obs=c_obs,
+                next_obs=c_obs_next,
+                action=c_actions,
+                reward=c_rewards,
+                done=c_dones,
+                infos=c_infos,
+            )
+        else:
+            if c_infos is None:
+                c_infos = np.array([{} for _ in range(n_generated)], dtype=object)
+            n_stored = self._add_counterfactual_transitions(
+                replay_buffer, c_obs, c_actions, c_obs_next, c_rewards, c_dones, c_infos
+            )
+
+        self.counterfactual_generated += n_generated
+        self.counterfactual_stored += n_stored
+        self.logger.record("counterfactual/generated", self.counterfactual_generated)
+        self.logger.record("counterfactual/stored", self.counterfactual_stored)
+
+    def _add_counterfactual_transitions(
+        self,
+        replay_buffer: ReplayBuffer,
+        c_obs: np.ndarray,
+        c_actions: np.ndarray,
+        c_obs_next: np.ndarray,
+        c_rewards: np.ndarray,
+        c_dones: np.ndarray,
+        c_infos: np.ndarray,
+    ) -> int:
+        """Add counterfactual transitions one row at a time to a standard buffer.
+
+        Standard replay buffers only accept complete rows of ``num_envs``
+        transitions, so transitions that do not fill a complete row are dropped.
+
+        Returns:
+            int: Number of transitions stored.
+        """
+        assert isinstance(self.env, VecEnv), "You must pass a VecEnv"
+
+        # Get action dimension
+        if len(self.env.action_space.shape) == 0:  # type: ignore
+            action_dim = 1
+        else:
+            action_dim = self.env.action_space.shape[0]  # type: ignore
+
+        # Reshape & batch to match number of envs
+        c_obs = self.reshape_and_trim(
+            c_obs,
+            final_dim=self.env.observation_space.shape[0],  # type: ignore
+        )
+        c_actions = self.reshape_and_trim(c_actions, final_dim=action_dim)
+        c_obs_next = self.reshape_and_trim(
+            c_obs_next,
+            final_dim=self.env.observation_space.shape[0],  # type: ignore
+        )
+        c_rewards = self.reshape_and_trim(c_rewards, final_dim=1)
+        c_dones = self.reshape_and_trim(c_dones, final_dim=1)
+        c_infos = self.reshape_and_trim(c_infos, final_dim=1)
+
+        for i in range(len(c_obs)):
+            replay_buffer.add(
+                obs=c_obs[i],
+                next_obs=c_obs_next[i],
+                action=c_actions[i],
+                reward=c_rewards[i],
+                done=c_dones[i],
+                infos=c_infos[i],  # type: ignore
+            )
+        return len(c_obs) * self.env.num_envs
+
+    def reshape_and_trim(self, array: np.ndarray, final_dim: int) -> np.ndarray:
+        """Trim into batches to match number of environments."""
+        assert isinstance(self.env, VecEnv), "You must pass a VecEnv"
+
+        # Desired shape
+        if final_dim > 1:
+            target_shape = (-1, self.env.num_envs, final_dim)
+        else:
+            target_shape = (-1, self.env.num_envs)
+        num_elements_per_batch = self.env.num_envs * final_dim
+
+        # Flatten the array to make slicing easier
+        flat_array = array.flatten()
+
+        # Calculate the number of elements required
+        num_elements_required = num_elements_per_batch * (
+            len(flat_array) // num_elements_per_batch
+        )
+
+        # Trim the array to fit the required number of elements
+        trimmed_array = flat_array[:num_elements_required]
+
+        # Reshape the array to the desired shape
+        reshaped_array = trimmed_array.reshape(target_shape)
+        return reshaped_array
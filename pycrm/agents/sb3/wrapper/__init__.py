@@ -1,3 +1,4 @@
-from pycrm.agents.sb3.wrapper.subproc import DispatchSubprocVecEnv
+from pycrm.agents.sb3.wrapper.dummy import DispatchDummyVecEnv
+from pycrm.agents.sb3.wrapper.subproc import DispatchFuture, DispatchSubprocVecEnv
 
-__all__ = ["DispatchSubprocVecEnv"]
+__all__ = ["DispatchDummyVecEnv", "DispatchFuture", "DispatchSubprocVecEnv"]
@@ -0,0 +1,214 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from copy import deepcopy
+from functools import partial
+from typing import Any, Callable, Iterable
+
+import gymnasium as gym
+import numpy as np
+from stable_baselines3.common.vec_env import DummyVecEnv
+from stable_baselines3.common.vec_env.base_vec_env import (
+    VecEnvIndices,
+    VecEnvObs,
+    VecEnvStepReturn,
+)
+
+from pycrm.agents.sb3.wrapper.step import (
+    CounterfactualStepWrapper,
+    make_counterfactual_env,
+)
+
+
+class DispatchDummyVecEnv(DummyVecEnv):
+    """Steps environments in-process with the interface of ``DispatchSubprocVecEnv``.
+
+    For cheap ground environments the pipe round-trips of a subprocess per
+    environment cost more than the environment step itself. This environment
+    steps every copy in the calling process, optionally on a thread pool for
+    ground environments that release the GIL, and supports the same
+    counterfactual dispatch methods so the counterfactual agents work unchanged.
+    """
+
+    envs: list[CounterfactualStepWrapper]  # type: ignore
+
+    def __init__(
+        self,
+        env_fns: list[Callable[[], gym.Env]],
+        n_threads: int | None = None,
+    ) -> None:
+        """Create the environments.
+
+        Args:
+            env_fns: Functions creating the environments.
+            n_threads: Number of threads stepping the environments and generating
+                deferred counterfactual experience. If None, everything runs on
+                the calling thread.
+        """
+        if n_threads is not None and n_threads < 1:
+            raise ValueError(f"n_threads must be at least 1, got {n_threads}")
+        self._pending: Future | None = None
+        super().__init__([partial(make_counterfactual_env, fn) for fn in env_fns])
+        self._executor = (
+            ThreadPoolExecutor(max_workers=n_threads) if n_threads is not None else None
+        )
+
+    def dispatched_env_method(
+        self,
+        method_name: str,
+        *method_args,
+        indices: VecEnvIndices | None = None,
+    ) -> list[Any]:
+        """Call a method of the specified environments with one argument set each.
+
+        Args:
+            method_name: The name of the method to call.
+            *method_args: The arguments to pass to the method.
+            indices: The indices of the environments to call the method on.
+
+        Returns:
+            A list of the return values of the method calls.
+        """
+        jobs = zip(self._get_target_envs(indices), *method_args, strict=True)
+        return self._map(
+            lambda job: job[0].get_wrapper_attr(method_name)(*job[1:]), jobs
+        )
+
+    def dispatch_async(
+        self,
+        method_name: str,
+        *method_args,
+        indices: VecEnvIndices | None = None,
+    ) -> Future:
+        """Call a method of the specified environments without waiting.
+
+        The calls run on the thread pool if there is one, otherwise they complete
+        before this method returns.
+
+        Args:
+            method_name: The name of the method to call.
+            *method_args: The arguments to pass to the method.
+            indices: The indices of the environments to call the method on.
+
+        Returns:
+            A handle to the return values of the method calls.
+        """
+        jobs = list(zip(self._get_target_envs(indices), *method_args, strict=True))
+        self._pending = self._submit(
+            lambda: [job[0].get_wrapper_attr(method_name)(*job[1:]) for job in jobs]
+        )
+        return self._pending
+
+    def step_wait(self) -> VecEnvStepReturn:
+        """Step every environment, resetting those whose episode finished."""
+        results = self._map(
+            lambda job: job[0].step_and_reset(job[1]),
+            zip(self.envs, self.actions, strict=True),
+        )
+        return self._save_steps(results)
+
+    def step_counterfactual(
+        self, actions: np.ndarray, buffer_actions: np.ndarray
+    ) -> tuple[VecEnvObs, np.ndarray, np.ndarray, list[dict], list[tuple]]:
+        """Step every environment and generate its counterfactual experience.
+
+        Args:
+            actions: Actions passed to the environments.
+            buffer_actions: Actions stored with the counterfactual experience.
+
+        Returns:
+            tuple: Observations, rewards, dones and infos as returned by ``step``,
+                and the counterfactual experience of each environment.
+        """
+        self._resolve_pending()
+        results = self._map(
+            lambda job: job[0].step_counterfactual(job[1], job[2]),
+            zip(self.envs, actions, buffer_actions, strict=True),
+        )
+        obs, rewards, dones, infos = self._save_steps(result[:5] for result in results)
+        return obs, rewards, dones, infos, [result[5] for result in results]
+
+    def step_counterfactual_async(
+        self, actions: np.ndarray, buffer_actions: np.ndarray
+    ) -> tuple[VecEnvObs, np.ndarray, np.ndarray, list[dict], Future]:
+        """Step every environment and generate its counterfactual experience later.
+
+        With a thread pool, counterfactual generation overlaps with whatever the
+        caller does until it collects the returned handle.
+
+        Args:
+            actions: Actions passed to the environments.
+            buffer_actions: Actions stored with the counterfactual experience.
+
+        Returns:
+            tuple: Observations, rewards, dones and infos as returned by ``step``,
+                and a handle to the counterfactual experience of each
+                environment.
+        """
+        self._resolve_pending()
+        results = self._map(
+            lambda job: job[0].step_counterfactual(job[1], job[2], defer=True),
+            zip(self.envs, actions, buffer_actions, strict=True),
+        )
+        obs, rewards, dones, infos = self._save_steps(result[:5] for result in results)
+        envs = self.envs
+        self._pending = self._submit(
+            lambda: [env.generate_deferred_counterfactuals() for env in envs]
+        )
+        return obs, rewards, dones, infos, self._pending
+
+    def step_async(self, actions: np.ndarray) -> None:
+        """Tell all the environments to start taking a step."""
+        self._resolve_pending()
+        super().step_async(actions)
+
+    def reset(self) -> VecEnvObs:
+        """Reset all the environments and return their observations."""
+        self._resolve_pending()
+        return super().reset()
+
+    def close(self) -> None:
+        """Close the environments and the thread pool."""
+        self._resolve_pending()
+        super().close()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def _get_target_envs(self, indices: VecEnvIndices) -> list[gym.Env]:
+        """Return the given environments once no dispatched call is using them."""
+        self._resolve_pending()
+        return super()._get_target_envs(indices)
+
+    def _save_steps(self, results: Iterable[tuple]) -> VecEnvStepReturn:
+        """Store the step results of every environment and return them batched."""
+        for env_idx, (obs, reward, done, info, reset_info) in enumerate(results):
+            self.buf_rews[env_idx] = reward
+            self.buf_dones[env_idx] = done
+            self.buf_infos[env_idx] = info
+            if done:
+                self.reset_infos[env_idx] = reset_info
+            self._save_obs(env_idx, obs)
+        return (
+            self._obs_from_buf(),
+            np.copy(self.buf_rews),
+            np.copy(self.buf_dones),
+            deepcopy(self.buf_infos),
+        )
+
+    def _map(self, fn: Callable[[Any], Any], jobs: Iterable[Any]) -> list[Any]:
+        """Apply a function to every job, on the thread pool if there is one."""
+        if self._executor is None:
+            return [fn(job) for job in jobs]
+        return list(self._executor.map(fn, jobs))
+
+    def _submit(self, fn: Callable[[], Any]) -> Future:
+        """Run a function on the thread pool, or immediately without one."""
+        if self._executor is not None:
+            return self._executor.submit(fn)
+        future: Future = Future()
+        future.set_result(fn())
+        return future
+
+    def _resolve_pending(self) -> None:
+        """Wait for the last asynchronous dispatch, if any."""
+        if self._pending is not None:
+            self._pending.result()
+            self._pending = None
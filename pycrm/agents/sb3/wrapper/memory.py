@@ -0,0 +1,79 @@
+from multiprocessing.shared_memory import SharedMemory
+from typing import NamedTuple
+
+import numpy as np
+
+# Fields of a counterfactual batch stored in shared memory
+FIELDS = ("obs", "action", "next_obs", "reward", "done")
+
+Layout = dict[str, tuple[int, tuple[int, ...], str]]
+
+
+class SharedCounterfactualBatch(NamedTuple):
+    """Location of a counterfactual batch written to a shared memory ring."""
+
+    slot: int
+    n: int
+
+
+def counterfactual_layout(
+    n_slots: int,
+    capacity: int,
+    obs_shape: tuple[int, ...],
+    obs_dtype: str,
+    action_shape: tuple[int, ...],
+    action_dtype: str,
+) -> tuple[Layout, int]:
+    """Return the layout of a ring of counterfactual batches in a memory block.
+
+    Every field is stored as an array of shape (n_slots, capacity, ...) at a
+    64-byte aligned offset.
+
+    Args:
+        n_slots (int): Number of batches in the ring.
+        capacity (int): Maximum number of experiences per batch.
+        obs_shape (tuple[int, ...]): Shape of a cross product observation.
+        obs_dtype (str): Data type of cross product observations.
+        action_shape (tuple[int, ...]): Shape of an action.
+        action_dtype (str): Data type of actions.
+
+    Returns:
+        tuple[Layout, int]: Offset, shape and data type of each field, and the
+            size of the memory block in bytes.
+    """
+    shapes = {
+        "obs": ((n_slots, capacity, *obs_shape), obs_dtype),
+        "action": ((n_slots, capacity, *action_shape), action_dtype),
+        "next_obs": ((n_slots, capacity, *obs_shape), obs_dtype),
+        "reward": ((n_slots, capacity), np.dtype(np.float64).str),
+        "done": ((n_slots, capacity), np.dtype(np.bool_).str),
+    }
+
+    layout: Layout = {}
+    offset = 0
+    for field in FIELDS:
+        shape, dtype = shapes[field]
+        layout[field] = (offset, shape, dtype)
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        offset += -(-nbytes // 64) * 64
+    return layout, max(offset, 1)
+
+
+def counterfactual_views(
+    shared_memory: SharedMemory, layout: Layout
+) -> dict[str, np.ndarray]:
+    """Return array views of the fields of a shared memory block.
+
+    Args:
+        shared_memory (SharedMemory): Memory block.
+        layout (Layout): Layout returned by ``counterfactual_layout``.
+
+    Returns:
+        dict[str, np.ndarray]: Array view of each field.
+    """
+    return {
+        field: np.ndarray(
+            shape, dtype=np.dtype(dtype), buffer=shared_memory.buf, offset=offset
+        )
+        for field, (offset, shape, dtype) in layout.items()
+    }
@@ -0,0 +1,192 @@
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable
+
+import gymnasium as gym
+import numpy as np
+
+from pycrm.agents.sb3.wrapper.memory import (
+    FIELDS,
+    Layout,
+    SharedCounterfactualBatch,
+    counterfactual_views,
+)
+from pycrm.crossproduct import CounterfactualBuffer
+
+
+class CounterfactualStepWrapper(gym.Wrapper):
+    """Wrapper fusing an environment step with counterfactual generation.
+
+    Tracks the latest observation of the wrapped cross product so that the
+    ground observations of a step never have to be passed in by the vectorised
+    environment, or sent over a pipe to a worker process.
+    """
+
+    def __init__(self, env: gym.Env) -> None:
+        """Wrap the environment."""
+        super().__init__(env)
+        self._obs: Any = None
+        self._shared_memory: SharedMemory | None = None
+        self._slots: list[CounterfactualBuffer] = []
+        self._slot = 0
+        self._deferred: tuple | None = None
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        """Set an attribute, delegating attributes the wrapper does not own.
+
+        Vectorised environments set attributes on the wrapper, e.g. through
+        ``set_attr``. Attributes of the wrapper are set on the wrapper, others on
+        the first wrapped environment defining them, or on the unwrapped
+        environment if none does.
+        """
+        if (
+            name.startswith("_")
+            or "env" not in self.__dict__
+            or name in self.__dict__
+            or hasattr(type(self), name)
+        ):
+            super().__setattr__(name, value)
+            return
+
+        env = self.env
+        while (
+            isinstance(env, gym.Wrapper)
+            and name not in vars(env)
+            and not hasattr(type(env), name)
+        ):
+            env = env.env
+        setattr(env, name, value)
+
+    def reset(self, **kwargs) -> tuple[Any, dict]:
+        """Reset the environment and record the initial observation."""
+        self._obs, info = self.env.reset(**kwargs)
+        return self._obs, info
+
+    def step(self, action: Any) -> tuple[Any, Any, bool, bool, dict]:
+        """Step the environment and record the next observation."""
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        self._obs = obs
+        return obs, reward, terminated, truncated, info
+
+    def counterfactual_spec(self) -> tuple[int, tuple[int, ...], str]:
+        """Return the capacity and observation layout of a counterfactual batch.
+
+        Returns:
+            tuple[int, tuple[int, ...], str]: Maximum number of counterfactual
+                experiences per step, and the shape and data type of a cross
+                product observation.
+        """
+        cross_product: Any = self.env.unwrapped
+        obs = np.asarray(self._obs)
+        capacity = len(cross_product.counterfactual_sources()[0])
+        return capacity, obs.shape, obs.dtype.str
+
+    def attach_counterfactual_memory(self, name: str, layout: Layout) -> None:
+        """Write counterfactual experience to a ring of shared memory slots.
+
+        Args:
+            name: Name of the shared memory block.
+            layout: Layout of the counterfactual batches in the block.
+        """
+        self._shared_memory = SharedMemory(name=name)
+        views = counterfactual_views(self._shared_memory, layout)
+        self._slots = [
+            CounterfactualBuffer.from_arrays(*(views[field][i] for field in FIELDS))
+            for i in range(len(views["obs"]))
+        ]
+        self._slot = 0
+
+    def close(self) -> None:
+        """Close the environment and detach from shared memory."""
+        super().close()
+        self._slots = []
+        if self._shared_memory is not None:
+            self._shared_memory.close()
+            self._shared_memory = None
+
+    def _generate_counterfactuals(
+        self, ground_obs: Any, buffer_action: Any, next_ground_obs: Any
+    ) -> tuple | SharedCounterfactualBatch:
+        """Generate counterfactual experience, in shared memory if attached."""
+        cross_product: Any = self.env.unwrapped
+        if self._slots:
+            slot = self._slot
+            try:
+                *_, n = cross_product.generate_counterfactual_batch(
+                    ground_obs, buffer_action, next_ground_obs, out=self._slots[slot]
+                )
+            except ValueError:
+                # The batch outgrew its slot, fall back to the pipe
+                pass
+            else:
+                self._slot = (slot + 1) % len(self._slots)
+                return SharedCounterfactualBatch(slot, n)
+        return cross_product.generate_counterfactual_experience(
+            ground_obs, buffer_action, next_ground_obs
+        )
+
+    def generate_deferred_counterfactuals(self) -> tuple | SharedCounterfactualBatch:
+        """Generate the counterfactual experience deferred by the last step."""
+        assert self._deferred is not None, "No counterfactual experience deferred"
+        deferred, self._deferred = self._deferred, None
+        return self._generate_counterfactuals(*deferred)
+
+    def step_counterfactual(
+        self, action: Any, buffer_action: Any, defer: bool = False
+    ) -> tuple:
+        """Step the environment and generate counterfactual experience.
+
+        Follows the step semantics of the ``SubprocVecEnv`` worker, including
+        the automatic reset of finished episodes.
+
+        Args:
+            action: Action passed to the environment.
+            buffer_action: Action stored with the counterfactual experience.
+            defer: Whether to leave the counterfactual experience to a later
+                call of ``generate_deferred_counterfactuals``, so the step can
+                be replied to first.
+
+        Returns:
+            tuple: Observation, reward, done, info and reset info of the step,
+                followed by the counterfactual experience it generated, its
+                location in shared memory, or None if it was deferred.
+        """
+        cross_product: Any = self.env.unwrapped
+        ground_obs = cross_product.to_ground_obs(self._obs)
+
+        observation, reward, done, info, reset_info = self.step_and_reset(action)
+        next_obs = info["terminal_observation"] if done else observation
+
+        deferred = (ground_obs, buffer_action, cross_product.to_ground_obs(next_obs))
+        counterfactuals = None
+        if defer:
+            self._deferred = deferred
+        else:
+            counterfactuals = self._generate_counterfactuals(*deferred)
+        return observation, reward, done, info, reset_info, counterfactuals
+
+    def step_and_reset(self, action: Any) -> tuple[Any, Any, bool, dict, dict]:
+        """Step the environment, resetting it once the episode is finished.
+
+        Follows the step semantics of the ``SubprocVecEnv`` worker.
+
+        Args:
+            action: Action passed to the environment.
+
+        Returns:
+            tuple: Observation, reward, done, info and reset info of the step.
+        """
+        observation, reward, terminated, truncated, info = self.step(action)
+        done = terminated or truncated
+        info["TimeLimit.truncated"] = truncated and not terminated
+
+        reset_info: dict = {}
+        if done:
+            # save final observation where user can get it, then reset
+            info["terminal_observation"] = observation
+            observation, reset_info = self.reset()
+        return observation, reward, done, info, reset_info
+
+
+def make_counterfactual_env(env_fn: Callable[[], gym.Env]) -> gym.Env:
+    """Create an environment wrapped for fused counterfactual steps."""
+    return CounterfactualStepWrapper(env_fn())
@@ -1,12 +1,108 @@
-from typing import Any
+from functools import partial
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Sequence
 
+import gymnasium as gym
+import numpy as np
 from stable_baselines3.common.vec_env import SubprocVecEnv
-from stable_baselines3.common.vec_env.base_vec_env import VecEnvIndices
+from stable_baselines3.common.vec_env.base_vec_env import VecEnvIndices, VecEnvObs
+from stable_baselines3.common.vec_env.subproc_vec_env import _stack_obs
+
+from pycrm.agents.sb3.wrapper.memory import (
+    FIELDS,
+    SharedCounterfactualBatch,
+    counterfactual_layout,
+    counterfactual_views,
+)
+from pycrm.agents.sb3.wrapper.step import make_counterfactual_env
+
+
+class DispatchFuture:
+    """Handle to the replies of method calls dispatched to worker processes.
+
+    Replies arrive through the pipes in the order the calls were sent, so the
+    environment that created a handle resolves it before sending anything else
+    to its workers.
+    """
+
+    def __init__(
+        self,
+        remotes: Sequence[Connection],
+        transform: Callable[[list[Any]], list[Any]] | None = None,
+    ) -> None:
+        """Wait for replies from the given workers.
+
+        Args:
+            remotes: Pipes to the workers the calls were sent to.
+            transform: Function applied to the replies once received.
+        """
+        super().__init__()
+        self._remotes = remotes
+        self._transform = transform
+        self._results: list[Any] | None = None
+
+    def done(self) -> bool:
+        """Return whether every worker has replied."""
+        return self._results is not None or all(
+            remote.poll() for remote in self._remotes
+        )
+
+    def result(self) -> list[Any]:
+        """Return the replies, waiting for any outstanding worker.
+
+        Returns:
+            A list of the return values of the method calls.
+        """
+        if self._results is None:
+            results = [remote.recv() for remote in self._remotes]
+            if self._transform is not None:
+                results = self._transform(results)
+            self._results = results
+        return self._results
 
 
 class DispatchSubprocVecEnv(SubprocVecEnv):
     """Enables user to dispatch method calls to multiple environments in parallel."""
 
+    def __init__(
+        self,
+        env_fns: list[Callable[[], gym.Env]],
+        start_method: str | None = None,
+        shared_memory: bool = False,
+        n_shared_memory_slots: int = 2,
+    ) -> None:
+        """Start a worker process for each environment.
+
+        Args:
+            env_fns: Functions creating the environments.
+            start_method: Multiprocessing start method.
+            shared_memory: Whether ``step_counterfactual`` transfers counterfactual
+                experience through shared memory instead of the pipes.
+            n_shared_memory_slots: Number of counterfactual batches each worker
+                keeps in shared memory before overwriting the oldest. At least
+                two with shared memory, since ``step_counterfactual_async`` lets
+                a worker write the batch of a step while the batch of the
+                previous step is still being read.
+
+        Raises:
+            ValueError: If shared memory is enabled with fewer than two slots.
+        """
+        if shared_memory and n_shared_memory_slots < 2:
+            raise ValueError(
+                "n_shared_memory_slots must be at least 2 with shared memory, "
+                + f"got {n_shared_memory_slots}"
+            )
+        self._pending: DispatchFuture | None = None
+        super().__init__(
+            [partial(make_counterfactual_env, env_fn) for env_fn in env_fns],
+            start_method=start_method,
+        )
+        self.shared_memory = shared_memory
+        self.n_shared_memory_slots = n_shared_memory_slots
+        self._shared_memory: list[SharedMemory] = []
+        self._counterfactual_views: list[dict[str, np.ndarray]] = []
+
     def dispatched_env_method(
         self,
         method_name: str,
@@ -23,9 +119,193 @@ class DispatchSubprocVecEnv(SubprocVecEnv):
         Returns:
             A list of the return values of the method calls.
         """
+        return self.dispatch_async(method_name, *method_args, indices=indices).result()
+
+    def dispatch_async(
+        self,
+        method_name: str,
+        *method_args,
+        indices: VecEnvIndices | None = None,
+    ) -> DispatchFuture:
+        """Dispatch a method call to the specified environments without waiting.
+
+        Args:
+            method_name: The name of the method to call.
+            *method_args: The arguments to pass to the method.
+            indices: The indices of the environments to call the method on.
+
+        Returns:
+            A handle to the return values of the method calls.
+        """
         target_remotes = self._get_target_remotes(indices)
 
         for job in zip(target_remotes, *method_args, strict=True):
             remote, args = job[0], job[1:]
             remote.send(("env_method", (method_name, args, {})))
-        return [remote.recv() for remote in target_remotes]
+        self._pending = DispatchFuture(target_remotes)
+        return self._pending
+
+    def step_counterfactual(
+        self, actions: np.ndarray, buffer_actions: np.ndarray
+    ) -> tuple[VecEnvObs, np.ndarray, np.ndarray, list[dict], list[tuple]]:
+        """Step every environment and generate its counterfactual experience.
+
+        Each worker steps its environment and generates the counterfactual
+        experience of the step locally, so a step costs a single round-trip per
+        environment.
+
+        With shared memory enabled, workers write counterfactual experience to a
+        ring of slots and only send its location over the pipe. The returned
+        arrays are then views of a slot, without info dicts, and remain valid
+        until the worker wraps around the ring ``n_shared_memory_slots`` steps
+        later.
+
+        Args:
+            actions: Actions passed to the environments.
+            buffer_actions: Actions stored with the counterfactual experience.
+
+        Returns:
+            tuple: Observations, rewards, dones and infos as returned by ``step``,
+                and the counterfactual experience of each environment.
+        """
+        obs, rewards, dones, infos, counterfactuals = self._step_counterfactual(
+            actions, buffer_actions, defer=False
+        )
+        return obs, rewards, dones, infos, self._read_counterfactuals(counterfactuals)
+
+    def step_counterfactual_async(
+        self, actions: np.ndarray, buffer_actions: np.ndarray
+    ) -> tuple[VecEnvObs, np.ndarray, np.ndarray, list[dict], DispatchFuture]:
+        """Step every environment and generate its counterfactual experience later.
+
+        Workers reply to the step before generating the counterfactual
+        experience, so generation overlaps with whatever the caller does until
+        it collects the returned handle, such as a gradient step.
+
+        Args:
+            actions: Actions passed to the environments.
+            buffer_actions: Actions stored with the counterfactual experience.
+
+        Returns:
+            tuple: Observations, rewards, dones and infos as returned by ``step``,
+                and a handle to the counterfactual experience of each
+                environment.
+        """
+        obs, rewards, dones, infos, _ = self._step_counterfactual(
+            actions, buffer_actions, defer=True
+        )
+        for remote in self.remotes:
+            remote.send(("env_method", ("generate_deferred_counterfactuals", (), {})))
+        self._pending = DispatchFuture(self.remotes, self._read_counterfactuals)
+        return obs, rewards, dones, infos, self._pending
+
+    def _step_counterfactual(
+        self, actions: np.ndarray, buffer_actions: np.ndarray, defer: bool
+    ) -> tuple[VecEnvObs, np.ndarray, np.ndarray, list[dict], list[Any]]:
+        """Step every environment and return the replies of the workers."""
+        self._resolve_pending()
+        if self.shared_memory and not self._shared_memory:
+            self._attach_shared_memory(buffer_actions)
+
+        for remote, action, buffer_action in zip(
+            self.remotes, actions, buffer_actions, strict=True
+        ):
+            remote.send(
+                (
+                    "env_method",
+                    ("step_counterfactual", (action, buffer_action, defer), {}),
+                )
+            )
+        results = [remote.recv() for remote in self.remotes]
+
+        obs, rewards, dones, infos, reset_infos, counterfactuals = zip(
+            *results, strict=True
+        )
+        self.reset_infos = list(reset_infos)
+        return (
+            _stack_obs(obs, self.observation_space),  # type: ignore
+            np.stack(rewards),
+            np.stack(dones),
+            list(infos),
+            list(counterfactuals),
+        )
+
+    def _read_counterfactuals(self, counterfactuals: list[Any]) -> list[tuple]:
+        """Replace the locations of batches in shared memory with the batches."""
+        return [
+            self._read_shared_batch(i, batch)
+            if isinstance(batch, SharedCounterfactualBatch)
+            else batch
+            for i, batch in enumerate(counterfactuals)
+        ]
+
+    def _resolve_pending(self) -> None:
+        """Receive the replies of the last asynchronous dispatch, if any."""
+        if self._pending is not None:
+            self._pending.result()
+            self._pending = None
+
+    def _get_target_remotes(self, indices: VecEnvIndices) -> list[Any]:
+        """Return the pipes to the given workers once they are free to receive."""
+        self._resolve_pending()
+        return super()._get_target_remotes(indices)
+
+    def step_async(self, actions: np.ndarray) -> None:
+        """Tell all the environments to start taking a step."""
+        self._resolve_pending()
+        super().step_async(actions)
+
+    def reset(self) -> VecEnvObs:
+        """Reset all the environments and return their observations."""
+        self._resolve_pending()
+        return super().reset()
+
+    def _attach_shared_memory(self, buffer_actions: np.ndarray) -> None:
+        """Allocate a shared memory ring for each worker and attach the workers."""
+        action = np.asarray(buffer_actions[0])
+        for remote in self.remotes:
+            remote.send(("env_method", ("counterfactual_spec", (), {})))
+        specs = [remote.recv() for remote in self.remotes]
+
+        for remote, (capacity, obs_shape, obs_dtype) in zip(
+            self.remotes, specs, strict=True
+        ):
+            layout, size = counterfactual_layout(
+                self.n_shared_memory_slots,
+                capacity,
+                obs_shape,
+                obs_dtype,
+                action.shape,
+                action.dtype.str,
+            )
+            shared_memory = SharedMemory(create=True, size=size)
+            self._shared_memory.append(shared_memory)
+            self._counterfactual_views.append(
+                counterfactual_views(shared_memory, layout)
+            )
+            remote.send(
+                (
+                    "env_method",
+                    ("attach_counterfactual_memory", (shared_memory.name, layout), {}),
+                )
+            )
+        for remote in self.remotes:
+            remote.recv()
+
+    def _read_shared_batch(
+        self, index: int, batch: SharedCounterfactualBatch
+    ) -> tuple[np.ndarray | None, ...]:
+        """Return views of a counterfactual batch in the shared memory of a worker."""
+        views = self._counterfactual_views[index]
+        return (*(views[field][batch.slot, : batch.n] for field in FIELDS), None)
+
+    def close(self) -> None:
+        """Close the environments and release their shared memory."""
+        if not self.closed:
+            self._resolve_pending()
+        super().close()
+        self._counterfactual_views = []
+        for shared_memory in self._shared_memory:
+            shared_memory.unlink()
+            shared_memory.close()
+        self._shared_memory = []
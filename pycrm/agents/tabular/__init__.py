@@ -1,4 +1,11 @@
 from pycrm.agents.tabular.cql import CounterfactualQLearningAgent
+from pycrm.agents.tabular.multiseed import MultiSeedQLearning
 from pycrm.agents.tabular.ql import QLearningAgent
+from pycrm.agents.tabular.table import QTable
 
-__all__ = ["QLearningAgent", "CounterfactualQLearningAgent"]
+__all__ = [
+    "QLearningAgent",
+    "CounterfactualQLearningAgent",
+    "MultiSeedQLearning",
+    "QTable",
+]
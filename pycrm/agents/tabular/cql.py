@@ -1,3 +1,5 @@
+import os
+
 import numpy as np
 from tqdm import tqdm
 
@@ -8,21 +10,40 @@ from pycrm.crossproduct import CrossProduct
 class CounterfactualQLearningAgent(QLearningAgent):
     """Counterfactual Q-Learning Agent."""
 
-    def learn(self, total_episodes: int) -> np.ndarray:
-        """Train the agent using counterfactual experience generation."""
+    def learn(
+        self,
+        total_episodes: int,
+        checkpoint_path: str | os.PathLike | None = None,
+        checkpoint_freq: int = 1000,
+    ) -> np.ndarray:
+        """Train the agent using counterfactual experience generation.
+
+        Args:
+            total_episodes (int): Number of episodes to train for.
+            checkpoint_path (str | os.PathLike | None): Directory to save a
+                checkpoint to every ``checkpoint_freq`` episodes and at the end of
+                training. If it already holds a checkpoint, training resumes from
+                it.
+            checkpoint_freq (int): Number of episodes between checkpoints.
+
+        Returns:
+            np.ndarray: Return of every episode.
+        """
         assert isinstance(self.env.unwrapped, CrossProduct)
-        returns = []
+        returns = self._resume(checkpoint_path)
 
-        for _ in tqdm(range(total_episodes)):
+        for _ in tqdm(
+            range(len(returns), total_episodes),
+            initial=len(returns),
+            total=total_episodes,
+        ):
             obs, _ = self.env.reset()
             done = False
             return_ = 0
             ep_len = 0
 
             while not done:
-                if np.random.random() < self.epsilon or np.all(
-                    self.q_table[tuple(obs)] == 0
-                ):
+                if np.random.random() < self.epsilon or np.all(self.q_table[obs] == 0):
                     action = np.random.randint(0, self.env.action_space.n)  # type: ignore
                 else:
                     action = self.get_action(obs)
@@ -31,28 +52,56 @@ class CounterfactualQLearningAgent(QLearningAgent):
                 reward = float(reward)
                 done = terminated or truncated
 
-                for o, a, o_, r, d, _ in zip(
-                    *self.env.unwrapped.generate_counterfactual_experience(
+                self._update_batch(
+                    *self.env.unwrapped.generate_counterfactual_batch(
                         self.env.unwrapped.to_ground_obs(obs),
                         action,
                         self.env.unwrapped.to_ground_obs(next_obs),
-                    ),
-                    strict=True,
-                ):
-                    if not d:
-                        self.q_table[tuple(o)][a] += self.learning_rate * (
-                            r
-                            + self.discount_factor * np.max(self.q_table[tuple(o_)])
-                            - self.q_table[tuple(o)][a]
-                        )
-                    else:
-                        self.q_table[tuple(o)][a] += self.learning_rate * (
-                            r - self.q_table[tuple(o)][a]
-                        )
+                    )[:5]
+                )
 
                 return_ += reward
                 obs = next_obs
                 ep_len += 1
 
             returns.append(return_)
+            self._checkpoint(checkpoint_path, checkpoint_freq, returns, total_episodes)
         return np.array(returns)
+
+    def _update_batch(
+        self,
+        obs: np.ndarray,
+        actions: np.ndarray,
+        next_obs: np.ndarray,
+        rewards: np.ndarray,
+        dones: np.ndarray,
+    ) -> None:
+        """Apply the Q-learning update of a batch of experiences at once.
+
+        Every update is computed from the Q-values before the batch, and the
+        updates of duplicate observation-action pairs are summed.
+
+        Args:
+            obs (np.ndarray): Observations of shape (N, ...).
+            actions (np.ndarray): Actions of shape (N,).
+            next_obs (np.ndarray): Next observations of shape (N, ...).
+            rewards (np.ndarray): Rewards of shape (N,).
+            dones (np.ndarray): Whether each experience is terminal, of shape (N,).
+        """
+        if len(obs) == 0:
+            return
+        rows = self.q_table.index_batch(obs)
+        # Terminal experiences do not bootstrap, so their next observations are
+        # not added to the table
+        bootstrap = ~np.asarray(dones, dtype=np.bool_)
+        next_rows = self.q_table.index_batch(next_obs[bootstrap])
+
+        q_values = self.q_table.values
+        actions = np.asarray(actions, dtype=np.int64).reshape(-1)
+        targets = np.array(rewards, dtype=np.float64)
+        targets[bootstrap] += self.discount_factor * q_values[next_rows].max(axis=1)
+        np.add.at(
+            q_values,
+            (rows, actions),
+            self.learning_rate * (targets - q_values[rows, actions]),
+        )
@@ -0,0 +1,206 @@
+import numpy as np
+from tqdm import tqdm
+
+from pycrm.agents.tabular.table import QTable
+from pycrm.crossproduct import CrossProductVecEnv
+
+
+class MultiSeedQLearning:
+    """Trains independent tabular Q-learning agents in lockstep.
+
+    Copy ``i`` of a ``CrossProductVecEnv`` is the environment of seed ``i``. All
+    seeds act and learn in a single vectorised step, with the Q-values of every
+    seed stacked in one ``QTable``: the row of an observation holds the Q-values
+    of each seed in turn, and ``q_values`` views them as an array of shape
+    (S, states, actions). Each seed only ever learns from the transitions of its
+    own copy, so seeds are as independent as separate runs of
+    ``QLearningAgent`` or ``CounterfactualQLearningAgent``.
+    """
+
+    def __init__(
+        self,
+        env: CrossProductVecEnv,
+        epsilon: float = 0.01,
+        learning_rate: float = 0.01,
+        discount_factor: float = 0.99,
+        counterfactual: bool = False,
+        q_table: QTable | None = None,
+        seed: int | None = None,
+    ) -> None:
+        """Initialise the trainer.
+
+        Args:
+            env (CrossProductVecEnv): Vectorised cross product with a copy per
+                seed and a discrete action space.
+            epsilon (float): Probability of taking a random action.
+            learning_rate (float): Learning rate.
+            discount_factor (float): Discount factor.
+            counterfactual (bool): Whether to learn from counterfactual
+                experience, as ``CounterfactualQLearningAgent`` does.
+            q_table (QTable | None): Q-table with ``S * n_actions`` values per
+                row, for example a dense table. If None, an empty hashed table is
+                used.
+            seed (int | None): Seed of the exploration of every seed and of the
+                environment copies.
+
+        Raises:
+            ValueError: If the Q-table does not hold the Q-values of every seed.
+        """
+        super().__init__()
+        self.env = env
+        self.epsilon = epsilon
+        self.learning_rate = learning_rate
+        self.discount_factor = discount_factor
+        self.counterfactual = counterfactual
+        self.seed = seed
+
+        self.n_seeds = env.num_envs
+        self.n_actions = int(env.single_action_space.n)  # type: ignore
+        if q_table is None:
+            q_table = QTable(self.n_seeds * self.n_actions)
+        elif q_table.n_actions != self.n_seeds * self.n_actions:
+            raise ValueError(
+                f"Q-table with {q_table.n_actions} values per row cannot hold "
+                + f"{self.n_actions} Q-values for each of {self.n_seeds} seeds"
+            )
+        self.q_table = q_table
+        self._rng = np.random.default_rng(seed)
+        self._seeds = np.arange(self.n_seeds)
+
+    @property
+    def q_values(self) -> np.ndarray:
+        """View of the Q-values of every seed, of shape (S, states, actions)."""
+        return self._stacked_values().transpose(1, 0, 2)
+
+    def get_actions(self, obs: np.ndarray) -> np.ndarray:
+        """Get the action with the largest Q-value of each seed.
+
+        Args:
+            obs (np.ndarray): Observation of each seed, of shape (S, ...).
+
+        Returns:
+            np.ndarray: Action of each seed, of shape (S,).
+        """
+        rows = self.q_table.index_batch(obs)
+        return self._stacked_values()[rows, self._seeds].argmax(axis=1)
+
+    def learn(self, total_episodes: int) -> np.ndarray:
+        """Train every seed for a number of episodes.
+
+        Copies keep stepping until every seed has finished its episodes, but a
+        seed stops learning once it has finished its own.
+
+        Args:
+            total_episodes (int): Number of episodes to train each seed for.
+
+        Returns:
+            np.ndarray: Return of every episode of each seed, of shape
+                (S, total_episodes).
+        """
+        returns = np.zeros((self.n_seeds, total_episodes))
+        episode = np.zeros(self.n_seeds, dtype=np.int64)
+        return_ = np.zeros(self.n_seeds)
+
+        obs, _ = self.env.reset(seed=self.seed)
+        with tqdm(total=self.n_seeds * total_episodes) as progress:
+            while np.any(episode < total_episodes):
+                active = episode < total_episodes
+                rows = self.q_table.index_batch(obs)
+                q_values = self._stacked_values()[rows, self._seeds]
+                explore = (self._rng.random(self.n_seeds) < self.epsilon) | np.all(
+                    q_values == 0, axis=1
+                )
+                actions = np.where(
+                    explore,
+                    self._rng.integers(0, self.n_actions, size=self.n_seeds),
+                    q_values.argmax(axis=1),
+                )
+
+                next_obs, rewards, terminated, truncated, infos = self.env.step(actions)
+                done = terminated | truncated
+                # Copies that finished were reset, so their final observations
+                # are only available in the infos
+                key = self.env.final_obs_key
+                final_obs = next_obs.copy()
+                for i in np.flatnonzero(infos.get("_" + key, [])).tolist():
+                    final_obs[i] = infos[key][i]
+
+                if self.counterfactual:
+                    cf_obs, cf_actions, cf_next_obs, cf_rewards, cf_dones, copies = (
+                        self.env.generate_counterfactual_batch(
+                            self.env.to_ground_obs(obs),
+                            actions,
+                            self.env.to_ground_obs(final_obs),
+                        )
+                    )
+                    mask = active[copies]
+                    self._update(
+                        cf_obs[mask],
+                        cf_actions[mask],
+                        cf_next_obs[mask],
+                        cf_rewards[mask],
+                        cf_dones[mask],
+                        copies[mask],
+                    )
+                else:
+                    self._update(
+                        obs[active],
+                        actions[active],
+                        final_obs[active],
+                        rewards[active],
+                        done[active],
+                        self._seeds[active],
+                    )
+
+                return_ += rewards
+                finished = np.flatnonzero(done & active)
+                returns[finished, episode[finished]] = return_[finished]
+                progress.update(len(finished))
+                episode[done] += 1
+                return_[done] = 0
+                obs = next_obs
+        return returns
+
+    def _stacked_values(self) -> np.ndarray:
+        """Return the Q-values as an array of shape (states, S, actions)."""
+        return self.q_table.values.reshape(-1, self.n_seeds, self.n_actions)
+
+    def _update(
+        self,
+        obs: np.ndarray,
+        actions: np.ndarray,
+        next_obs: np.ndarray,
+        rewards: np.ndarray,
+        dones: np.ndarray,
+        seeds: np.ndarray,
+    ) -> None:
+        """Apply the Q-learning update of a batch of experiences at once.
+
+        Every update is computed from the Q-values before the batch, and the
+        updates of duplicate experiences of a seed are summed.
+
+        Args:
+            obs (np.ndarray): Observations of shape (N, ...).
+            actions (np.ndarray): Actions of shape (N,).
+            next_obs (np.ndarray): Next observations of shape (N, ...).
+            rewards (np.ndarray): Rewards of shape (N,).
+            dones (np.ndarray): Whether each experience is terminal, of shape (N,).
+            seeds (np.ndarray): Seed learning from each experience, of shape (N,).
+        """
+        if len(obs) == 0:
+            return
+        rows = self.q_table.index_batch(obs)
+        bootstrap = ~np.asarray(dones, dtype=np.bool_)
+        next_rows = self.q_table.index_batch(next_obs[bootstrap])
+
+        q_values = self._stacked_values()
+        actions = np.asarray(actions, dtype=np.int64).reshape(-1)
+        targets = np.array(rewards, dtype=np.float64)
+        targets[bootstrap] += self.discount_factor * q_values[
+            next_rows, seeds[bootstrap]
+        ].max(axis=1)
+        np.add.at(
+            q_values,
+            (rows, seeds, actions),
+            self.learning_rate * (targets - q_values[rows, seeds, actions]),
+        )
@@ -1,9 +1,14 @@
-from collections import defaultdict
+import os
+import shutil
+from pathlib import Path
+from typing import Literal
 
 import gymnasium as gym
 import numpy as np
 from tqdm import tqdm
 
+from pycrm.agents.tabular.table import QTable, _replace_dir
+
 
 class QLearningAgent:
     """Q-Learning Agent."""
@@ -14,31 +19,125 @@ class QLearningAgent:
         epsilon: float = 0.01,
         learning_rate: float = 0.01,
         discount_factor: float = 0.99,
+        q_table: QTable | None = None,
     ) -> None:
-        """Initialise the Q-Learning agent."""
+        """Initialise the Q-Learning agent.
+
+        Args:
+            env (gym.Env): Environment to train on.
+            epsilon (float): Probability of taking a random action.
+            learning_rate (float): Learning rate.
+            discount_factor (float): Discount factor.
+            q_table (QTable | None): Q-table to train, for example a dense table
+                created with ``QTable.from_space``. If None, an empty hashed
+                table is used.
+        """
         self.env = env
         self.epsilon = epsilon
         self.learning_rate = learning_rate
         self.discount_factor = discount_factor
-        self.q_table = defaultdict(lambda: np.zeros(env.action_space.n))  # type: ignore
+        self.q_table = (
+            q_table if q_table is not None else QTable(env.action_space.n)  # type: ignore
+        )
 
     def get_action(self, obs: np.ndarray) -> int:
         """Get the action with the largest Q-value."""
-        return int(np.argmax(self.q_table[tuple(obs)]))
+        return int(np.argmax(self.q_table[obs]))
+
+    def save_checkpoint(
+        self, path: str | os.PathLike, returns: list[float] | np.ndarray
+    ) -> None:
+        """Save the Q-table and training progress to a directory.
+
+        The checkpoint is written next to ``path`` and then moved into place, so
+        an interrupted save leaves any previous checkpoint at ``path`` intact.
+
+        Args:
+            path (str | os.PathLike): Directory to save the checkpoint to.
+            returns (list[float] | np.ndarray): Returns of the episodes trained
+                so far.
+        """
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+
+        self.q_table.save(tmp / "q_table")
+        _, rng_keys, rng_pos, rng_has_gauss, rng_gauss = np.random.get_state()
+        np.savez(
+            tmp / "progress.npz",
+            returns=np.asarray(returns, dtype=np.float64),
+            rng_keys=rng_keys,
+            rng_state=np.array([rng_pos, rng_has_gauss, rng_gauss], dtype=np.float64),
+        )
+        _replace_dir(tmp, path)
+
+    def load_checkpoint(
+        self,
+        path: str | os.PathLike,
+        mmap_mode: Literal["r", "r+", "c"] | None = "c",
+    ) -> np.ndarray:
+        """Load a checkpoint saved with ``save_checkpoint``.
+
+        The Q-table of the agent is replaced by the saved one, memory-mapped as
+        described in ``QTable.load``, and the state of the global NumPy random
+        number generator is restored.
 
-    def learn(self, total_episodes: int) -> np.ndarray:
-        """Train the agent."""
-        returns = []
+        Args:
+            path (str | os.PathLike): Directory the checkpoint was saved to.
+            mmap_mode (Literal["r", "r+", "c"] | None): Memory-map mode of the
+                Q-table arrays. If None, the Q-table is read into memory.
 
-        for _ in tqdm(range(total_episodes)):
+        Returns:
+            np.ndarray: Returns of the episodes trained before the checkpoint.
+        """
+        path = Path(path)
+        self.q_table = QTable.load(path / "q_table", mmap_mode=mmap_mode)
+        with np.load(path / "progress.npz") as progress:
+            rng_pos, rng_has_gauss, rng_gauss = progress["rng_state"].tolist()
+            np.random.set_state(
+                (
+                    "MT19937",
+                    progress["rng_keys"],
+                    int(rng_pos),
+                    int(rng_has_gauss),
+                    rng_gauss,
+                )
+            )
+            return progress["returns"]
+
+    def learn(
+        self,
+        total_episodes: int,
+        checkpoint_path: str | os.PathLike | None = None,
+        checkpoint_freq: int = 1000,
+    ) -> np.ndarray:
+        """Train the agent.
+
+        Args:
+            total_episodes (int): Number of episodes to train for.
+            checkpoint_path (str | os.PathLike | None): Directory to save a
+                checkpoint to every ``checkpoint_freq`` episodes and at the end of
+                training. If it already holds a checkpoint, training resumes from
+                it.
+            checkpoint_freq (int): Number of episodes between checkpoints.
+
+        Returns:
+            np.ndarray: Return of every episode.
+        """
+        returns = self._resume(checkpoint_path)
+
+        for _ in tqdm(
+            range(len(returns), total_episodes),
+            initial=len(returns),
+            total=total_episodes,
+        ):
             obs, _ = self.env.reset()
             done = False
             return_ = 0
 
             while not done:
-                if np.random.random() < self.epsilon or np.all(
-                    self.q_table[tuple(obs)] == 0
-                ):
+                if np.random.random() < self.epsilon or np.all(self.q_table[obs] == 0):
                     action = np.random.randint(0, self.env.action_space.n)  # type: ignore
                 else:
                     action = self.get_action(obs)
@@ -47,19 +146,37 @@ class QLearningAgent:
                 reward = float(reward)
                 done = terminated or truncated
 
+                target = reward
                 if not done:
-                    self.q_table[tuple(obs)][action] += self.learning_rate * (
-                        reward
-                        + self.discount_factor * np.max(self.q_table[tuple(next_obs)])
-                        - self.q_table[tuple(obs)][action]
-                    )
-                else:
-                    self.q_table[tuple(obs)][action] += self.learning_rate * (
-                        reward - self.q_table[tuple(obs)][action]
-                    )
+                    target += self.discount_factor * np.max(self.q_table[next_obs])
+                # Looked up after the next observation, which may add a row and
+                # reallocate the table
+                q_values = self.q_table[obs]
+                q_values[action] += self.learning_rate * (target - q_values[action])
 
                 return_ += reward
                 obs = next_obs
 
             returns.append(return_)
+            self._checkpoint(checkpoint_path, checkpoint_freq, returns, total_episodes)
         return np.array(returns)
+
+    def _resume(self, checkpoint_path: str | os.PathLike | None) -> list[float]:
+        """Load the checkpoint at a path if there is one, returning its returns."""
+        if checkpoint_path is None or not Path(checkpoint_path).exists():
+            return []
+        # Training updates every row, so the table is read into memory
+        return self.load_checkpoint(checkpoint_path, mmap_mode=None).tolist()
+
+    def _checkpoint(
+        self,
+        checkpoint_path: str | os.PathLike | None,
+        checkpoint_freq: int,
+        returns: list[float],
+        total_episodes: int,
+    ) -> None:
+        """Save a checkpoint if one is due after the last episode."""
+        if checkpoint_path is not None and (
+            len(returns) % checkpoint_freq == 0 or len(returns) == total_episodes
+        ):
+            self.save_checkpoint(checkpoint_path, returns)
@@ -0,0 +1,458 @@
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Literal
+
+import gymnasium as gym
+import numpy as np
+
+# Hashed batches up to this size are indexed through the row cache, as the
+# fixed cost of vectorised probing exceeds the cost of per-row dict lookups
+_CACHED_BATCH_SIZE = 128
+
+# Keys still probing in a vectorised lookup are finished one by one once there
+# are at most this many left
+_PROBE_TAIL_SIZE = 8
+
+# Seed of the odd multipliers mixing observation dimensions into the hash
+_HASH_SEED = 0x5EED
+# Multipliers of the splitmix64 finaliser
+_MIX = (np.uint64(0xBF58476D1CE4E5B9), np.uint64(0x94D049BB133111EB))
+
+# Version of the on-disk layout written by ``QTable.save``
+_FORMAT_VERSION = 1
+
+
+class QTable:
+    """Array-backed table of Q-values indexed by discrete observations.
+
+    Observations are mapped to rows of ``values``, an array of shape
+    (n_rows, n_actions). If the bounds ``low`` and ``high`` of the observations
+    are given, every observation in the box has a precomputed row given by its
+    mixed-radix index and the whole table is allocated up front. Otherwise
+    observations are stored in a compact open-addressing hash table and rows
+    are allocated as new observations are seen.
+
+    Indexing the table with an observation returns a writable view of its row,
+    allocating the row if the observation is new, as a ``defaultdict`` keyed by
+    ``tuple(obs)`` would. All state is held in NumPy arrays, so the table can be
+    pickled and its arrays memory-mapped. Tables loaded read-only never allocate
+    rows, and unseen observations share a row of default Q-values instead.
+    """
+
+    def __init__(
+        self,
+        n_actions: int,
+        low: Any = None,
+        high: Any = None,
+        capacity: int = 1024,
+    ) -> None:
+        """Create an empty Q-table.
+
+        Args:
+            n_actions (int): Number of actions.
+            low (Any): Lower bound of each observation dimension. If given with
+                ``high``, the table is dense.
+            high (Any): Upper bound of each observation dimension, inclusive.
+            capacity (int): Initial number of rows of a hashed table.
+        """
+        super().__init__()
+        if (low is None) != (high is None):
+            raise ValueError("Both or neither of low and high must be given")
+
+        self.n_actions = n_actions
+        self.dense = low is not None
+        self.read_only = False
+        self.n_keys = 0
+        self._rows: dict[tuple[int, bytes], int] = {}
+
+        if low is not None and high is not None:
+            self.low = np.asarray(low, dtype=np.int64).reshape(-1)
+            self.high = np.asarray(high, dtype=np.int64).reshape(-1)
+            if self.low.shape != self.high.shape or np.any(self.high < self.low):
+                raise ValueError(
+                    f"Invalid Q-table bounds low={self.low.tolist()} "
+                    + f"high={self.high.tolist()}"
+                )
+            dims = self.high - self.low + 1
+            self.strides = np.ones_like(dims)
+            self.strides[:-1] = np.cumprod(dims[::-1])[::-1][1:]
+            self.values = np.zeros((int(np.prod(dims)), n_actions), dtype=np.float64)
+            self.visited = np.zeros(len(self.values), dtype=np.bool_)
+        else:
+            capacity = max(capacity, 1)
+            self.values = np.zeros((capacity, n_actions), dtype=np.float64)
+            self.keys = np.zeros((capacity, 0), dtype=np.float64)
+            self.slots = np.full(
+                1 << int(2 * capacity - 1).bit_length(), -1, dtype=np.int64
+            )
+            self._multipliers = np.zeros(0, dtype=np.uint64)
+
+    @classmethod
+    def from_space(cls, space: gym.Space, n_actions: int) -> "QTable":
+        """Create a Q-table for the observations of a space.
+
+        The table is dense if the space is discrete and bounded, and hashed
+        otherwise.
+
+        Args:
+            space (gym.Space): Observation space.
+            n_actions (int): Number of actions.
+
+        Returns:
+            QTable: Empty Q-table.
+        """
+        if isinstance(space, gym.spaces.Discrete):
+            return cls(n_actions, low=space.start, high=space.start + space.n - 1)
+        if isinstance(space, gym.spaces.MultiDiscrete):
+            return cls(n_actions, low=space.start, high=space.start + space.nvec - 1)
+        if (
+            isinstance(space, gym.spaces.Box)
+            and np.issubdtype(space.dtype, np.integer)
+            and space.is_bounded()
+        ):
+            return cls(n_actions, low=space.low, high=space.high)
+        return cls(n_actions)
+
+    @classmethod
+    def load(
+        cls,
+        path: str | os.PathLike,
+        mmap_mode: Literal["r", "r+", "c"] | None = "c",
+    ) -> "QTable":
+        """Load a Q-table saved with ``save``.
+
+        The arrays are memory-mapped by default, so a table is only read from
+        disk as its rows are used. In the default copy-on-write mode, updates
+        stay in memory and the files are left unchanged. In read-only mode,
+        unseen observations are given default Q-values of zero without
+        allocating a row.
+
+        Args:
+            path (str | os.PathLike): Directory the table was saved to.
+            mmap_mode (Literal["r", "r+", "c"] | None): Memory-map mode of the
+                arrays, as in ``np.load``. If None, the arrays are read into
+                memory.
+
+        Returns:
+            QTable: Loaded Q-table.
+
+        Raises:
+            ValueError: If the directory does not hold a Q-table in a supported
+                format.
+        """
+        path = Path(path)
+        with open(path / "table.json") as f:
+            header = json.load(f)
+        if header.get("format") != _FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported Q-table format {header.get('format')} in {path}"
+            )
+
+        def array(name: str) -> np.ndarray:
+            return np.load(path / f"{name}.npy", mmap_mode=mmap_mode)
+
+        table = cls.__new__(cls)
+        table.n_actions = header["n_actions"]
+        table.dense = header["dense"]
+        table.read_only = mmap_mode == "r"
+        table.n_keys = header["n_keys"]
+        table._rows = {}
+        table.values = array("values")
+        if table.dense:
+            table.low = np.load(path / "low.npy")
+            table.high = np.load(path / "high.npy")
+            table.strides = np.load(path / "strides.npy")
+            table.visited = array("visited")
+        else:
+            table.keys = array("keys")
+            table.slots = array("slots")
+            table._multipliers = _hash_multipliers(table.keys.shape[1])
+        return table
+
+    def save(self, path: str | os.PathLike) -> None:
+        """Save the table to a directory of ``.npy`` files.
+
+        The observation-to-row mapping is saved with the values, and hashed
+        tables only save the rows in use and one row of default Q-values. The
+        directory is written next to ``path`` and then moved into place, so an
+        interrupted save leaves any previous table at ``path`` intact.
+
+        Args:
+            path (str | os.PathLike): Directory to save the table to.
+        """
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+
+        if self.dense:
+            arrays: dict[str, np.ndarray] = {
+                "values": self.values,
+                "low": self.low,
+                "high": self.high,
+                "strides": self.strides,
+                "visited": self.visited,
+            }
+        else:
+            # Rows past those in use hold default Q-values, one is kept for the
+            # unseen observations of read-only tables
+            n_rows = self.n_keys + 1
+            values, keys = self.values[:n_rows], self.keys[:n_rows]
+            if len(values) < n_rows:
+                values = np.concatenate((values, np.zeros((1, self.n_actions))))
+                keys = np.concatenate((keys, np.zeros((1, keys.shape[1]))))
+            arrays = {"values": values, "keys": keys, "slots": self.slots}
+        for name, arr in arrays.items():
+            np.save(tmp / f"{name}.npy", np.ascontiguousarray(arr))
+        with open(tmp / "table.json", "w") as f:
+            json.dump(
+                {
+                    "format": _FORMAT_VERSION,
+                    "n_actions": int(self.n_actions),
+                    "dense": self.dense,
+                    "n_keys": int(self.n_keys),
+                },
+                f,
+            )
+        _replace_dir(tmp, path)
+
+    def __getstate__(self) -> dict[str, Any]:
+        """Return the state of the table without the row cache."""
+        state = self.__dict__.copy()
+        state["_rows"] = {}
+        return state
+
+    def __len__(self) -> int:
+        """Return the number of observations with an allocated row."""
+        return self.n_keys
+
+    def __contains__(self, obs: Any) -> bool:
+        """Return whether the observation has an allocated row."""
+        if self.dense:
+            keys = np.asarray(obs, dtype=np.int64).reshape(1, -1)
+            if keys.shape[1] != len(self.low) or np.any(
+                (keys < self.low) | (keys > self.high)
+            ):
+                return False
+            return bool(self.visited[keys[0] @ self.strides - self.low @ self.strides])
+
+        keys = self._as_keys(np.asarray(obs).reshape(1, -1))
+        if self.n_keys == 0 or keys.shape[1] != self.keys.shape[1]:
+            return False
+        return bool(self._lookup(keys)[0] >= 0)
+
+    def __getitem__(self, obs: Any) -> np.ndarray:
+        """Return a writable view of the Q-values of an observation."""
+        # Indexed first, as allocating a row may reallocate the values
+        row = self.index(obs)
+        return self.values[row]
+
+    def __setitem__(self, obs: Any, q_values: Any) -> None:
+        """Set the Q-values of an observation."""
+        row = self.index(obs)
+        self.values[row] = q_values
+
+    def index(self, obs: Any) -> int:
+        """Return the row of an observation, allocating it if required.
+
+        Args:
+            obs (Any): Observation.
+
+        Returns:
+            int: Row of the observation in ``values``.
+        """
+        # Rows of observations seen before are cached by their raw bytes, as a
+        # single lookup costs more through NumPy than through a dict
+        obs = np.asarray(obs)
+        key = (obs.dtype.num, obs.tobytes())
+        row = self._rows.get(key)
+        if row is None:
+            if self.dense:
+                row = int(self.index_batch(obs.reshape(1, -1))[0])
+            else:
+                row = int(self._index_keys(self._as_keys(obs.reshape(1, -1)))[0])
+            self._rows[key] = row
+        return row
+
+    def index_batch(self, obs: np.ndarray) -> np.ndarray:
+        """Return the rows of a batch of observations, allocating any new rows.
+
+        Args:
+            obs (np.ndarray): Observations of shape (N, ...).
+
+        Returns:
+            np.ndarray: Rows of the observations in ``values``, of shape (N,).
+        """
+        obs = np.asarray(obs)
+        if len(obs) == 0:
+            return np.zeros(0, dtype=np.int64)
+        if self.dense:
+            keys = obs.reshape(len(obs), -1).astype(np.int64)
+            if keys.shape[1] != len(self.low):
+                raise ValueError(
+                    f"Observations of size {keys.shape[1]} do not match Q-table "
+                    + f"of size {len(self.low)}"
+                )
+            if np.any((keys < self.low) | (keys > self.high)):
+                raise ValueError("Observations outside the Q-table bounds")
+            rows = (keys - self.low) @ self.strides
+            if self.read_only:
+                # Rows of unseen observations already hold default Q-values
+                return rows
+            new = rows[~self.visited[rows]]
+            if len(new):
+                new = np.unique(new)
+                self.visited[new] = True
+                self.n_keys += len(new)
+            return rows
+
+        if len(obs) <= _CACHED_BATCH_SIZE:
+            return np.array([self.index(o) for o in obs], dtype=np.int64)
+        return self._index_keys(self._as_keys(obs))
+
+    def _index_keys(self, keys: np.ndarray) -> np.ndarray:
+        """Return the rows of keys of shape (N, d), allocating any new rows."""
+        if self.n_keys == 0 and self.keys.shape[1] != keys.shape[1]:
+            if self.read_only:
+                return np.full(len(keys), self.n_keys, dtype=np.int64)
+            self._set_key_size(keys.shape[1])
+        elif keys.shape[1] != self.keys.shape[1]:
+            raise ValueError(
+                f"Observations of size {keys.shape[1]} do not match Q-table of "
+                + f"size {self.keys.shape[1]}"
+            )
+
+        rows = self._lookup(keys)
+        missing = rows < 0
+        if self.read_only:
+            # Unseen observations share the row of default Q-values after the
+            # rows in use
+            rows[missing] = self.n_keys
+            return rows
+        n_missing = np.count_nonzero(missing)
+        if n_missing == 1:
+            rows[missing] = self._insert(keys[missing])
+        elif n_missing > 1:
+            new_keys, inverse = np.unique(keys[missing], axis=0, return_inverse=True)
+            rows[missing] = self._insert(new_keys)[inverse.reshape(-1)]
+        return rows
+
+    def _as_keys(self, obs: Any) -> np.ndarray:
+        """Return observations of shape (N, ...) as float64 keys of shape (N, d)."""
+        keys = np.asarray(obs, dtype=np.float64)
+        keys = keys.reshape(len(keys), -1)
+        # Adding zero maps -0.0 to 0.0, so equal observations have equal bits
+        return keys + 0.0
+
+    def _set_key_size(self, size: int) -> None:
+        """Set the number of dimensions of the observations of a hashed table."""
+        self.keys = np.zeros((len(self.values), size), dtype=np.float64)
+        self._multipliers = _hash_multipliers(size)
+
+    def _hash(self, keys: np.ndarray) -> np.ndarray:
+        """Return the slot hashes of keys of shape (N, d)."""
+        bits = keys.view(np.uint64)
+        # Small integers only set the high bits of a float, so fold them down
+        # before mixing the dimensions together
+        bits = bits ^ (bits >> np.uint64(32))
+        h = (bits * self._multipliers).sum(axis=1, dtype=np.uint64)
+        h ^= h >> np.uint64(30)
+        h *= _MIX[0]
+        h ^= h >> np.uint64(27)
+        h *= _MIX[1]
+        h ^= h >> np.uint64(31)
+        return h
+
+    def _lookup(self, keys: np.ndarray) -> np.ndarray:
+        """Return the rows of keys of shape (N, d), or -1 for absent keys."""
+        mask = len(self.slots) - 1
+        pos = (self._hash(keys) & np.uint64(mask)).astype(np.int64)
+        rows = np.full(len(keys), -1, dtype=np.int64)
+
+        pending = np.arange(len(keys))
+        while len(pending):
+            candidates = self.slots[pos[pending]]
+            occupied = candidates >= 0
+            match = occupied.copy()
+            match[occupied] = np.all(
+                self.keys[candidates[occupied]] == keys[pending[occupied]], axis=1
+            )
+            rows[pending[match]] = candidates[match]
+
+            # Probe the next slot until the key or an empty slot is found
+            pending = pending[occupied & ~match]
+            pos[pending] = (pos[pending] + 1) & mask
+            if len(pending) <= _PROBE_TAIL_SIZE:
+                break
+
+        # The few keys left on long probe chains are cheaper to finish one by
+        # one than with a vectorised pass per slot
+        for i in pending.tolist():
+            key = keys[i].tolist()
+            p = int(pos[i])
+            while (row := int(self.slots[p])) >= 0:
+                if self.keys[row].tolist() == key:
+                    rows[i] = row
+                    break
+                p = (p + 1) & mask
+        return rows
+
+    def _insert(self, keys: np.ndarray) -> np.ndarray:
+        """Allocate rows for distinct absent keys of shape (M, d)."""
+        start = self.n_keys
+        end = start + len(keys)
+        if end > len(self.values):
+            capacity = max(end, 2 * len(self.values))
+            self.values = np.concatenate(
+                (self.values, np.zeros((capacity - len(self.values), self.n_actions)))
+            )
+            self.keys = np.concatenate(
+                (self.keys, np.zeros((capacity - len(self.keys), self.keys.shape[1])))
+            )
+        self.keys[start:end] = keys
+        self.n_keys = end
+
+        rows = np.arange(start, end)
+        if 2 * end > len(self.slots):
+            # Keep the load factor below one half
+            self.slots = np.full(1 << int(2 * end).bit_length(), -1, dtype=np.int64)
+            self._place(np.arange(end))
+        else:
+            self._place(rows)
+        return rows
+
+    def _place(self, rows: np.ndarray) -> None:
+        """Store rows in the slots of their keys."""
+        mask = len(self.slots) - 1
+        pos = (self._hash(self.keys[rows]) & np.uint64(mask)).astype(np.int64)
+
+        pending = np.arange(len(rows))
+        while len(pending):
+            slots = pos[pending]
+            free = self.slots[slots] < 0
+            # Of several keys claiming a free slot, the last write takes it
+            self.slots[slots[free]] = rows[pending[free]]
+            pending = pending[self.slots[slots] != rows[pending]]
+            pos[pending] = (pos[pending] + 1) & mask
+
+
+def _hash_multipliers(size: int) -> np.ndarray:
+    """Return the odd multipliers hashing observations with ``size`` dimensions."""
+    rng = np.random.default_rng(_HASH_SEED)
+    return rng.integers(0, np.iinfo(np.int64).max, size=size, dtype=np.int64).astype(
+        np.uint64
+    ) | np.uint64(1)
+
+
+def _replace_dir(src: Path, dst: Path) -> None:
+    """Move a directory to ``dst``, replacing any directory already there."""
+    if not dst.exists():
+        os.replace(src, dst)
+        return
+    old = dst.with_name(dst.name + ".old")
+    shutil.rmtree(old, ignore_errors=True)
+    os.replace(dst, old)
+    os.replace(src, dst)
+    shutil.rmtree(old)
@@ -1,9 +1,14 @@
 from pycrm.automaton.compiler import compile_transition_expression
 from pycrm.automaton.machine import CountingRewardMachine, RewardMachine, RmToCrmAdapter
+from pycrm.automaton.synthetic import SyntheticMachine, generate_machine
+from pycrm.automaton.table import TransitionTable
 
 __all__ = [
     "compile_transition_expression",
     "CountingRewardMachine",
     "RewardMachine",
     "RmToCrmAdapter",
+    "SyntheticMachine",
+    "generate_machine",
+    "TransitionTable",
 ]
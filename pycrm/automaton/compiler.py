@@ -1,38 +1,65 @@
+import ast
 import re
-import textwrap
-from enum import EnumMeta
+import types
+from enum import Enum, EnumMeta
+from functools import lru_cache
 from typing import Callable
 
+from pycrm.label.bitmask import prop_bits
 
-def compile_transition_expression(expression: str, env_props: EnumMeta) -> Callable:
+_OR_PATTERN = re.compile(r"\bOR\b", flags=re.IGNORECASE)
+_AND_PATTERN = re.compile(r"\bAND\b", flags=re.IGNORECASE)
+_NOT_PATTERN = re.compile(r"\bNOT\b", flags=re.IGNORECASE)
+_IMPLICIT_AND_NOT_PATTERN = re.compile(
+    r"(\b[A-Z_][A-Z0-9_]*\b)\s+not\s+(\b[A-Z_][A-Z0-9_]*\b)"
+)
+
+# Compiled callables reference their proposition Enum, so the cache is bounded to
+# release the Enums of machines that are no longer used
+_CACHE_SIZE = 4096
+
+
+def compile_transition_expression(
+    expression: str, env_props: EnumMeta, bitmask: bool = False
+) -> Callable:
     """Compile a transition expression into a callable.
 
+    The expression is parsed once into an abstract syntax tree from which a
+    single function evaluating both the WFF and the counter states is built.
+    Recently compiled callables are cached, so identical expressions share code
+    across machine states and machine instances.
+
     Args:
         expression (str): The transition expression to compile.
         env_props (EnumMeta): The environment property enum.
+        bitmask (bool): Whether the callable accepts propositions as an integer
+            bitmask rather than a collection of Enum members.
 
     Returns:
         A callable transition formula.
     """
+    return _compile_transition_expression(expression, env_props, bitmask)
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def _compile_transition_expression(
+    expression: str, env_props: EnumMeta, bitmask: bool
+) -> Callable:
     wff_expr = _extract_wff(expression)
     counter_state_expr = _extract_counter_states(expression)
 
-    wff_callable = _construct_wff_callable(wff_expr, env_props)
-    counter_state_callable = _construct_counter_state_callable(counter_state_expr)
+    namespace = {}
+    wff_node = _construct_wff_node(wff_expr, env_props, bitmask, namespace)
+    counter_state_node = _construct_counter_state_node(
+        counter_state_expr, "counter_states"
+    )
 
-    func_template = textwrap.dedent("""
-    def transition_formula(props: list[EnumMeta], counter_states: list[int]) -> bool:
-        return wff_callable(props) and counter_state_callable(counter_states)
-    """)
-    local_namespace = {}
-    global_namespace = {
-        "wff_callable": wff_callable,
-        "counter_state_callable": counter_state_callable,
-        "EnumMeta": EnumMeta,
-    }
-    exec(func_template, global_namespace, local_namespace)
-    transition_formula = local_namespace["transition_formula"]
-    return transition_formula
+    return _construct_function(
+        "def transition_formula(props, counter_states):\n    return True",
+        _conjunction([wff_node, counter_state_node]),
+        namespace,
+        filename=f"<transition {expression!r}>",
+    )
 
 
 def _extract_wff(expression: str) -> str:
@@ -89,92 +116,164 @@ def _extract_counter_states(expression: str) -> str:
     return counter_states
 
 
-def _construct_callable_wff_expression_str_repr(
-    wff_expr: str, env_props: EnumMeta
-) -> str:
-    enum_name = env_props.__name__
-
-    if wff_expr == "":
-        return "True"
-
-        # Handle logical operators first (case insensitive)
+def _normalise_wff_operators(wff_expr: str) -> str:
+    # Handle logical operators first (case insensitive)
     # Replace OR and AND first
-    wff_expr = re.sub(r"\bOR\b", "or", wff_expr, flags=re.IGNORECASE)
-    wff_expr = re.sub(r"\bAND\b", "and", wff_expr, flags=re.IGNORECASE)
+    wff_expr = _OR_PATTERN.sub("or", wff_expr)
+    wff_expr = _AND_PATTERN.sub("and", wff_expr)
 
     # Handle NOT - this needs special handling for the "not in" syntax
     # First, replace standalone NOT with "not"
-    wff_expr = re.sub(r"\bNOT\b", "not", wff_expr, flags=re.IGNORECASE)
+    wff_expr = _NOT_PATTERN.sub("not", wff_expr)
 
     # Fix the case where "not" appears between two expressions (should be "and not")
     # This handles cases like "EVENT_A NOT EVENT_B" -> "EVENT_A and not EVENT_B"
     # But avoid matching "and not" or "or not" which are already correct
     # Use a more specific pattern that only matches when "not" is between
     # two identifiers
-    wff_expr = re.sub(
-        r"(\b[A-Z_][A-Z0-9_]*\b)\s+not\s+(\b[A-Z_][A-Z0-9_]*\b)",
-        r"\1 and not \2",
-        wff_expr,
-    )
+    return _IMPLICIT_AND_NOT_PATTERN.sub(r"\1 and not \2", wff_expr)
 
-    # Get the actual enum values to avoid matching logical operators
-    enum_values = list(env_props.__members__.keys())
 
-    # Replace each enum value with the proper enum reference
-    for enum_value in enum_values:
-        # Use word boundaries to avoid partial matches
-        wff_expr = re.sub(rf"\b{enum_value}\b", f"{enum_name}.{enum_value}", wff_expr)
-
-    # Add "in props" after each enum reference
-    wff_expr = re.sub(rf"{enum_name}\.(\w+)", rf"{enum_name}.\1 in props", wff_expr)
-
-    return wff_expr
+def _construct_wff_node(
+    wff_expr: str, env_props: EnumMeta, bitmask: bool, namespace: dict
+) -> ast.expr:
+    """Parse a WFF into an expression node testing the propositions in `props`.
 
+    Names of the environment propositions referenced by the node are added to
+    the namespace.
+    """
+    if wff_expr == "":
+        return ast.Constant(value=True)
+
+    try:
+        tree = ast.parse(_normalise_wff_operators(wff_expr), mode="eval")
+    except SyntaxError:
+        raise ValueError(f"Invalid well-formed formula {wff_expr}.") from None
+    return _convert_wff_node(tree.body, wff_expr, env_props, bitmask, namespace)
+
+
+def _convert_wff_node(
+    node: ast.expr,
+    wff_expr: str,
+    env_props: EnumMeta,
+    bitmask: bool,
+    namespace: dict,
+) -> ast.expr:
+    if isinstance(node, ast.BoolOp):
+        return ast.BoolOp(
+            op=node.op,
+            values=[
+                _convert_wff_node(v, wff_expr, env_props, bitmask, namespace)
+                for v in node.values
+            ],
+        )
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return ast.UnaryOp(
+            op=ast.Not(),
+            operand=_convert_wff_node(
+                node.operand, wff_expr, env_props, bitmask, namespace
+            ),
+        )
+    if isinstance(node, ast.Constant) and isinstance(node.value, bool):
+        return node
+    if not isinstance(node, ast.Name):
+        raise ValueError(f"Invalid well-formed formula {wff_expr}.")
+    if node.id not in env_props.__members__:
+        raise ValueError(
+            f"Invalid well-formed formula {wff_expr}. "
+            + f"Unknown environment proposition {node.id}."
+        )
 
-def _construct_wff_callable(wff_expr: str, env_props: EnumMeta) -> Callable:
-    wff_expr = _construct_callable_wff_expression_str_repr(wff_expr, env_props)
-    func_template = textwrap.dedent(f"""
-    def wff(props):
-        return {wff_expr}
-    """)
+    prop: Enum = env_props[node.id]  # type: ignore
+    props = ast.Name(id="props", ctx=ast.Load())
+
+    if bitmask:
+        # props & BIT != 0
+        return ast.Compare(
+            left=ast.BinOp(
+                left=props,
+                op=ast.BitAnd(),
+                right=ast.Constant(value=prop_bits(env_props)[prop]),
+            ),
+            ops=[ast.NotEq()],
+            comparators=[ast.Constant(value=0)],
+        )
 
-    local_namespace = {}
-    global_namespace = {env_props.__name__: env_props}
-    exec(func_template, global_namespace, local_namespace)
-    wff = local_namespace["wff"]
-    return wff
+    # PROP in props, with PROP bound to the Enum member in the function globals
+    name = f"_prop_{node.id}"
+    namespace[name] = prop
+    return ast.Compare(
+        left=ast.Name(id=name, ctx=ast.Load()),
+        ops=[ast.In()],
+        comparators=[props],
+    )
 
 
-def _construct_callable_counter_state_str_repr(counter_states: str) -> str:
+def _parse_counter_states(counter_states: str) -> list[str]:
     counter_expr = counter_states.replace(" ", "")
     counter_expr = counter_expr.replace("(", "").replace(")", "")
     condition_ls = counter_expr.split(",")
 
-    conditions = []
-    for i, c in enumerate(condition_ls):
-        if c == "Z":
-            conditions.append(f"counters[{i}] == 0")
-        elif c == "NZ":
-            conditions.append(f"counters[{i}] == 1")
-        elif c == "-":
-            conditions.append("True")
-        else:
+    for c in condition_ls:
+        if c not in ("Z", "NZ", "-"):
             raise ValueError(f"Invalid counter expression {c}.")
+    return condition_ls
+
 
-    conditions = " and ".join(conditions)
-    return conditions
+def _construct_counter_state_node(counter_states: str, name: str) -> ast.expr:
+    """Build an expression node testing the raw counter values in `name`.
 
+    Counters are compared against zero directly, so evaluating the node does not
+    allocate.
+    """
+    conditions = []
+    for i, c in enumerate(_parse_counter_states(counter_states)):
+        if c == "-":
+            continue
+
+        conditions.append(
+            ast.Compare(
+                left=ast.Subscript(
+                    value=ast.Name(id=name, ctx=ast.Load()),
+                    slice=ast.Constant(value=i),
+                    ctx=ast.Load(),
+                ),
+                ops=[ast.Eq() if c == "Z" else ast.NotEq()],
+                comparators=[ast.Constant(value=0)],
+            )
+        )
+    return _conjunction(conditions)
+
+
+def _conjunction(nodes: list[ast.expr]) -> ast.expr:
+    """Return the conjunction of expression nodes, dropping tautologies."""
+    nodes = [
+        node
+        for node in nodes
+        if not (isinstance(node, ast.Constant) and node.value is True)
+    ]
+    if not nodes:
+        return ast.Constant(value=True)
+    if len(nodes) == 1:
+        return nodes[0]
+    return ast.BoolOp(op=ast.And(), values=nodes)
+
+
+def _construct_function(
+    template: str, return_value: ast.expr, namespace: dict, filename: str
+) -> Callable:
+    """Build a function from a template whose final statement returns a value.
+
+    The value returned by the template function is replaced by the given
+    expression node, and the function is created directly from the compiled
+    code object with the namespace as its globals.
+    """
+    module = ast.parse(template)
+    func_def = module.body[0]
+    assert isinstance(func_def, ast.FunctionDef)
 
-def _construct_counter_state_callable(counter_states: str) -> Callable:
-    counter_expr = _construct_callable_counter_state_str_repr(counter_states)
-    func_template = textwrap.dedent(f"""
-    def counter_conditions(counters):
-        counters = [0 if c == 0 else 1 for c in counters]
-        return {counter_expr}
-    """)
+    func_def.body[-1] = ast.Return(value=return_value)
 
-    local_namespace = {}
-    global_namespace = {}
-    exec(func_template, global_namespace, local_namespace)
-    counter_conditions = local_namespace["counter_conditions"]
-    return counter_conditions
+    code = compile(ast.fix_missing_locations(module), filename, "exec")
+    func_code = next(c for c in code.co_consts if isinstance(c, types.CodeType))
+    return types.FunctionType(func_code, namespace, func_def.name)
@@ -1,10 +1,12 @@
 from abc import ABC, abstractmethod
 from enum import Enum, EnumMeta
-from typing import Any, Callable
+from operator import add
+from typing import AbstractSet, Any, Callable
 
 import numpy as np
 
 from pycrm.automaton.compiler import compile_transition_expression
+from pycrm.automaton.table import TransitionTable
 
 
 class CountingRewardMachine(ABC):
@@ -18,6 +20,8 @@ class CountingRewardMachine(ABC):
         """
         super().__init__()
         self.env_prop_enum = env_prop_enum
+        self._table: TransitionTable | None = None
+        self._counter_sample_version = 0
 
         self._delta_u = self._get_state_transition_function()
         self._delta_c = self._get_counter_transition_function()
@@ -58,6 +62,23 @@ class CountingRewardMachine(ABC):
     def sample_counter_configurations(self) -> list[tuple[int, ...]]:
         """Return counter configurations for counterfactual experience generation."""
 
+    @property
+    def counter_sample_version(self) -> int:
+        """Return the version of the counter configuration sample set.
+
+        Consumers may cache the configurations returned by
+        ``sample_counter_configurations`` for as long as the version is unchanged.
+        """
+        return self._counter_sample_version
+
+    def invalidate_counter_samples(self) -> None:
+        """Signal that ``sample_counter_configurations`` now returns a new sample set.
+
+        Machines whose sampled counter configurations change over time must call
+        this method whenever they do, so cached configurations are rebuilt.
+        """
+        self._counter_sample_version += 1
+
     def encode_machine_state(self, u: int) -> np.ndarray:
         """Encode the machine state into a one-hot vector."""
         u_enc = np.zeros(self._get_max_state() + 2)
@@ -76,21 +97,94 @@ class CountingRewardMachine(ABC):
         c_enc = np.array([1 if c_i > 0 else 0 for c_i in c])
         return c_enc
 
+    @property
+    def is_compiled(self) -> bool:
+        """Return whether transitions are served from a compiled lookup table."""
+        return self._table is not None
+
+    def compile(self, max_table_size: int = 2**22) -> "CountingRewardMachine":
+        """Compile the transition functions into a dense lookup table.
+
+        Once compiled, ``transition`` resolves the first matching transition with
+        a single table lookup rather than evaluating transition formulas in order.
+        The table has one entry per (machine state, proposition set, counter
+        zero/non-zero configuration) triple, so its size grows exponentially in
+        the number of environment propositions and counters.
+
+        Args:
+            max_table_size (int): Maximum number of entries in the lookup table.
+
+        Returns:
+            CountingRewardMachine: The compiled machine.
+
+        Raises:
+            ValueError: If the lookup table would exceed ``max_table_size``.
+        """
+        self._table = self.build_transition_table(max_table_size)
+        return self
+
+    def build_transition_table(self, max_table_size: int = 2**22) -> TransitionTable:
+        """Build a lookup table of the transition functions.
+
+        Unlike ``compile``, the machine is left unchanged, so ``transition`` keeps
+        evaluating transition formulas unless the machine is compiled.
+
+        Args:
+            max_table_size (int): Maximum number of entries in the lookup table.
+
+        Returns:
+            TransitionTable: The lookup table.
+
+        Raises:
+            ValueError: If the lookup table would exceed ``max_table_size``.
+        """
+        transitions = {
+            u: [
+                (
+                    compile_transition_expression(
+                        expr, self.env_prop_enum, bitmask=True
+                    ),
+                    self._delta_u[u][expr],
+                    self._delta_c[u][expr],
+                    self._delta_r[u][expr],
+                )
+                for expr in self._delta_u[u]
+            ]
+            for u in self._delta_u
+        }
+        return TransitionTable(
+            transitions=transitions,
+            env_prop_enum=self.env_prop_enum,
+            n_states=self._get_max_state() + 2,
+            n_counters=len(self.c_0),
+            max_size=max_table_size,
+        )
+
+    @property
+    def transition_table(self) -> TransitionTable:
+        """Return the compiled transition table, compiling the machine if needed."""
+        if self._table is None:
+            self.compile()
+        assert self._table is not None
+        return self._table
+
     def transition(
-        self, u: int, c: tuple[int, ...], props: set[Enum]
-    ) -> tuple[int, tuple[int], Callable]:
+        self, u: int, c: tuple[int, ...], props: AbstractSet[Enum] | int
+    ) -> tuple[int, tuple[int, ...], Callable]:
         """Return the next state, counter configuration and reward function.
 
         Note: Transitions are applied in the order they are defined, so if multiple
-        transitions are possible, the first one will be applied.
+        transitions are possible, the first one will be applied. If the machine
+        has been compiled, the transition is resolved from the lookup table.
 
         Args:
             u (int): Current state.
             c (tuple[int]): Current counter configuration.
-            props (set[EnumMeta]): Environment propositions.
+            props (AbstractSet[Enum] | int): Environment propositions, either as a set
+                of Enum members or as an integer bitmask.
 
         Returns:
-            tuple[int, tuple[int], Callable]: Next state, counter configuration and
+            tuple[int, tuple[int, ...], Callable]: Next state, counter configuration and
                 reward function.
         """
         if u not in self.delta_u:
@@ -102,13 +196,27 @@ class CountingRewardMachine(ABC):
         c_next = None
         reward_fn = None
 
-        for transition_formula in self.delta_u[u].keys():
-            if transition_formula(props, c):
-                u_next = self.delta_u[u][transition_formula]
-                c_delta = self.delta_c[u][transition_formula]
-                c_next = tuple(np.array(c) + np.array(c_delta))
-                reward_fn = self.delta_r[u][transition_formula]
-                break
+        if self._table is not None:
+            edge = self._table.lookup(u, c, props)
+            if edge >= 0:
+                u_next, c_delta, reward_fn = self._table.edges[edge]
+                c_next = tuple(map(add, c, c_delta))
+        elif isinstance(props, (int, np.integer)):
+            for bitmask_formula, transition_formula in self._bitmask_formulas[u]:
+                if bitmask_formula(props, c):
+                    u_next = self.delta_u[u][transition_formula]
+                    c_delta = self.delta_c[u][transition_formula]
+                    c_next = tuple(map(add, c, c_delta))
+                    reward_fn = self.delta_r[u][transition_formula]
+                    break
+        else:
+            for transition_formula in self.delta_u[u].keys():
+                if transition_formula(props, c):
+                    u_next = self.delta_u[u][transition_formula]
+                    c_delta = self.delta_c[u][transition_formula]
+                    c_next = tuple(map(add, c, c_delta))
+                    reward_fn = self.delta_r[u][transition_formula]
+                    break
 
         if u_next is not None and c_next is not None and reward_fn is not None:
             return u_next, c_next, reward_fn
@@ -118,6 +226,29 @@ class CountingRewardMachine(ABC):
             + f"and environment propositions {props}"
         )
 
+    def transition_batch(
+        self, u: np.ndarray, c: np.ndarray, props: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return next states, counter configurations and reward function indices.
+
+        Vectorised equivalent of ``transition`` for N machine configurations. The
+        machine is compiled on first use. Reward function indices refer to
+        ``transition_table.reward_fns``.
+
+        Args:
+            u (np.ndarray): Current states of shape (N,).
+            c (np.ndarray): Current counter configurations of shape (N, k).
+            props (np.ndarray): Environment proposition bitmasks of shape (N,).
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: Next states of shape (N,),
+                next counter configurations of shape (N, k) and reward function
+                indices of shape (N,). Configurations without a defined transition,
+                including terminal states, have next state and reward function
+                index -1 and unchanged counters.
+        """
+        return self.transition_table.lookup_batch(u, c, props)
+
     def _replace_terminal_state(self) -> None:
         """Replace the terminal state flag values in the state-transition function.
 
@@ -164,16 +295,28 @@ class CountingRewardMachine(ABC):
         self.delta_u = {}
         self.delta_c = {}
         self.delta_r = {}
+        # Bitmask-native formulas, paired with the formula keying the transition
+        # functions, so bitmask propositions are never decoded into sets
+        self._bitmask_formulas: dict[int, list[tuple[Callable, Callable]]] = {}
 
         for u in self._delta_u.keys():
             d_u = {}
             d_c = {}
             d_r = {}
+            bitmask_formulas = []
 
             for expr in self._delta_u[u]:
                 transition_formula = compile_transition_expression(
                     expr, self.env_prop_enum
                 )
+                bitmask_formulas.append(
+                    (
+                        compile_transition_expression(
+                            expr, self.env_prop_enum, bitmask=True
+                        ),
+                        transition_formula,
+                    )
+                )
                 d_u[transition_formula] = self._delta_u[u][expr]
 
                 try:
@@ -196,6 +339,7 @@ class CountingRewardMachine(ABC):
             self.delta_u[u] = d_u
             self.delta_c[u] = d_c
             self.delta_r[u] = d_r
+            self._bitmask_formulas[u] = bitmask_formulas
 
     def _get_max_state(self) -> int:
         """Return the maximum state in the state-transition function."""
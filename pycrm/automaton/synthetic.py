@@ -0,0 +1,250 @@
+from enum import Enum, EnumMeta
+from itertools import product
+from typing import Any, Callable, NamedTuple
+
+import numpy as np
+
+from pycrm.automaton.machine import CountingRewardMachine
+from pycrm.label.function import LabellingFunction
+
+# Counter guards, in the order of the guard weights of ``generate_machine``
+GUARDS = ("Z", "NZ", "-")
+
+# Machine state to transition expression to next state, counter deltas and reward
+Edges = dict[int, dict[str, tuple[int, tuple[int, ...], float]]]
+
+
+class SyntheticCountingRewardMachine(CountingRewardMachine):
+    """Counting reward machine defined by generated transitions.
+
+    Subclasses created by ``generate_machine`` set the class attributes, so that
+    they are constructed without arguments like hand-written machines.
+    """
+
+    props: EnumMeta
+    edges: Edges
+    n_counters: int
+    max_counter: int
+
+    def __init__(self) -> None:
+        """Initialise the counting reward machine."""
+        super().__init__(env_prop_enum=self.props)
+
+    @property
+    def u_0(self) -> int:
+        """Return the initial state of the machine."""
+        return 0
+
+    @property
+    def c_0(self) -> tuple[int, ...]:
+        """Return the initial counter configuration of the machine."""
+        return (0,) * self.n_counters
+
+    def _get_state_transition_function(self) -> dict:
+        """Return the state transition function."""
+        return self._transition_function(0)
+
+    def _get_counter_transition_function(self) -> dict:
+        """Return the counter transition function."""
+        return self._transition_function(1)
+
+    def _get_reward_transition_function(self) -> dict:
+        """Return the reward transition function."""
+        return self._transition_function(2)
+
+    def sample_counter_configurations(self) -> list[tuple[int, ...]]:
+        """Return every configuration with counters of at most ``max_counter``."""
+        return list(product(range(self.max_counter + 1), repeat=self.n_counters))
+
+    def _transition_function(self, field: int) -> dict:
+        """Return a new transition function of one field of the edges."""
+        return {
+            u: {expr: edge[field] for expr, edge in edges.items()}
+            for u, edges in self.edges.items()
+        }
+
+
+class SyntheticLabellingFunction(LabellingFunction[np.ndarray, Any]):
+    """Labelling function of proposition indicator observations.
+
+    Proposition ``P{i}`` takes place when element ``i`` of the next observation
+    is non-zero. Subclasses created by ``generate_machine`` define one event
+    method per proposition.
+    """
+
+
+class SyntheticMachine(NamedTuple):
+    """A generated counting reward machine and matching labelling functions.
+
+    The labelling functions label observations of shape (n_props,), where a
+    non-zero element ``i`` means proposition ``P{i}`` takes place. The first
+    labels single transitions with ``__call__``, the second labels batches of
+    transitions with ``batch``.
+    """
+
+    machine: type[SyntheticCountingRewardMachine]
+    labelling_function: type[SyntheticLabellingFunction]
+    batch_labelling_function: type[SyntheticLabellingFunction]
+    props: EnumMeta
+
+
+def generate_machine(
+    n_states: int,
+    n_props: int,
+    n_counters: int = 1,
+    edges_per_state: int = 3,
+    guard_weights: tuple[float, float, float] = (1.0, 1.0, 1.0),
+    max_counter: int = 2,
+    terminal_probability: float = 0.05,
+    seed: int | None = None,
+) -> SyntheticMachine:
+    """Generate a random counting reward machine for scaling studies.
+
+    Every state has ``edges_per_state`` edges, which are tried in order:
+
+    1. An unguarded edge on a conjunction of propositions to the next state, or
+       from the last state to the terminal state, so every state is reachable.
+    2. Random edges on a conjunction of possibly negated propositions, with a
+       guard on each counter drawn from Z, NZ and - by ``guard_weights``. Each
+       edge leads to a random state, or to the terminal state with probability
+       ``terminal_probability``.
+    3. An unguarded catch-all edge back to the same state, so every
+       configuration has a transition.
+
+    Counters are only decremented on NZ guards, so they never become negative.
+
+    Example:
+        >>> synthetic = generate_machine(n_states=500, n_props=6, seed=0)
+        >>> crm = synthetic.machine()
+        >>> lf = synthetic.labelling_function()
+
+    Args:
+        n_states (int): Number of non-terminal machine states.
+        n_props (int): Number of propositions.
+        n_counters (int): Number of counters.
+        edges_per_state (int): Number of edges of each state, at least two.
+        guard_weights (tuple[float, float, float]): Relative frequency of the
+            Z, NZ and - guards of the random edges.
+        max_counter (int): Largest counter value of the configurations sampled
+            for counterfactual experience.
+        terminal_probability (float): Probability that a random edge leads to
+            the terminal state.
+        seed (int | None): Seed of the generator.
+
+    Returns:
+        SyntheticMachine: Machine class, labelling function classes and
+            propositions.
+
+    Raises:
+        ValueError: If an argument is out of range, or a state cannot have
+            ``edges_per_state`` distinct edges.
+    """
+    if n_states < 1 or n_props < 1 or n_counters < 1:
+        raise ValueError(
+            "Synthetic machines need at least one state, proposition and counter"
+        )
+    if edges_per_state < 2:
+        raise ValueError(f"edges_per_state must be at least 2: {edges_per_state}")
+    weights = np.asarray(guard_weights, dtype=np.float64)
+    if weights.shape != (len(GUARDS),) or np.any(weights < 0) or weights.sum() == 0:
+        raise ValueError(f"Invalid guard weights for (Z, NZ, -): {guard_weights}")
+
+    rng = np.random.default_rng(seed)
+    props: EnumMeta = Enum(  # type: ignore
+        "SyntheticProp", [f"P{i}" for i in range(n_props)]
+    )
+    no_guard = "(" + ",".join(["-"] * n_counters) + ")"
+    no_delta = (0,) * n_counters
+
+    edges: Edges = {}
+    for u in range(n_states):
+        u_next = u + 1 if u + 1 < n_states else -1
+        wff = _random_wff(rng, n_props, negation_probability=0.0)
+        state_edges: dict[str, tuple[int, tuple[int, ...], float]] = {
+            f"{wff} / {no_guard}": (u_next, no_delta, float(u_next == -1))
+        }
+
+        attempts = 0
+        while len(state_edges) < edges_per_state - 1:
+            attempts += 1
+            if attempts > 100 * edges_per_state:
+                raise ValueError(
+                    f"Cannot generate {edges_per_state} distinct edges with "
+                    + f"{n_props} propositions and {n_counters} counters"
+                )
+            guards = rng.choice(GUARDS, size=n_counters, p=weights / weights.sum())
+            expr = f"{_random_wff(rng, n_props)} / ({','.join(guards)})"
+            if expr in state_edges:
+                continue
+
+            terminal = rng.random() < terminal_probability
+            deltas = tuple(
+                int(rng.integers(-1, 2)) if guard == "NZ" else int(rng.integers(0, 2))
+                for guard in guards
+            )
+            reward = 1.0 if terminal else round(float(rng.uniform(-0.1, 0.1)), 3)
+            state_edges[expr] = (
+                -1 if terminal else int(rng.integers(n_states)),
+                deltas,
+                reward,
+            )
+
+        state_edges[f"/ {no_guard}"] = (u, no_delta, 0.0)
+        edges[u] = state_edges
+
+    members: list[Enum] = list(props)  # type: ignore
+    machine = type(
+        "SyntheticCountingRewardMachine",
+        (SyntheticCountingRewardMachine,),
+        {
+            "props": props,
+            "edges": edges,
+            "n_counters": n_counters,
+            "max_counter": max_counter,
+        },
+    )
+    labelling_function = type(
+        "SyntheticLabellingFunction",
+        (SyntheticLabellingFunction,),
+        {f"event_{prop.name}": _event(i, prop) for i, prop in enumerate(members)},
+    )
+    batch_labelling_function = type(
+        "SyntheticBatchLabellingFunction",
+        (SyntheticLabellingFunction,),
+        {f"event_{prop.name}": _batch_event(i, prop) for i, prop in enumerate(members)},
+    )
+    return SyntheticMachine(
+        machine, labelling_function, batch_labelling_function, props
+    )
+
+
+def _random_wff(
+    rng: np.random.Generator, n_props: int, negation_probability: float = 0.3
+) -> str:
+    """Return a conjunction of one or two distinct, possibly negated propositions."""
+    size = int(rng.integers(1, min(2, n_props) + 1))
+    literals = []
+    for i in sorted(rng.choice(n_props, size=size, replace=False).tolist()):
+        negated = rng.random() < negation_probability
+        literals.append(f"not P{i}" if negated else f"P{i}")
+    return " and ".join(literals)
+
+
+def _event(i: int, prop: Enum) -> Callable:
+    """Return an event method testing element ``i`` of the next observation."""
+
+    def event(self, obs: np.ndarray, action: Any, next_obs: np.ndarray) -> Enum | None:
+        del obs, action
+        return prop if next_obs[i] else None
+
+    return LabellingFunction.event(event)
+
+
+def _batch_event(i: int, prop: Enum) -> Callable:
+    """Return a batch event method testing column ``i`` of the next observations."""
+
+    def event(self, obs: np.ndarray, action: Any, next_obs: np.ndarray) -> np.ndarray:
+        del obs, action
+        return next_obs[:, i] != 0
+
+    return LabellingFunction.batch_event(prop)(event)
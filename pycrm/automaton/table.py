@@ -0,0 +1,154 @@
+from enum import EnumMeta
+from typing import Callable
+
+import numpy as np
+
+from pycrm.label.bitmask import prop_bits
+
+
+class TransitionTable:
+    """Dense lookup-table representation of a counting reward machine.
+
+    Transition formulas only observe the set of environment propositions and
+    whether each counter is zero or non-zero. The first matching transition
+    for every (machine state, proposition bitmask, counter zero-mask) triple
+    can therefore be precomputed, after which a transition is a single table
+    lookup.
+
+    Transitions are identified by an edge index. Edge ``e`` moves the machine
+    to state ``u_next[e]``, adds ``c_delta[e]`` to the counters and emits
+    reward function ``reward_fns[e]``. Undefined transitions are stored as -1.
+    """
+
+    def __init__(
+        self,
+        transitions: dict[int, list[tuple[Callable, int, tuple[int, ...], Callable]]],
+        env_prop_enum: EnumMeta,
+        n_states: int,
+        n_counters: int,
+        max_size: int = 2**22,
+    ) -> None:
+        """Build the transition table.
+
+        Args:
+            transitions (dict): Mapping from each non-terminal machine state to its
+                ordered transitions. Each transition is a tuple of a bitmask
+                transition formula, next state, counter modifier and reward
+                function.
+            env_prop_enum (EnumMeta): Enum class containing environment properties.
+            n_states (int): Number of machine states, including terminal states.
+            n_counters (int): Number of counters.
+            max_size (int): Maximum number of entries in the lookup table.
+        """
+        super().__init__()
+        self.prop_bits = prop_bits(env_prop_enum)
+        self.n_props = len(self.prop_bits)
+        self.n_counters = n_counters
+
+        n_prop_masks = 1 << self.n_props
+        n_counter_masks = 1 << n_counters
+        size = n_states * n_prop_masks * n_counter_masks
+        if size > max_size:
+            raise ValueError(
+                f"Transition table with {size} entries exceeds the maximum size "
+                + f"of {max_size} entries"
+            )
+
+        self.edges: list[tuple[int, tuple[int, ...], Callable]] = []
+        self.next_edge = np.full(
+            (n_states, n_prop_masks, n_counter_masks), -1, dtype=np.int64
+        )
+
+        counter_states = [
+            tuple((mask >> i) & 1 for i in range(n_counters))
+            for mask in range(n_counter_masks)
+        ]
+
+        for u, state_transitions in transitions.items():
+            first_edge = len(self.edges)
+            formulas = [formula for formula, _, _, _ in state_transitions]
+            for _, u_next, c_delta, reward_fn in state_transitions:
+                self.edges.append((u_next, c_delta, reward_fn))
+
+            for p_mask in range(n_prop_masks):
+                for c_mask, counters in enumerate(counter_states):
+                    for i, formula in enumerate(formulas):
+                        if formula(p_mask, counters):
+                            self.next_edge[u, p_mask, c_mask] = first_edge + i
+                            break
+
+        self.u_next = np.array([e[0] for e in self.edges], dtype=np.int64)
+        self.c_delta = np.array([e[1] for e in self.edges], dtype=np.int64).reshape(
+            len(self.edges), n_counters
+        )
+        self.reward_fns = [e[2] for e in self.edges]
+
+        # Python list mirror of the table for scalar lookups, indexing a list
+        # is considerably cheaper than indexing a NumPy array with a tuple.
+        self._n_prop_masks = n_prop_masks
+        self._n_counter_masks = n_counter_masks
+        self._next_edge_flat: list[int] = self.next_edge.ravel().tolist()
+        self._counter_weights = 1 << np.arange(n_counters, dtype=np.int64)
+
+    def props_to_bitmask(self, props) -> int:
+        """Return the bitmask encoding of a collection of propositions.
+
+        Integer bitmasks are returned unchanged.
+        """
+        if isinstance(props, int):
+            return props
+        if isinstance(props, np.integer):
+            return int(props)
+
+        mask = 0
+        prop_bits = self.prop_bits
+        for prop in props:
+            mask |= prop_bits.get(prop, 0)
+        return mask
+
+    def counters_to_bitmask(self, c: tuple[int, ...]) -> int:
+        """Return the zero/non-zero bitmask encoding of a counter configuration."""
+        mask = 0
+        bit = 1
+        for c_i in c:
+            if c_i:
+                mask |= bit
+            bit <<= 1
+        return mask
+
+    def lookup(self, u: int, c: tuple[int, ...], props) -> int:
+        """Return the index of the first matching edge, or -1 if undefined."""
+        p_mask = self.props_to_bitmask(props)
+        c_mask = self.counters_to_bitmask(c)
+        return self._next_edge_flat[
+            (u * self._n_prop_masks + p_mask) * self._n_counter_masks + c_mask
+        ]
+
+    def lookup_batch(
+        self, u: np.ndarray, c: np.ndarray, props: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Apply the transition table to a batch of machine configurations.
+
+        Args:
+            u (np.ndarray): Machine states of shape (N,).
+            c (np.ndarray): Counter configurations of shape (N, k).
+            props (np.ndarray): Proposition bitmasks of shape (N,).
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: Next states of shape (N,),
+                next counter configurations of shape (N, k) and edge indices of
+                shape (N,). Rows without a defined transition have edge index -1,
+                next state -1 and unchanged counters.
+        """
+        u = np.asarray(u, dtype=np.int64)
+        c = np.asarray(c, dtype=np.int64).reshape(len(u), self.n_counters)
+        props = np.asarray(props, dtype=np.int64)
+
+        c_mask = (c != 0).astype(np.int64) @ self._counter_weights
+        edges = self.next_edge[u, props, c_mask]
+
+        valid = edges >= 0
+        safe_edges = np.where(valid, edges, 0)
+        u_next = np.where(valid, self.u_next[safe_edges], -1)
+        c_next = np.where(valid[:, None], c + self.c_delta[safe_edges], c)
+        return u_next, c_next, edges
@@ -1,3 +1,5 @@
+from pycrm.crossproduct.buffer import CounterfactualBuffer
 from pycrm.crossproduct.crossproduct import CrossProduct
+from pycrm.crossproduct.vec import CrossProductVecEnv
 
-__all__ = ["CrossProduct"]
+__all__ = ["CounterfactualBuffer", "CrossProduct", "CrossProductVecEnv"]
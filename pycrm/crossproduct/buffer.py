@@ -0,0 +1,65 @@
+import numpy as np
+
+
+class CounterfactualBuffer:
+    """Preallocated storage for a batch of counterfactual experience.
+
+    Rows are written by ``CrossProduct.generate_counterfactual_batch``. Only the
+    first ``n`` rows of each array are valid after a call, where ``n`` is the
+    valid-row count the call returns.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        obs_shape: tuple[int, ...],
+        action_shape: tuple[int, ...] = (),
+        obs_dtype: np.dtype | type = np.float32,
+        action_dtype: np.dtype | type = np.int64,
+    ) -> None:
+        """Allocate the buffer.
+
+        Args:
+            capacity (int): Maximum number of counterfactual experiences.
+            obs_shape (tuple[int, ...]): Shape of a cross product observation.
+            action_shape (tuple[int, ...]): Shape of an action.
+            obs_dtype (np.dtype | type): Data type of cross product observations.
+            action_dtype (np.dtype | type): Data type of actions.
+        """
+        super().__init__()
+        self.capacity = capacity
+        self.obs = np.zeros((capacity, *obs_shape), dtype=obs_dtype)
+        self.action = np.zeros((capacity, *action_shape), dtype=action_dtype)
+        self.next_obs = np.zeros((capacity, *obs_shape), dtype=obs_dtype)
+        self.reward = np.zeros(capacity, dtype=np.float64)
+        self.done = np.zeros(capacity, dtype=np.bool_)
+
+    @classmethod
+    def from_arrays(
+        cls,
+        obs: np.ndarray,
+        action: np.ndarray,
+        next_obs: np.ndarray,
+        reward: np.ndarray,
+        done: np.ndarray,
+    ) -> "CounterfactualBuffer":
+        """Create a buffer backed by existing arrays, such as shared memory views.
+
+        Args:
+            obs (np.ndarray): Observations of shape (capacity, *obs_shape).
+            action (np.ndarray): Actions of shape (capacity, *action_shape).
+            next_obs (np.ndarray): Next observations of shape (capacity, *obs_shape).
+            reward (np.ndarray): Rewards of shape (capacity,).
+            done (np.ndarray): Dones of shape (capacity,).
+
+        Returns:
+            CounterfactualBuffer: Buffer writing into the given arrays.
+        """
+        buffer = cls.__new__(cls)
+        buffer.capacity = len(obs)
+        buffer.obs = obs
+        buffer.action = action
+        buffer.next_obs = next_obs
+        buffer.reward = reward
+        buffer.done = done
+        return buffer
@@ -1,11 +1,18 @@
 from abc import ABC
-from typing import Generic, TypeVar
+from enum import Enum
+from typing import Any, Generic, TypeVar
 
 import gymnasium as gym
 import numpy as np
 
-from pycrm.automaton import CountingRewardMachine, RewardMachine, RmToCrmAdapter
-from pycrm.label import LabellingFunction
+from pycrm.automaton import (
+    CountingRewardMachine,
+    RewardMachine,
+    RmToCrmAdapter,
+    TransitionTable,
+)
+from pycrm.crossproduct.buffer import CounterfactualBuffer
+from pycrm.label import LabellingFunction, bitmask_to_props
 
 GroundObsType = TypeVar("GroundObsType")
 ObsType = TypeVar("ObsType")
@@ -13,27 +20,150 @@ ActType = TypeVar("ActType")
 RenderFrame = TypeVar("RenderFrame")
 
 
+def machine_configurations(
+    crm: CountingRewardMachine,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return every non-terminal machine state paired with every counter sample.
+
+    Configurations are ordered by machine state and then by counter
+    configuration, as returned by ``sample_counter_configurations``.
+
+    Args:
+        crm (CountingRewardMachine): Counting reward machine.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Machine states of shape (N,) and counter
+            configurations of shape (N, k).
+    """
+    c_samples = np.array(crm.sample_counter_configurations(), dtype=np.int64).reshape(
+        -1, len(crm.c_0)
+    )
+    u = np.repeat(np.array(crm.U, dtype=np.int64), len(c_samples))
+    c = np.tile(c_samples, (len(crm.U), 1))
+    return u, c
+
+
+def edge_rewards(
+    table: TransitionTable,
+    edges: np.ndarray,
+    ground_obs: Any,
+    actions: Any,
+    next_ground_obs: Any,
+    copy: np.ndarray | None = None,
+) -> np.ndarray:
+    """Return the rewards of taking edges of a transition table.
+
+    Reward functions only observe the ground transition, so each distinct edge is
+    evaluated once per ground transition.
+
+    Args:
+        table (TransitionTable): Transition table the edges belong to.
+        edges (np.ndarray): Edge indices of shape (M,).
+        ground_obs (Any): Ground observation, or ground observations of shape
+            (N, ...) if ``copy`` is given.
+        actions (Any): Action, or actions of shape (N, ...) if ``copy`` is given.
+        next_ground_obs (Any): Next ground observation, or next ground
+            observations of shape (N, ...) if ``copy`` is given.
+        copy (np.ndarray | None): Ground transition each edge is taken on, of
+            shape (M,). If None, every edge is taken on the single ground
+            transition given.
+
+    Returns:
+        np.ndarray: Rewards of shape (M,).
+    """
+    reward_fns = table.reward_fns
+    n_edges = len(reward_fns)
+    if copy is None:
+        keys, n_keys = edges, n_edges
+    else:
+        keys, n_keys = copy * n_edges + edges, len(ground_obs) * n_edges
+
+    taken = np.zeros(n_keys, dtype=np.bool_)
+    taken[keys] = True
+    key_rewards = np.zeros(n_keys, dtype=np.float64)
+    for key in np.flatnonzero(taken).tolist():
+        i, e = divmod(key, n_edges)
+        if copy is None:
+            key_rewards[key] = reward_fns[e](ground_obs, actions, next_ground_obs)
+        else:
+            key_rewards[key] = reward_fns[e](
+                ground_obs[i], actions[i], next_ground_obs[i]
+            )
+    return key_rewards[keys]
+
+
 class CrossProduct(ABC, gym.Env, Generic[GroundObsType, ObsType, ActType, RenderFrame]):
     """Base class for cross product Markov decision process environments."""
 
+    # Maximum size of the lookup table built for counterfactual experience when the
+    # machine is not compiled. Larger machines use scalar transitions instead.
+    counterfactual_table_size = 2**16
+
     def __init__(
         self,
         ground_env: gym.Env,
         machine: CountingRewardMachine | RewardMachine,
         lf: LabellingFunction[GroundObsType, ActType],
         max_steps: int,
+        counterfactual_sample_size: int | None = None,
     ) -> None:
-        """Initialize the cross product Markov decision process environment."""
+        """Initialize the cross product Markov decision process environment.
+
+        Args:
+            ground_env (gym.Env): Ground environment.
+            machine (CountingRewardMachine | RewardMachine): Machine defining the
+                task.
+            lf (LabellingFunction): Labelling function of the ground environment.
+            max_steps (int): Maximum number of steps per episode.
+            counterfactual_sample_size (int | None): If set, counterfactual
+                experience is generated from a random subsample of at most this
+                many machine configurations per step instead of all of them.
+        """
         super().__init__()
         self.ground_env = ground_env
         self.lf = lf
         self.max_steps = max_steps
+        self.counterfactual_sample_size = counterfactual_sample_size
+
+        self._counterfactual_sources: tuple[np.ndarray, np.ndarray] | None = None
+        self._counterfactual_sources_version = -1
+        self._counterfactual_buffer: CounterfactualBuffer | None = None
+        self._counterfactual_buffer_key: tuple | None = None
+        self._transition_table: TransitionTable | None = None
+        self._transition_table_available = True
 
         if not isinstance(machine, CountingRewardMachine):
             self.crm = RmToCrmAdapter(rm=machine)
         else:
             self.crm = machine
 
+        # Propositions are passed to the machine as bitmasks, without building a
+        # proposition set per step, unless the machine or the labelling function
+        # override the set-based interface.
+        self._bitmask_props = (
+            type(self.crm).transition is CountingRewardMachine.transition
+            and type(self.lf).__call__ is LabellingFunction.__call__
+        )
+
+    @property
+    def props(self) -> set[Enum]:
+        """Return the environment propositions of the last step."""
+        if isinstance(self._props, int):
+            return bitmask_to_props(self._props, self.crm.env_prop_enum)
+        return self._props
+
+    @props.setter
+    def props(self, props: set[Enum] | int) -> None:
+        self._props = props
+
+    def _label(
+        self, ground_obs: GroundObsType, action: ActType, next_ground_obs: GroundObsType
+    ) -> set[Enum] | int:
+        """Return the propositions of a ground transition in the machine's format."""
+        if self._bitmask_props:
+            return self.lf.bitmask(ground_obs, action, next_ground_obs)
+        return self.lf(ground_obs, action, next_ground_obs)
+
     def _get_obs(
         self, ground_obs: GroundObsType, u: int, c: tuple[int, ...]
     ) -> np.ndarray:
@@ -46,6 +176,43 @@ class CrossProduct(ABC, gym.Env, Generic[GroundObsType, ObsType, ActType, Render
         c_enc = np.array(c, dtype=np.float32)
         return np.concatenate((ground_obs, u_enc, c_enc), axis=0)
 
+    def _get_obs_batch(
+        self, ground_obs: GroundObsType, u: np.ndarray, c: np.ndarray, out: np.ndarray
+    ) -> np.ndarray:
+        """Write the cross product observations of a batch of configurations.
+
+        All rows share the ground observation. The default layout of ``_get_obs``
+        is filled column-wise, any other layout is filled row by row through
+        ``_get_obs``. Subclasses that override ``_get_obs`` may override this
+        method with a vectorised equivalent.
+
+        Args:
+            ground_obs (GroundObsType): Ground observation shared by every row.
+            u (np.ndarray): Machine states of shape (N,).
+            c (np.ndarray): Counter configurations of shape (N, k).
+            out (np.ndarray): Output array of shape (N, obs_dim).
+
+        Returns:
+            np.ndarray: The output array.
+        """
+        if (
+            type(self)._get_obs is not CrossProduct._get_obs
+            or type(self.crm).encode_machine_state
+            is not CountingRewardMachine.encode_machine_state
+        ):
+            for i, (u_i, c_i) in enumerate(zip(u.tolist(), c.tolist(), strict=True)):
+                out[i] = self._get_obs(ground_obs, u_i, tuple(c_i))
+            return out
+
+        ground = np.asarray(ground_obs)
+        g = ground.shape[0]
+        k = c.shape[1]
+        out[:, :g] = ground
+        out[:, g : out.shape[1] - k] = 0
+        out[np.arange(len(u)), g + u] = 1
+        out[:, out.shape[1] - k :] = c
+        return out
+
     def to_ground_obs(self, obs: np.ndarray) -> np.ndarray:
         """Convert the cross product observation to a ground observation.
 
@@ -78,8 +245,7 @@ class CrossProduct(ABC, gym.Env, Generic[GroundObsType, ObsType, ActType, Render
         self._ground_obs = self._ground_obs_next
 
         self._ground_obs_next, _, _, _, _ = self.ground_env.step(action)
-        self._props = self.lf(self._ground_obs, action, self._ground_obs_next)
-        self.props = self._props
+        self._props = self._label(self._ground_obs, action, self._ground_obs_next)
 
         self.u, self.c, reward_fn = self.crm.transition(self.u, self.c, self._props)
         reward = reward_fn(self._ground_obs, action, self._ground_obs_next)
@@ -99,43 +265,202 @@ class CrossProduct(ABC, gym.Env, Generic[GroundObsType, ObsType, ActType, Render
         """Render the cross product environment."""
         return self.ground_env.render()
 
+    def counterfactual_sources(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return the machine configurations counterfactual experience starts from.
+
+        The configurations are every machine state paired with every counter
+        configuration returned by ``sample_counter_configurations``, ordered by
+        machine state and then by counter configuration. The table is built once
+        and reused until the machine signals that its sample set changed through
+        ``invalidate_counter_samples``.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Machine states of shape (N,) and counter
+                configurations of shape (N, k).
+        """
+        version = self.crm.counter_sample_version
+        if (
+            self._counterfactual_sources is None
+            or self._counterfactual_sources_version != version
+        ):
+            self._counterfactual_sources = machine_configurations(self.crm)
+            self._counterfactual_sources_version = version
+        return self._counterfactual_sources
+
+    def _sample_counterfactual_sources(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return the counterfactual source configurations used for one step."""
+        u, c = self.counterfactual_sources()
+        size = self.counterfactual_sample_size
+        if size is None or size >= len(u):
+            return u, c
+
+        idx = np.sort(self.np_random.choice(len(u), size=size, replace=False))
+        return u[idx], c[idx]
+
+    def _counterfactual_table(self) -> TransitionTable | None:
+        """Return the transition table of counterfactual experience, if available.
+
+        The table of a compiled machine is shared. Otherwise a table private to the
+        environment is built once, so the machine itself is not compiled.
+        """
+        if not self._transition_table_available:
+            return None
+        if self.crm.is_compiled:
+            return self.crm.transition_table
+        if self._transition_table is None:
+            try:
+                self._transition_table = self.crm.build_transition_table(
+                    self.counterfactual_table_size
+                )
+            except ValueError:
+                # Lookup table would be too large, use scalar transitions instead.
+                self._transition_table_available = False
+        return self._transition_table
+
+    def _counterfactual_transitions(
+        self,
+        u: np.ndarray,
+        c: np.ndarray,
+        props: set[Enum] | int,
+        ground_obs: GroundObsType,
+        action: ActType,
+        next_ground_obs: GroundObsType,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Apply the machine to a batch of source configurations.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: Mask of rows
+                with a defined transition of shape (N,), and the next states,
+                next counter configurations and rewards of the defined rows.
+        """
+        table = self._counterfactual_table()
+
+        if table is not None:
+            p_mask = np.full(len(u), table.props_to_bitmask(props), dtype=np.int64)
+            u_next, c_next, edges = table.lookup_batch(u, c, p_mask)
+            valid = edges >= 0
+            rewards = edge_rewards(
+                table, edges[valid], ground_obs, action, next_ground_obs
+            )
+            return valid, u_next[valid], c_next[valid], rewards
+
+        valid = np.zeros(len(u), dtype=np.bool_)
+        u_next, c_next, rewards = [], [], []
+        for i, (u_i, c_i) in enumerate(zip(u.tolist(), c.tolist(), strict=True)):
+            try:
+                u_j, c_j, rf_j = self.crm.transition(u_i, tuple(c_i), props)
+            except ValueError:
+                # Transition is no-op, therefore skip.
+                continue
+
+            valid[i] = True
+            u_next.append(u_j)
+            c_next.append(c_j)
+            rewards.append(rf_j(ground_obs, action, next_ground_obs))
+
+        return (
+            valid,
+            np.array(u_next, dtype=np.int64),
+            np.array(c_next, dtype=np.int64).reshape(len(u_next), c.shape[1]),
+            np.array(rewards, dtype=np.float64),
+        )
+
+    def _get_counterfactual_buffer(
+        self, ground_obs: GroundObsType, action: np.ndarray, n: int
+    ) -> CounterfactualBuffer:
+        """Return the reused counterfactual buffer, reallocating it if required."""
+        ground = np.asarray(ground_obs)
+        key = (ground.shape, ground.dtype, action.shape, action.dtype)
+        out = self._counterfactual_buffer
+        if out is None or out.capacity < n or self._counterfactual_buffer_key != key:
+            obs = self._get_obs(ground_obs, self.crm.u_0, self.crm.c_0)
+            out = CounterfactualBuffer(
+                capacity=max(n, len(self.counterfactual_sources()[0])),
+                obs_shape=obs.shape,
+                action_shape=action.shape,
+                obs_dtype=obs.dtype,
+                action_dtype=action.dtype,
+            )
+            self._counterfactual_buffer = out
+            self._counterfactual_buffer_key = key
+        return out
+
+    def generate_counterfactual_batch(
+        self,
+        ground_obs: GroundObsType,
+        action: ActType,
+        next_ground_obs: GroundObsType,
+        out: CounterfactualBuffer | None = None,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, int]:
+        """Generate counterfactual experiences into preallocated buffers.
+
+        Experiences are written to the first rows of ``out``. If no buffer is
+        given, a buffer owned by the environment is reused across calls, so the
+        returned arrays are overwritten by the next call and must be copied if
+        they are kept.
+
+        Args:
+            ground_obs (GroundObsType): Ground observation.
+            action (ActType): Action taken.
+            next_ground_obs (GroundObsType): Next ground observation.
+            out (CounterfactualBuffer | None): Buffer to write experiences to.
+
+        Returns:
+            tuple: Views of the observations, actions, next observations, rewards
+                and dones of the generated experiences, and the number of
+                generated experiences.
+
+        Raises:
+            ValueError: If ``out`` cannot hold the generated experiences.
+        """
+        props = self._label(ground_obs, action, next_ground_obs)
+        u, c = self._sample_counterfactual_sources()
+        valid, u_next, c_next, rewards = self._counterfactual_transitions(
+            u, c, props, ground_obs, action, next_ground_obs
+        )
+        n = len(u_next)
+
+        action_arr = np.asarray(action)
+        if out is None:
+            out = self._get_counterfactual_buffer(ground_obs, action_arr, len(u))
+        elif n > out.capacity:
+            raise ValueError(
+                f"Counterfactual buffer with capacity {out.capacity} cannot hold "
+                + f"{n} experiences"
+            )
+
+        self._get_obs_batch(ground_obs, u[valid], c[valid], out.obs[:n])
+        self._get_obs_batch(next_ground_obs, u_next, c_next, out.next_obs[:n])
+        out.action[:n] = action_arr
+        out.reward[:n] = rewards
+        out.done[:n] = u_next == self.crm.F[0]
+
+        return (
+            out.obs[:n],
+            out.action[:n],
+            out.next_obs[:n],
+            out.reward[:n],
+            out.done[:n],
+            n,
+        )
+
     def generate_counterfactual_experience(
         self, ground_obs: GroundObsType, action: ActType, next_ground_obs: GroundObsType
     ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
-        """Generate counterfactual experiences."""
-        (
-            obs_buffer,
-            action_buffer,
-            obs_next_buffer,
-            reward_buffer,
-            done_buffer,
-            info_buffer,
-        ) = ([] for _ in range(6))
-
-        props = self.lf(ground_obs, action, next_ground_obs)
-
-        for u_i in self.crm.U:
-            for c_i in self.crm.sample_counter_configurations():
-                try:
-                    u_j, c_j, rf_j = self.crm.transition(u_i, c_i, props)  # type: ignore
-                except ValueError:
-                    # Transition is no-op, therefore skip.
-                    continue
-
-                r_j = rf_j(ground_obs, action, next_ground_obs)
-
-                obs_buffer.append(self._get_obs(ground_obs, u_i, c_i))
-                action_buffer.append(action)
-                obs_next_buffer.append(self._get_obs(next_ground_obs, u_j, c_j))
-                reward_buffer.append(r_j)
-                done_buffer.append(u_j in self.crm.F)
-                info_buffer.append({})
+        """Generate counterfactual experiences.
 
+        Returns freshly allocated copies of the experiences produced by
+        ``generate_counterfactual_batch`` together with an info dict per
+        experience.
+        """
+        obs, actions, next_obs, rewards, dones, n = self.generate_counterfactual_batch(
+            ground_obs, action, next_ground_obs
+        )
         return (
-            np.array(obs_buffer),
-            np.array(action_buffer),
-            np.array(obs_next_buffer),
-            np.array(reward_buffer),
-            np.array(done_buffer),
-            np.array(info_buffer),
+            obs.copy(),
+            actions.copy(),
+            next_obs.copy(),
+            rewards.copy(),
+            dones.copy(),
+            np.array([{} for _ in range(n)]),
         )
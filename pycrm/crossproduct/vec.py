@@ -0,0 +1,342 @@
+from typing import Any, Sequence
+
+import gymnasium as gym
+import numpy as np
+from gymnasium.vector.utils import batch_space
+
+from pycrm.automaton import (
+    CountingRewardMachine,
+    RewardMachine,
+    RmToCrmAdapter,
+)
+from pycrm.crossproduct.crossproduct import edge_rewards, machine_configurations
+from pycrm.label import LabellingFunction
+
+# Gymnasium 1.x declares the autoreset mode of vector environments and reports
+# final observations under ``final_obs``. Earlier versions always autoreset in
+# the same step and report them under ``final_observation``.
+_AUTORESET_MODE = getattr(gym.vector, "AutoresetMode", None)
+
+
+class CrossProductVecEnv(gym.vector.VectorEnv):
+    """Vectorised cross product of N copies of a ground environment.
+
+    The machine states and counter configurations of the copies are stored as
+    arrays of shape (N,) and (N, k). Every step labels the N ground transitions
+    with ``LabellingFunction.batch`` and applies the transition table of the
+    machine to all copies at once. Copies whose episode finished are reset
+    in place, with their final observation stored in the info under
+    ``final_obs_key``: ``final_obs`` with Gymnasium 1.x and ``final_observation``
+    with earlier versions.
+
+    Observations default to the layout of ``CrossProduct._get_obs``: the ground
+    observation, a one-hot encoding of the machine state and the raw counter
+    values. Subclasses may override ``_get_obs_batch`` and ``to_ground_obs`` for
+    other layouts, and must then set ``single_observation_space`` and
+    ``observation_space``.
+    """
+
+    metadata: dict[str, Any] = (
+        {"autoreset_mode": _AUTORESET_MODE.SAME_STEP}
+        if _AUTORESET_MODE is not None
+        else {}
+    )
+    final_obs_key = "final_obs" if _AUTORESET_MODE is not None else "final_observation"
+
+    def __init__(
+        self,
+        ground_envs: Sequence[gym.Env],
+        machine: CountingRewardMachine | RewardMachine,
+        lf: LabellingFunction,
+        max_steps: int,
+    ) -> None:
+        """Initialize the vectorised cross product environment.
+
+        Args:
+            ground_envs (Sequence[gym.Env]): Ground environment of each copy.
+            machine (CountingRewardMachine | RewardMachine): Machine defining the
+                task.
+            lf (LabellingFunction): Labelling function of the ground environment.
+            max_steps (int): Maximum number of steps per episode.
+
+        Raises:
+            ValueError: If no ground environments are given, or the transition
+                table of the machine cannot be built.
+        """
+        if len(ground_envs) == 0:
+            raise ValueError("CrossProductVecEnv requires at least one ground env")
+        if _AUTORESET_MODE is not None:
+            super().__init__()
+        else:
+            # Gymnasium < 1.0 initialises the spaces of the vector environment
+            init_vector_env: Any = super().__init__
+            init_vector_env(
+                len(ground_envs),
+                ground_envs[0].observation_space,
+                ground_envs[0].action_space,
+            )
+
+        self.ground_envs = list(ground_envs)
+        self.lf = lf
+        self.max_steps = max_steps
+        self.num_envs = len(self.ground_envs)
+
+        if not isinstance(machine, CountingRewardMachine):
+            self.crm = RmToCrmAdapter(rm=machine)
+        else:
+            self.crm = machine
+        # The table of a compiled machine is shared, otherwise a private table is
+        # built so the machine itself is not compiled
+        self._table = (
+            self.crm.transition_table
+            if self.crm.is_compiled
+            else self.crm.build_transition_table()
+        )
+        self._terminal_states = np.array(self.crm.F, dtype=np.int64)
+        self._n_machine_states = len(self.crm.encode_machine_state(self.crm.u_0))
+
+        self.u = np.full(self.num_envs, self.crm.u_0, dtype=np.int64)
+        self.c = np.tile(np.array(self.crm.c_0, dtype=np.int64), (self.num_envs, 1))
+        self.steps = np.zeros(self.num_envs, dtype=np.int64)
+        self.props = np.zeros(self.num_envs, dtype=np.int64)
+        self._ground_obs: np.ndarray | None = None
+
+        self._counterfactual_sources: tuple[np.ndarray, np.ndarray] | None = None
+        self._counterfactual_sources_version = -1
+
+        self.single_action_space = self.ground_envs[0].action_space
+        self.action_space = batch_space(self.single_action_space, self.num_envs)
+        ground_space = getattr(self.ground_envs[0], "observation_space", None)
+        if type(self)._get_obs_batch is CrossProductVecEnv._get_obs_batch and (
+            isinstance(ground_space, gym.spaces.Box)
+        ):
+            self.single_observation_space = gym.spaces.Box(
+                low=-np.inf,
+                high=np.inf,
+                shape=(
+                    ground_space.shape[0] + self._n_machine_states + len(self.crm.c_0),
+                ),
+                dtype=np.result_type(ground_space.dtype, np.float32),
+            )
+            self.observation_space = batch_space(
+                self.single_observation_space, self.num_envs
+            )
+
+    def _get_obs_batch(
+        self, ground_obs: np.ndarray, u: np.ndarray, c: np.ndarray
+    ) -> np.ndarray:
+        """Get the cross product observations of a batch of configurations.
+
+        Args:
+            ground_obs (np.ndarray): Ground observations of shape (N, ...).
+            u (np.ndarray): Machine states of shape (N,).
+            c (np.ndarray): Counter configurations of shape (N, k).
+
+        Returns:
+            np.ndarray: Cross product observations of shape (N, obs_dim).
+        """
+        ground = np.asarray(ground_obs).reshape(len(u), -1)
+        g = ground.shape[1]
+        k = c.shape[1]
+        out = np.zeros(
+            (len(u), g + self._n_machine_states + k),
+            dtype=np.result_type(ground.dtype, np.float32),
+        )
+        out[:, :g] = ground
+        if (
+            type(self.crm).encode_machine_state
+            is CountingRewardMachine.encode_machine_state
+        ):
+            out[np.arange(len(u)), g + u] = 1
+        else:
+            for i, u_i in enumerate(u.tolist()):
+                out[i, g : g + self._n_machine_states] = self.crm.encode_machine_state(
+                    u_i
+                )
+        out[:, g + self._n_machine_states :] = c
+        return out
+
+    def to_ground_obs(self, obs: np.ndarray) -> np.ndarray:
+        """Convert cross product observations of shape (N, obs_dim) to ground ones."""
+        return obs[..., : -(self._n_machine_states + len(self.crm.c_0))]
+
+    def reset(
+        self, *, seed: int | list[int | None] | None = None, options: dict | None = None
+    ) -> tuple[np.ndarray, dict[str, Any]]:
+        """Reset every copy of the environment.
+
+        Args:
+            seed (int | list[int | None] | None): Seed of the first copy, with
+                copy ``i`` seeded with ``seed + i``, or a seed per copy.
+            options (dict | None): Options passed to every ground environment.
+
+        Returns:
+            tuple[np.ndarray, dict[str, Any]]: Observations of shape (N, obs_dim)
+                and an empty info dict.
+        """
+        if seed is None or isinstance(seed, int):
+            seeds = [None if seed is None else seed + i for i in range(self.num_envs)]
+        else:
+            seeds = seed
+        if len(seeds) != self.num_envs:
+            raise ValueError(
+                f"Expected {self.num_envs} seeds, got {len(seeds)} seeds instead"
+            )
+
+        self._ground_obs = np.stack(
+            [
+                env.reset(seed=s, options=options)[0]
+                for env, s in zip(self.ground_envs, seeds, strict=True)
+            ]
+        )
+        self.u[:] = self.crm.u_0
+        self.c[:] = self.crm.c_0
+        self.steps[:] = 0
+        return self._get_obs_batch(self._ground_obs, self.u, self.c), {}
+
+    def step(
+        self, actions: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, dict[str, Any]]:
+        """Take a step in every copy of the environment.
+
+        Args:
+            actions (np.ndarray): Actions of shape (N, ...).
+
+        Returns:
+            tuple: Observations, rewards, terminations and truncations of shape
+                (N, ...), and an info dict. Copies that finished their episode
+                are reset, the ``final_obs_key`` info holds their final
+                observations and the same key prefixed with an underscore marks
+                which copies were reset.
+
+        Raises:
+            ValueError: If the machine has no transition defined for a copy.
+        """
+        assert self._ground_obs is not None, "Call reset before step"
+        actions = np.asarray(actions)
+        ground_obs = self._ground_obs
+        next_ground_obs = np.stack(
+            [
+                env.step(action)[0]
+                for env, action in zip(self.ground_envs, actions, strict=True)
+            ]
+        )
+        self.steps += 1
+
+        self.props = self.lf.batch(ground_obs, actions, next_ground_obs)
+        u_next, c_next, edges = self._table.lookup_batch(self.u, self.c, self.props)
+        if np.any(edges < 0):
+            i = int(np.flatnonzero(edges < 0)[0])
+            raise ValueError(
+                "Transition not defined for machine configuration "
+                + f"({self.u[i]}, {tuple(self.c[i].tolist())}) and environment "
+                + f"propositions {int(self.props[i])}"
+            )
+
+        reward_fns = self._table.reward_fns
+        rewards = np.array(
+            [
+                reward_fns[e](ground_obs[i], actions[i], next_ground_obs[i])
+                for i, e in enumerate(edges.tolist())
+            ],
+            dtype=np.float64,
+        )
+
+        self.u = u_next
+        self.c = c_next
+        self._ground_obs = next_ground_obs
+        terminated = np.isin(self.u, self._terminal_states)
+        truncated = self.steps >= self.max_steps
+        obs = self._get_obs_batch(next_ground_obs, self.u, self.c)
+
+        infos: dict[str, Any] = {}
+        done = terminated | truncated
+        if np.any(done):
+            final_obs = np.empty(self.num_envs, dtype=object)
+            infos[self.final_obs_key] = final_obs
+            infos["_" + self.final_obs_key] = done
+            for i in np.flatnonzero(done).tolist():
+                final_obs[i] = obs[i].copy()
+                next_ground_obs[i] = self.ground_envs[i].reset()[0]
+            self.u[done] = self.crm.u_0
+            self.c[done] = self.crm.c_0
+            self.steps[done] = 0
+            obs[done] = self._get_obs_batch(
+                next_ground_obs[done], self.u[done], self.c[done]
+            )
+        return obs, rewards, terminated, truncated, infos
+
+    def counterfactual_sources(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return the machine configurations counterfactual experience starts from.
+
+        See ``CrossProduct.counterfactual_sources``.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Machine states of shape (S,) and counter
+                configurations of shape (S, k).
+        """
+        version = self.crm.counter_sample_version
+        if (
+            self._counterfactual_sources is None
+            or self._counterfactual_sources_version != version
+        ):
+            self._counterfactual_sources = machine_configurations(self.crm)
+            self._counterfactual_sources_version = version
+        return self._counterfactual_sources
+
+    def generate_counterfactual_batch(
+        self,
+        ground_obs: np.ndarray,
+        actions: np.ndarray,
+        next_ground_obs: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Generate counterfactual experience for a ground transition of every copy.
+
+        The transitions of all copies are applied to every counterfactual source
+        configuration in a single table lookup. Experiences are ordered by copy
+        and then by source configuration.
+
+        Args:
+            ground_obs (np.ndarray): Ground observations of shape (N, ...).
+            actions (np.ndarray): Actions of shape (N, ...).
+            next_ground_obs (np.ndarray): Next ground observations of shape (N, ...).
+
+        Returns:
+            tuple: Observations, actions, next observations, rewards and dones of
+                the generated experiences, and the copy each experience was
+                generated from.
+        """
+        ground_obs = np.asarray(ground_obs)
+        actions = np.asarray(actions)
+        next_ground_obs = np.asarray(next_ground_obs)
+        n = len(ground_obs)
+
+        props = self.lf.batch(ground_obs, actions, next_ground_obs)
+        source_u, source_c = self.counterfactual_sources()
+        s = len(source_u)
+        copy = np.repeat(np.arange(n), s)
+        u = np.tile(source_u, n)
+        c = np.tile(source_c, (n, 1))
+        u_next, c_next, edges = self._table.lookup_batch(u, c, props[copy])
+
+        valid = edges >= 0
+        copy, edges = copy[valid], edges[valid]
+
+        rewards = edge_rewards(
+            self._table, edges, ground_obs, actions, next_ground_obs, copy=copy
+        )
+
+        u_next, c_next = u_next[valid], c_next[valid]
+        return (
+            self._get_obs_batch(ground_obs[copy], u[valid], c[valid]),
+            actions[copy],
+            self._get_obs_batch(next_ground_obs[copy], u_next, c_next),
+            rewards,
+            np.isin(u_next, self._terminal_states),
+            copy,
+        )
+
+    def close_extras(self, **kwargs: Any) -> None:
+        """Close the ground environments."""
+        for env in self.ground_envs:
+            env.close()
@@ -0,0 +1,9 @@
+from pycrm.experiment.runner import (
+    Job,
+    load_results,
+    make_grid,
+    run_experiments,
+    run_job,
+)
+
+__all__ = ["Job", "load_results", "make_grid", "run_experiments", "run_job"]
@@ -0,0 +1,4 @@
+from pycrm.experiment.cli import main
+
+if __name__ == "__main__":
+    main()
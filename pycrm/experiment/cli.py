@@ -0,0 +1,69 @@
+import argparse
+import importlib
+import os
+import sys
+from typing import Any
+
+from pycrm.experiment.runner import Job, run_experiments
+
+
+def load_grid(spec: str) -> list[Job]:
+    """Load the jobs of a grid from a ``module:attribute`` specification.
+
+    Args:
+        spec (str): Module and attribute of the grid, e.g.
+            ``examples.experiments:office_world``. The attribute is a sequence
+            of jobs or a function without arguments returning one.
+
+    Returns:
+        list[Job]: Jobs of the grid.
+
+    Raises:
+        ValueError: If the specification is not of the form
+            ``module:attribute``.
+    """
+    module_name, _, attribute = spec.partition(":")
+    if not module_name or not attribute:
+        raise ValueError(f"Grid must be given as 'module:attribute', got '{spec}'")
+    grid: Any = getattr(importlib.import_module(module_name), attribute)
+    if callable(grid):
+        grid = grid()
+    return list(grid)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Run an experiment grid from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Run a grid of training jobs in parallel worker processes"
+    )
+    parser.add_argument(
+        "grid",
+        help="Grid to run, e.g. examples.experiments:office_world",
+    )
+    parser.add_argument(
+        "--output",
+        help="CSV file to write the per-episode returns to",
+        default="results.csv",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of worker processes (default: one per available core)",
+        default=None,
+    )
+    parser.add_argument(
+        "--threads-per-worker",
+        type=int,
+        help="Number of BLAS and torch threads of each worker",
+        default=1,
+    )
+    args = parser.parse_args(argv)
+
+    # Resolve grids relative to the working directory, as `python -m` does
+    sys.path.insert(0, os.getcwd())
+    run_experiments(
+        load_grid(args.grid),
+        args.output,
+        max_workers=args.workers,
+        threads_per_worker=args.threads_per_worker,
+    )
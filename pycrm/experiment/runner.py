@@ -0,0 +1,274 @@
+import csv
+import inspect
+import itertools
+import multiprocessing
+import os
+import random
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import gymnasium as gym
+import numpy as np
+import torch
+from stable_baselines3.common.monitor import Monitor
+from tqdm import tqdm
+
+# Environment variables read by the BLAS and OpenMP thread pools at import time
+_THREAD_VARIABLES = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+
+@dataclass(frozen=True)
+class Job:
+    """A single training run of an experiment.
+
+    Jobs are sent to worker processes, so ``make_env`` and ``agent_cls`` must be
+    picklable, for example functions and classes defined at module level.
+
+    Attributes:
+        name (str): Name of the configuration. Jobs that only differ in their
+            seed share a name.
+        make_env (Callable[[], gym.Env]): Function returning the environment
+            to train on, for example a cross product.
+        agent_cls (type): Agent to train, for example ``QLearningAgent`` or
+            ``CounterfactualDQN``.
+        seed (int): Random seed of the run.
+        hyperparameters (dict[str, Any]): Keyword arguments of the agent.
+        learn_kwargs (dict[str, Any]): Keyword arguments of ``agent.learn``,
+            for example ``total_episodes`` or ``total_timesteps``.
+    """
+
+    name: str
+    make_env: Callable[[], gym.Env]
+    agent_cls: type
+    seed: int
+    hyperparameters: dict[str, Any] = field(default_factory=dict)
+    learn_kwargs: dict[str, Any] = field(default_factory=dict)
+
+
+def make_grid(
+    name: str,
+    make_env: Callable[[], gym.Env],
+    agent_cls: type,
+    seeds: Sequence[int],
+    learn_kwargs: dict[str, Any] | None = None,
+    **hyperparameters: Sequence[Any],
+) -> list[Job]:
+    """Create a job for every combination of hyperparameters and seed.
+
+    Example:
+        >>> make_grid(
+        ...     "office_world/ql",
+        ...     make_office_world,
+        ...     QLearningAgent,
+        ...     seeds=range(10),
+        ...     learn_kwargs={"total_episodes": 5000},
+        ...     learning_rate=[0.01, 0.1],
+        ...     epsilon=[0.1],
+        ... )
+
+    Args:
+        name (str): Name of the grid. The hyperparameters that take more than
+            one value are appended to it to name each configuration, e.g.
+            ``office_world/ql[learning_rate=0.1]``.
+        make_env (Callable[[], gym.Env]): Function returning the environment.
+        agent_cls (type): Agent to train.
+        seeds (Sequence[int]): Seeds to run each configuration with.
+        learn_kwargs (dict[str, Any] | None): Keyword arguments of
+            ``agent.learn``.
+        **hyperparameters (Sequence[Any]): Values of each keyword argument of
+            the agent.
+
+    Returns:
+        list[Job]: Jobs of the grid.
+    """
+    keys = sorted(hyperparameters)
+    varied = {key for key in keys if len(hyperparameters[key]) > 1}
+    jobs = []
+    for values in itertools.product(*(hyperparameters[key] for key in keys)):
+        params = dict(zip(keys, values, strict=True))
+        config = ",".join(
+            f"{key}={value}" for key, value in params.items() if key in varied
+        )
+        for seed in seeds:
+            jobs.append(
+                Job(
+                    name=f"{name}[{config}]" if config else name,
+                    make_env=make_env,
+                    agent_cls=agent_cls,
+                    seed=int(seed),
+                    hyperparameters=params,
+                    learn_kwargs=dict(learn_kwargs or {}),
+                )
+            )
+    return jobs
+
+
+def run_job(job: Job) -> np.ndarray:
+    """Train the agent of a job and return the return of every episode.
+
+    The global random number generators are seeded with the seed of the job,
+    which is also passed to agents that take a ``seed`` argument. Episode
+    returns are recorded by a ``Monitor`` wrapper, so any agent that trains on
+    the environment it is given is supported.
+
+    Args:
+        job (Job): Job to run.
+
+    Returns:
+        np.ndarray: Return of every episode completed during training.
+    """
+    random.seed(job.seed)
+    np.random.seed(job.seed)
+    torch.manual_seed(job.seed)
+
+    env = Monitor(job.make_env())
+    env.reset(seed=job.seed)
+    kwargs = dict(job.hyperparameters)
+    if "seed" in inspect.signature(job.agent_cls).parameters:
+        kwargs.setdefault("seed", job.seed)
+    agent = job.agent_cls(env=env, **kwargs)
+    agent.learn(**job.learn_kwargs)
+    return np.asarray(env.get_episode_rewards(), dtype=np.float64)
+
+
+def run_experiments(
+    jobs: Sequence[Job],
+    path: str | os.PathLike,
+    max_workers: int | None = None,
+    threads_per_worker: int = 1,
+) -> None:
+    """Run jobs in parallel worker processes and write their returns to a file.
+
+    Workers are started with the ``spawn`` method and with ``threads_per_worker``
+    BLAS, OpenMP and torch threads each, so that ``max_workers`` workers use
+    about ``max_workers * threads_per_worker`` cores. The progress bars of the
+    agents are disabled in the workers, and the progress over jobs is shown
+    instead.
+
+    The results are written as CSV with one row per episode and the columns
+    ``job``, ``agent``, ``seed``, one column per hyperparameter, ``episode``
+    and ``return``. The rows of a job are appended as soon as it finishes, so
+    the results of finished jobs are kept if the experiment is interrupted.
+
+    Args:
+        jobs (Sequence[Job]): Jobs to run.
+        path (str | os.PathLike): File to write the results to. An existing
+            file is overwritten.
+        max_workers (int | None): Number of worker processes. If None, one per
+            ``threads_per_worker`` available cores.
+        threads_per_worker (int): Number of threads each worker may use.
+
+    Raises:
+        ValueError: If ``threads_per_worker`` is not positive.
+    """
+    if threads_per_worker < 1:
+        raise ValueError(f"threads_per_worker must be positive: {threads_per_worker}")
+    if max_workers is None:
+        max_workers = max(1, _available_cores() // threads_per_worker)
+
+    hyperparameters = sorted({key for job in jobs for key in job.hyperparameters})
+    with (
+        open(path, "w", newline="") as file,
+        _worker_environ(threads_per_worker),
+        ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(threads_per_worker,),
+        ) as executor,
+        tqdm(total=len(jobs)) as progress,
+    ):
+        writer = csv.writer(file)
+        writer.writerow(["job", "agent", "seed", *hyperparameters, "episode", "return"])
+        file.flush()
+
+        pending = {executor.submit(run_job, job): job for job in jobs}
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = pending.pop(future)
+                    params = [
+                        job.hyperparameters.get(key, "") for key in hyperparameters
+                    ]
+                    prefix = [job.name, job.agent_cls.__name__, job.seed, *params]
+                    writer.writerows(
+                        [*prefix, episode, return_]
+                        for episode, return_ in enumerate(future.result().tolist())
+                    )
+                    file.flush()
+                    progress.update()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def load_results(path: str | os.PathLike) -> dict[str, np.ndarray]:
+    """Load the results written by ``run_experiments`` as columns.
+
+    Args:
+        path (str | os.PathLike): Results file.
+
+    Returns:
+        dict[str, np.ndarray]: Column name to values. ``seed`` and ``episode``
+            are integers, ``return`` is a float and every other column is a
+            string.
+    """
+    with open(Path(path), newline="") as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        rows = list(reader)
+
+    columns = {}
+    values_of = list(zip(*rows, strict=True)) if rows else [()] * len(header)
+    for key, values in zip(header, values_of, strict=True):
+        if key in ("seed", "episode"):
+            columns[key] = np.array(values, dtype=np.int64)
+        elif key == "return":
+            columns[key] = np.array(values, dtype=np.float64)
+        else:
+            columns[key] = np.array(values, dtype=np.str_)
+    return columns
+
+
+def _available_cores() -> int:
+    """Return the number of cores this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+@contextmanager
+def _worker_environ(n_threads: int) -> Iterator[None]:
+    """Set the environment of worker processes started in the context.
+
+    The variables must be set before a worker starts, as the thread pools read
+    them when they are imported.
+    """
+    environ: dict[str, str] = dict.fromkeys(_THREAD_VARIABLES, str(n_threads))
+    environ["TQDM_DISABLE"] = "1"
+    previous = {key: os.environ.get(key) for key in environ}
+    os.environ.update(environ)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def _init_worker(n_threads: int) -> None:
+    """Limit the threads of a worker process."""
+    torch.set_num_threads(n_threads)
@@ -1,3 +1,4 @@
+from pycrm.label.bitmask import bitmask_to_props, prop_bits, props_to_bitmask
 from pycrm.label.function import LabellingFunction
 
-__all__ = ["LabellingFunction"]
+__all__ = ["LabellingFunction", "bitmask_to_props", "prop_bits", "props_to_bitmask"]
@@ -0,0 +1,49 @@
+from enum import Enum, EnumMeta
+from functools import lru_cache
+from typing import Iterable
+
+
+@lru_cache(maxsize=128)
+def prop_bits(env_prop_enum: EnumMeta) -> dict[Enum, int]:
+    """Return the mapping from environment propositions to bitmask bits.
+
+    Propositions are assigned bits in the order they are defined in the Enum,
+    so the i-th member is encoded by ``1 << i``.
+
+    Args:
+        env_prop_enum (EnumMeta): Enum class containing environment properties.
+
+    Returns:
+        dict[Enum, int]: Mapping from each proposition to its bit.
+    """
+    return {prop: 1 << i for i, prop in enumerate(env_prop_enum)}  # type: ignore
+
+
+def props_to_bitmask(props: Iterable[Enum], env_prop_enum: EnumMeta) -> int:
+    """Encode a collection of propositions as an integer bitmask.
+
+    Args:
+        props (Iterable[Enum]): Environment propositions.
+        env_prop_enum (EnumMeta): Enum class containing environment properties.
+
+    Returns:
+        int: Bitmask with the bit of each proposition set.
+    """
+    bits = prop_bits(env_prop_enum)
+    mask = 0
+    for prop in props:
+        mask |= bits.get(prop, 0)
+    return mask
+
+
+def bitmask_to_props(mask: int, env_prop_enum: EnumMeta) -> set[Enum]:
+    """Decode an integer bitmask into a set of propositions.
+
+    Args:
+        mask (int): Proposition bitmask.
+        env_prop_enum (EnumMeta): Enum class containing environment properties.
+
+    Returns:
+        set[Enum]: Propositions whose bit is set in the mask.
+    """
+    return {prop for prop, bit in prop_bits(env_prop_enum).items() if mask & bit}
@@ -1,7 +1,12 @@
 from abc import ABC
 from enum import Enum
+from functools import cached_property
 from typing import Any, Callable, Generic, TypeVar
 
+import numpy as np
+
+from pycrm.label.bitmask import prop_bits
+
 ObsType = TypeVar("ObsType")
 ActType = TypeVar("ActType")
 
@@ -18,30 +23,155 @@ class LabellingFunction(ABC, Generic[ObsType, ActType]):
     The purpose of the decorated methods is to accept an environment transition
     and test whether a given event is taking place. If so, return the
     appropriate Enum. If not, return `None`.
+
+    Labels can be returned either as a set of Enum members via `__call__`, or as
+    an integer bitmask via `bitmask`, where the i-th member of the Enum is
+    encoded by bit `1 << i`.
+
+    Event methods are discovered once per class when the class is defined.
+
+    Event tests can also be declared batch-capable with the `batch_event`
+    decorator. Batch event methods accept arrays of N transitions, with shape
+    (N, ...), and return a boolean mask of shape (N,) indicating where the given
+    event takes place. `batch` labels N transitions at once, returning an array
+    of proposition bitmasks, and evaluates non-batch events row by row.
     """
 
+    _event_method_names: tuple[str, ...] = ()
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        """Discover the event methods of the labelling function class."""
+        super().__init_subclass__(**kwargs)
+        cls._event_method_names = tuple(
+            name
+            for name in dir(cls)
+            if getattr(getattr(cls, name, None), "_is_event_method", False)
+        )
+
+    @cached_property
+    def _event_methods(self) -> tuple[Callable, ...]:
+        """Return the bound event methods in discovery order.
+
+        Batch event methods are adapted to accept and label a single transition.
+        """
+        methods = []
+        for name in self._event_method_names:
+            method = getattr(self, name)
+            prop = getattr(method, "_batch_event_prop", None)
+            if prop is not None:
+                method = self._unbatch_event(method, prop)
+            methods.append(method)
+        return tuple(methods)
+
+    @cached_property
+    def _batch_event_methods(self) -> tuple[tuple[Callable, int], ...]:
+        """Return the bound batch event methods with their proposition bits."""
+        methods = []
+        for name in self._event_method_names:
+            method = getattr(self, name)
+            prop = getattr(method, "_batch_event_prop", None)
+            if prop is not None:
+                methods.append((method, prop_bits(type(prop))[prop]))
+        return tuple(methods)
+
+    @cached_property
+    def _scalar_event_methods(self) -> tuple[Callable, ...]:
+        """Return the bound event methods which are not batch-capable."""
+        return tuple(
+            getattr(self, name)
+            for name in self._event_method_names
+            if getattr(getattr(self, name), "_batch_event_prop", None) is None
+        )
+
+    def __getstate__(self) -> dict:
+        """Return the instance state without the cached bound event methods."""
+        state = self.__dict__.copy()
+        for name in ("_event_methods", "_batch_event_methods", "_scalar_event_methods"):
+            state.pop(name, None)
+        return state
+
     @staticmethod
     def event(
         func: Callable[[Any, ObsType, ActType, ObsType], Enum | None],
     ) -> Callable[[Any, ObsType, ActType, ObsType], Enum | None]:
         """Register an event test."""
+        setattr(func, "_is_event_method", True)
+        return func
+
+    @staticmethod
+    def batch_event(
+        prop: Enum,
+    ) -> Callable[[Callable[..., np.ndarray]], Callable[..., np.ndarray]]:
+        """Register a batch-capable event test for the given proposition.
 
-        def wrapper(self, *args, **kwargs) -> Enum | None:
-            """The decorated method."""
-            return func(self, *args, **kwargs)
+        The decorated method accepts arrays of N transitions and returns a
+        boolean mask of shape (N,) indicating where the event takes place.
+        """
 
-        setattr(wrapper, "_is_event_method", True)
-        return wrapper
+        def decorator(func: Callable[..., np.ndarray]) -> Callable[..., np.ndarray]:
+            setattr(func, "_is_event_method", True)
+            setattr(func, "_batch_event_prop", prop)
+            return func
+
+        return decorator
 
     def __call__(self, obs: ObsType, action: ActType, next_obs: ObsType) -> set[Enum]:
         """Return set of high-level events taking place."""
         events = set()
 
-        for method_name in dir(self):
-            method = getattr(self, method_name)
+        for method in self._event_methods:
+            result = method(obs, action, next_obs)
+            if result is not None:
+                events.add(result)
+        return events
+
+    def bitmask(self, obs: ObsType, action: ActType, next_obs: ObsType) -> int:
+        """Return high-level events taking place encoded as an integer bitmask."""
+        mask = 0
+
+        for method in self._event_methods:
+            result = method(obs, action, next_obs)
+            if result is not None:
+                mask |= prop_bits(type(result))[result]  # type: ignore
+        return mask
+
+    def batch(self, obs: Any, action: Any, next_obs: Any) -> np.ndarray:
+        """Return high-level events taking place in a batch of transitions.
+
+        Args:
+            obs: Observations of shape (N, ...).
+            action: Actions of shape (N, ...).
+            next_obs: Next observations of shape (N, ...).
+
+        Returns:
+            np.ndarray: Proposition bitmasks of shape (N,).
+        """
+        obs = np.asarray(obs)
+        action = np.asarray(action)
+        next_obs = np.asarray(next_obs)
+        masks = np.zeros(len(obs), dtype=np.int64)
 
-            if callable(method) and getattr(method, "_is_event_method", False):
-                result = method(obs, action, next_obs)
+        for method, bit in self._batch_event_methods:
+            events = np.asarray(method(obs, action, next_obs), dtype=bool)
+            masks[events] |= bit
+
+        for method in self._scalar_event_methods:
+            for i in range(len(obs)):
+                result = method(obs[i], action[i], next_obs[i])
                 if result is not None:
-                    events.add(result)
-        return events
+                    masks[i] |= prop_bits(type(result))[result]  # type: ignore
+        return masks
+
+    @staticmethod
+    def _unbatch_event(method: Callable, prop: Enum) -> Callable:
+        """Adapt a batch event method to label a single transition."""
+
+        def event(obs: Any, action: Any, next_obs: Any) -> Enum | None:
+            events = method(
+                np.asarray(obs)[None],
+                np.asarray(action)[None],
+                np.asarray(next_obs)[None],
+            )
+            return prop if events[0] else None
+
+        return event
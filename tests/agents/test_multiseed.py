@@ -0,0 +1,76 @@
+"""Tests for the multi-seed tabular trainer."""
+
+import gymnasium as gym
+import numpy as np
+import pytest
+
+from pycrm.agents.tabular import MultiSeedQLearning, QTable
+from pycrm.crossproduct import CrossProductVecEnv
+from tests.crossproduct.conftest import CRM, Events, GroundEnv, LabelFunction
+
+
+class DiscreteGroundEnv(GroundEnv):
+    """Ground environment moving to the state given by the action."""
+
+    def __init__(self):
+        """Initialize the ground environment."""
+        super().__init__()
+        self.action_space = gym.spaces.Discrete(2)
+
+    def step(self, action: np.ndarray) -> tuple[np.ndarray, float, bool, bool, dict]:
+        """Step the ground environment."""
+        return np.array([int(action)]), 0.0, False, False, {}
+
+
+def make_vec_env(n_seeds: int) -> CrossProductVecEnv:
+    """Return a vectorised cross product with a copy per seed."""
+    return CrossProductVecEnv(
+        ground_envs=[DiscreteGroundEnv() for _ in range(n_seeds)],
+        machine=CRM(env_prop_enum=Events),
+        lf=LabelFunction(),
+        max_steps=10,
+    )
+
+
+class TestMultiSeedQLearning:
+    """Test the multi-seed tabular trainer."""
+
+    @pytest.mark.parametrize("counterfactual", [False, True])
+    def test_learn(self, counterfactual):
+        """Test every seed trains for the given number of episodes."""
+        trainer = MultiSeedQLearning(
+            make_vec_env(3),
+            epsilon=0.1,
+            learning_rate=0.1,
+            counterfactual=counterfactual,
+            seed=0,
+        )
+        returns = trainer.learn(total_episodes=5)
+
+        assert returns.shape == (3, 5)
+        assert np.all(returns >= 0)
+        assert trainer.q_values.shape == (3, len(trainer.q_table.values), 2)
+        assert np.any(trainer.q_values != 0)
+        assert trainer.get_actions(np.zeros((3, 5))).shape == (3,)
+
+    def test_seeds_learn_independently(self):
+        """Test experiences only update the Q-values of their own seed."""
+        trainer = MultiSeedQLearning(make_vec_env(3), learning_rate=0.5)
+        obs = np.array([[0, 1, 0, 0, 0], [0, 1, 0, 0, 0]])
+
+        trainer._update(
+            obs,
+            np.array([1, 1]),
+            obs,
+            np.array([1.0, 1.0]),
+            np.array([True, True]),
+            np.array([1, 1]),
+        )
+
+        row = trainer.q_table.index(obs[0])
+        assert np.array_equal(trainer.q_values[:, row], [[0, 0], [0, 1.0], [0, 0]])
+
+    def test_q_table_size(self):
+        """Test the Q-table must hold the Q-values of every seed."""
+        with pytest.raises(ValueError, match="cannot hold"):
+            MultiSeedQLearning(make_vec_env(3), q_table=QTable(2))
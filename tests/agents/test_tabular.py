@@ -1,12 +1,13 @@
 """Tests for tabular agents."""
 
+import pickle
 from unittest.mock import Mock
 
 import gymnasium as gym
 import numpy as np
 import pytest
 
-from pycrm.agents.tabular import CounterfactualQLearningAgent, QLearningAgent
+from pycrm.agents.tabular import CounterfactualQLearningAgent, QLearningAgent, QTable
 
 
 class MockEnv(gym.Env):
@@ -56,6 +57,127 @@ class MockEnv(gym.Env):
         return np.array([next_state]), reward, terminated, truncated, {}
 
 
+class TestQTable:
+    """Test array-backed Q-table."""
+
+    @pytest.mark.parametrize(
+        "table",
+        [
+            QTable(3),
+            QTable(3, capacity=1),
+            QTable(3, low=[0, -2, 0], high=[9, 7, 9]),
+        ],
+    )
+    def test_index_batch(self, table):
+        """Test that equal observations, and only those, share a row."""
+        rng = np.random.default_rng(0)
+        obs = rng.integers(0, 10, size=(2000, 3)) - [0, 2, 0]
+        rows = table.index_batch(obs)
+
+        expected = {}
+        for key, row in zip(map(tuple, obs.tolist()), rows.tolist(), strict=True):
+            assert expected.setdefault(key, row) == row
+        assert len(set(expected.values())) == len(expected) == len(table)
+
+        for key, row in list(expected.items())[:100]:
+            assert table.index(np.array(key)) == row
+            assert key in table
+        assert np.array_equal(table.index_batch(obs), rows)
+
+    def test_rows(self):
+        """Test reading and writing rows by observation."""
+        table = QTable(2)
+        table[(1, 2)] = [0.5, 1.0]
+        table[np.array([3.0, 4.0])][1] = 2.0
+
+        assert table[np.array([1, 2])].tolist() == [0.5, 1.0]
+        assert table[(3, 4)].tolist() == [0.0, 2.0]
+        assert (5, 6) not in table
+        assert (-0.0, 2.0) not in table
+        assert (0.0, 2.0) not in table
+        table[(-0.0, 2.0)] = [1.0, 1.0]
+        assert (0.0, 2.0) in table
+        assert len(table) == 3
+
+    def test_pickle(self):
+        """Test that pickled tables keep their rows and values."""
+        table = QTable(2, capacity=1)
+        obs = np.arange(40).reshape(20, 2)
+        rows = table.index_batch(obs)
+        table.values[rows] = obs
+
+        restored = pickle.loads(pickle.dumps(table))
+        assert np.array_equal(restored.index_batch(obs), rows)
+        assert np.array_equal(restored.values[rows], obs)
+        assert len(restored) == 20
+
+    @pytest.mark.parametrize("dense", [False, True])
+    def test_save_load(self, tmp_path, dense):
+        """Test that saved tables load with their rows and values."""
+        table = QTable(2, low=[0, 0], high=[9, 9]) if dense else QTable(2)
+        obs = np.random.default_rng(0).integers(0, 10, size=(200, 2))
+        rows = table.index_batch(obs)
+        table.values[rows] = obs
+        table.save(tmp_path / "table")
+
+        for mmap_mode in ["r", "c", None]:
+            loaded = QTable.load(tmp_path / "table", mmap_mode=mmap_mode)
+            assert len(loaded) == len(table)
+            assert np.array_equal(loaded.values[loaded.index_batch(obs)], obs)
+
+        # Copy-on-write updates leave the saved table unchanged
+        loaded = QTable.load(tmp_path / "table")
+        loaded[obs[0]] = [-1.0, -1.0]
+        loaded.index_batch(obs + 10 * (not dense))
+        loaded = QTable.load(tmp_path / "table")
+        assert np.array_equal(loaded[obs[0]], obs[0])
+
+    @pytest.mark.parametrize("dense", [False, True])
+    @pytest.mark.parametrize("n_obs", [0, 3, 4])
+    def test_load_read_only(self, tmp_path, dense, n_obs):
+        """Test read-only tables give unseen observations default Q-values."""
+        table = QTable(2, low=[0], high=[9]) if dense else QTable(2, capacity=4)
+        obs = np.arange(n_obs).reshape(-1, 1)
+        table.values[table.index_batch(obs)] = obs + 1
+        table.save(tmp_path / "table")
+
+        loaded = QTable.load(tmp_path / "table", mmap_mode="r")
+        assert np.array_equal(loaded[np.array([5])], [0.0, 0.0])
+        assert np.all(loaded.values[loaded.index_batch(np.array([[5], [5], [6]]))] == 0)
+        batch = np.arange(200).reshape(-1, 1) % 10
+        assert np.array_equal(
+            loaded.values[loaded.index_batch(batch)][:, 0],
+            np.where(batch[:, 0] < n_obs, batch[:, 0] + 1, 0),
+        )
+        assert len(loaded) == n_obs
+        assert [5] not in loaded
+        with pytest.raises(ValueError, match="read-only"):
+            loaded[np.array([0])] = [1.0, 1.0]
+
+    def test_dense_bounds(self):
+        """Test that dense tables reject observations outside their bounds."""
+        table = QTable(2, low=[0, 0], high=[3, 3])
+        assert table.values.shape == (16, 2)
+        assert (4, 0) not in table
+
+        with pytest.raises(ValueError):
+            table.index(np.array([4, 0]))
+        with pytest.raises(ValueError):
+            table.index_batch(np.array([[0, 0], [0, -1]]))
+        with pytest.raises(ValueError):
+            QTable(2, low=[0, 0], high=[3, -1])
+
+    def test_from_space(self):
+        """Test that bounded discrete spaces give dense tables."""
+        box = gym.spaces.Box(low=0, high=3, shape=(2,), dtype=np.int32)
+        assert QTable.from_space(box, 2).dense
+        assert QTable.from_space(gym.spaces.MultiDiscrete([2, 3]), 2).dense
+        assert QTable.from_space(gym.spaces.Discrete(4), 2).dense
+        assert not QTable.from_space(
+            gym.spaces.Box(low=0, high=1, shape=(2,), dtype=np.float32), 2
+        ).dense
+
+
 class TestQLearningAgent:
     """Test Q-Learning Agent."""
 
@@ -102,6 +224,50 @@ class TestQLearningAgent:
         # Check that Q-table has been populated
         assert len(agent.q_table) > 0
 
+    def test_dense_q_table(self):
+        """Test that dense and hashed Q-tables learn the same values."""
+        np.random.seed(0)
+        hashed = QLearningAgent(MockEnv(), epsilon=0.5, learning_rate=0.1)
+        hashed.learn(total_episodes=20)
+
+        np.random.seed(0)
+        env = MockEnv()
+        dense = QLearningAgent(
+            env,
+            epsilon=0.5,
+            learning_rate=0.1,
+            q_table=QTable.from_space(env.observation_space, 2),
+        )
+        dense.learn(total_episodes=20)
+
+        for state in range(2):
+            assert np.array_equal(dense.q_table[(state,)], hashed.q_table[(state,)])
+
+    def test_checkpoint_resume(self, tmp_path):
+        """Test that resumed training matches uninterrupted training."""
+        np.random.seed(0)
+        agent = QLearningAgent(MockEnv(), epsilon=0.5, learning_rate=0.1)
+        expected = agent.learn(total_episodes=20)
+
+        np.random.seed(0)
+        interrupted = QLearningAgent(MockEnv(), epsilon=0.5, learning_rate=0.1)
+        interrupted.learn(total_episodes=10, checkpoint_path=tmp_path / "ckpt")
+        np.random.seed(1)
+
+        resumed = QLearningAgent(MockEnv(), epsilon=0.5, learning_rate=0.1)
+        returns = resumed.learn(
+            total_episodes=20, checkpoint_path=tmp_path / "ckpt", checkpoint_freq=3
+        )
+        assert np.array_equal(returns, expected)
+        n = len(agent.q_table)
+        assert np.array_equal(resumed.q_table.values[:n], agent.q_table.values[:n])
+
+        loaded = QLearningAgent(MockEnv())
+        assert np.array_equal(loaded.load_checkpoint(tmp_path / "ckpt"), expected)
+        assert isinstance(loaded.q_table.values, np.memmap)
+        for state in range(2):
+            assert np.array_equal(loaded.q_table[(state,)], agent.q_table[(state,)])
+
     def test_q_table_updates(self):
         """Test that Q-table is updated during learning."""
         env = MockEnv(n_states=2, n_actions=2)
@@ -123,6 +289,27 @@ class TestQLearningAgent:
 class TestCounterfactualQLearningAgent:
     """Test Counterfactual Q-Learning Agent."""
 
+    def test_update_batch(self):
+        """Test the batched update of counterfactual experiences."""
+        agent = CounterfactualQLearningAgent(
+            MockEnv(), learning_rate=0.5, discount_factor=0.9
+        )
+        agent.q_table[(1,)] = np.array([1.0, 2.0])
+
+        agent._update_batch(
+            np.array([[0], [0], [2]]),
+            np.array([1, 1, 0]),
+            np.array([[1], [1], [3]]),
+            np.array([1.0, 1.0, 5.0]),
+            np.array([False, False, True]),
+        )
+
+        # Both updates of the duplicate pair start from the same Q-value
+        assert np.allclose(agent.q_table[(0,)], [0.0, 2 * 0.5 * (1.0 + 0.9 * 2.0)])
+        # Terminal experiences do not bootstrap from their next observation
+        assert np.allclose(agent.q_table[(2,)], [2.5, 0.0])
+        assert (3,) not in agent.q_table
+
     def test_initialization(self):
         """Test agent initialization."""
         env = MockEnv()
@@ -127,3 +127,62 @@ class TestTransitionExpressionCompilation:
         assert transition_callable([EnvProps.EVENT_A], [0]) is True
         assert transition_callable([EnvProps.EVENT_B], [0]) is True
         assert transition_callable([EnvProps.EVENT_A, EnvProps.EVENT_B], [0]) is False
+
+    def test_bitmask_transition_expression(self) -> None:
+        """Test compilation of a transition expression over proposition bitmasks.
+
+        EVENT_A and EVENT_B are encoded by bits 1 and 2 respectively.
+        """
+        transition_expr = "EVENT_A and not EVENT_B / (Z, NZ)"
+        transition_callable = compile_transition_expression(
+            transition_expr, EnvProps, bitmask=True
+        )
+        assert transition_callable(0b11, [0, 1]) is False
+        assert transition_callable(0b01, [0, 0]) is False
+        assert transition_callable(0b01, [0, 1]) is True
+        assert transition_callable(0b10, [0, 1]) is False
+        assert transition_callable(0b00, [0, 1]) is False
+
+    def test_bitmask_tautology_expression(self) -> None:
+        """Test compilation of a tautological expression over bitmasks."""
+        transition_callable = compile_transition_expression(
+            "/ (Z)", EnvProps, bitmask=True
+        )
+        assert transition_callable(0b00, [0]) is True
+        assert transition_callable(0b11, [0]) is True
+        assert transition_callable(0b11, [1]) is False
+
+    def test_compiled_expressions_are_cached(self) -> None:
+        """Test identical expressions share a single compiled callable."""
+        first = compile_transition_expression("EVENT_A / (Z)", EnvProps)
+        second = compile_transition_expression("EVENT_A / (Z)", EnvProps)
+        bitmask = compile_transition_expression("EVENT_A / (Z)", EnvProps, bitmask=True)
+
+        assert first is second
+        assert first is not bitmask
+
+    def test_unknown_proposition(self) -> None:
+        """Test that expressions referencing unknown propositions are rejected."""
+        with pytest.raises(ValueError) as exc_info:
+            compile_transition_expression("EVENT_C / (Z)", EnvProps)
+        assert "Unknown environment proposition EVENT_C" in str(exc_info.value)
+
+    @pytest.mark.parametrize(
+        "transition_expr",
+        ["EVENT_A and / (Z)", "EVENT_A + EVENT_B / (Z)", "EVENT_A == EVENT_B / (Z)"],
+    )
+    def test_invalid_wff(self, transition_expr: str) -> None:
+        """Test that malformed or unsupported formulas are rejected."""
+        with pytest.raises(ValueError) as exc_info:
+            compile_transition_expression(transition_expr, EnvProps)
+        assert "Invalid well-formed formula" in str(exc_info.value)
+
+    def test_raw_counter_values(self) -> None:
+        """Test counter states are evaluated against raw counter values."""
+        transition_callable = compile_transition_expression(
+            "EVENT_A / (Z, NZ)", EnvProps
+        )
+        assert transition_callable([EnvProps.EVENT_A], (0, 10)) is True
+        assert transition_callable([EnvProps.EVENT_A], (0, -1)) is True
+        assert transition_callable([EnvProps.EVENT_A], (10, 10)) is False
+        assert transition_callable([EnvProps.EVENT_A], (0, 0)) is False
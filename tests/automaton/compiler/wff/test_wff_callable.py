@@ -1,88 +1,99 @@
+from collections.abc import Callable
+from typing import Any
+
 import pytest
 
-from pycrm.automaton.compiler import (
-    _construct_callable_wff_expression_str_repr,
-    _construct_wff_callable,
-)
+from pycrm.automaton.compiler import compile_transition_expression
 from tests.conftest import EnvProps
 
+# Propositions the WFF callables are evaluated on in the construction cases
+PROPS = [
+    [],
+    [EnvProps.EVENT_A],
+    [EnvProps.EVENT_B],
+    [EnvProps.EVENT_A, EnvProps.EVENT_B],
+]
+
 
-def wff_construction_cases() -> list[dict[str, str]]:
-    """Returns test cases for WFF string construction.
+def wff_construction_cases() -> list[dict[str, Any]]:
+    """Returns test cases for WFF callable construction.
 
     Returns:
         list[dict]: A list of test cases containing:
             - description (str): Description of the test case
             - wff (str): Input WFF expression
-            - expected (str): Expected string representation
+            - expected_outcomes (list[bool]): Expected outcomes on each of PROPS
     """
     return [
         {
             "description": "Simple event check",
             "wff": "EVENT_A",
-            "expected": "EnvProps.EVENT_A in props",
+            "expected_outcomes": [False, True, False, True],
         },
         {
             "description": "Compound expression with AND and NOT",
             "wff": "EVENT_A and not EVENT_B",
-            "expected": "EnvProps.EVENT_A in props and not EnvProps.EVENT_B in props",
+            "expected_outcomes": [False, True, False, False],
         },
         {
             "description": "Nested expression with NOT",
             "wff": "not (EVENT_A and EVENT_B)",
-            "expected": (
-                "not (EnvProps.EVENT_A in props and EnvProps.EVENT_B in props)"
-            ),
+            "expected_outcomes": [True, True, True, False],
         },
         {
             "description": "Empty expression (tautology)",
             "wff": "",
-            "expected": "True",
+            "expected_outcomes": [True, True, True, True],
         },
-        # Case insensitivity tests
         {
             "description": "Uppercase NOT operator",
             "wff": "EVENT_A NOT EVENT_B",
-            "expected": "EnvProps.EVENT_A in props and not EnvProps.EVENT_B in props",
+            "expected_outcomes": [False, True, False, False],
         },
         {
             "description": "Uppercase OR operator",
             "wff": "EVENT_A OR EVENT_B",
-            "expected": "EnvProps.EVENT_A in props or EnvProps.EVENT_B in props",
+            "expected_outcomes": [False, True, True, True],
         },
         {
             "description": "Uppercase AND operator",
             "wff": "EVENT_A AND EVENT_B",
-            "expected": "EnvProps.EVENT_A in props and EnvProps.EVENT_B in props",
+            "expected_outcomes": [False, False, False, True],
         },
         {
             "description": "Mixed case NOT operator",
             "wff": "EVENT_A Not EVENT_B",
-            "expected": "EnvProps.EVENT_A in props and not EnvProps.EVENT_B in props",
+            "expected_outcomes": [False, True, False, False],
         },
         {
             "description": "Mixed case OR operator",
             "wff": "EVENT_A Or EVENT_B",
-            "expected": "EnvProps.EVENT_A in props or EnvProps.EVENT_B in props",
+            "expected_outcomes": [False, True, True, True],
         },
         {
             "description": "Mixed case AND operator",
             "wff": "EVENT_A And EVENT_B",
-            "expected": "EnvProps.EVENT_A in props and EnvProps.EVENT_B in props",
+            "expected_outcomes": [False, False, False, True],
         },
         {
             "description": "Complex expression with uppercase operators",
             "wff": "NOT (EVENT_A OR EVENT_B)",
-            "expected": "not (EnvProps.EVENT_A in props or EnvProps.EVENT_B in props)",
+            "expected_outcomes": [True, False, False, False],
         },
         {
             "description": "Complex expression with mixed case operators",
             "wff": "Not (EVENT_A Or EVENT_B)",
-            "expected": "not (EnvProps.EVENT_A in props or EnvProps.EVENT_B in props)",
+            "expected_outcomes": [True, False, False, False],
         },
     ]
 
 
+def _construct_wff_callable(wff_expr: str) -> Callable:
+    """Return a callable evaluating a WFF on the propositions only."""
+    transition_formula = compile_transition_expression(f"{wff_expr} / (-)", EnvProps)
+    return lambda props: transition_formula(props, (0,))
+
+
 class TestWffCallableConstruction:
     """Tests for the WFF callable construction function."""
 
@@ -91,21 +102,22 @@ class TestWffCallableConstruction:
         wff_construction_cases(),
         ids=lambda test_case: test_case["description"],
     )
-    def test_wff_expression_construction(self, test_case: dict[str, str]) -> None:
-        """Tests construction of WFF expression string representations.
+    def test_wff_expression_construction(self, test_case: dict[str, Any]) -> None:
+        """Tests evaluation of WFF callables on every combination of events.
 
         Args:
-            test_case (dict[str, str]): Test case containing WFF and expected result
+            test_case (dict[str, Any]): Test case containing WFF and expected outcomes
         """
-        assert (
-            _construct_callable_wff_expression_str_repr(test_case["wff"], EnvProps)
-            == test_case["expected"]
-        )
+        wff_callable = _construct_wff_callable(test_case["wff"])
+        for props, expected_outcome in zip(
+            PROPS, test_case["expected_outcomes"], strict=True
+        ):
+            assert wff_callable(props) is expected_outcome
 
     def test_wff_callable_construction_simple(self) -> None:
         """Tests construction and evaluation of a simple WFF callable."""
         wff_expr = "EVENT_A and not EVENT_B"
-        wff_callable = _construct_wff_callable(wff_expr, EnvProps)
+        wff_callable = _construct_wff_callable(wff_expr)
         assert wff_callable([]) is False
         assert wff_callable([EnvProps.EVENT_A]) is True
         assert wff_callable([EnvProps.EVENT_B]) is False
@@ -114,7 +126,7 @@ class TestWffCallableConstruction:
     def test_wff_callable_construction_complex(self) -> None:
         """Tests construction and evaluation of a complex WFF callable."""
         wff_expr = "EVENT_A and not (EVENT_A and EVENT_B) or EVENT_B"
-        wff_callable = _construct_wff_callable(wff_expr, EnvProps)
+        wff_callable = _construct_wff_callable(wff_expr)
         assert wff_callable([]) is False
         assert wff_callable([EnvProps.EVENT_A]) is True
         assert wff_callable([EnvProps.EVENT_B]) is True
@@ -123,7 +135,7 @@ class TestWffCallableConstruction:
     def test_wff_callable_construction_tautology(self) -> None:
         """Tests construction and evaluation of a tautological WFF callable."""
         wff_expr = ""
-        wff_callable = _construct_wff_callable(wff_expr, EnvProps)
+        wff_callable = _construct_wff_callable(wff_expr)
         assert wff_callable([]) is True
         assert wff_callable([EnvProps.EVENT_A]) is True
         assert wff_callable([EnvProps.EVENT_B]) is True
@@ -132,7 +144,7 @@ class TestWffCallableConstruction:
     def test_wff_callable_construction_case_insensitive_not(self) -> None:
         """Test WFF callable construction with case-insensitive NOT."""
         wff_expr = "EVENT_A NOT EVENT_B"
-        wff_callable = _construct_wff_callable(wff_expr, EnvProps)
+        wff_callable = _construct_wff_callable(wff_expr)
         assert wff_callable([]) is False
         assert wff_callable([EnvProps.EVENT_A]) is True
         assert wff_callable([EnvProps.EVENT_B]) is False
@@ -141,7 +153,7 @@ class TestWffCallableConstruction:
     def test_wff_callable_construction_case_insensitive_or(self) -> None:
         """Test construction and evaluation of WFF callable with case-insensitive OR."""
         wff_expr = "EVENT_A OR EVENT_B"
-        wff_callable = _construct_wff_callable(wff_expr, EnvProps)
+        wff_callable = _construct_wff_callable(wff_expr)
         assert wff_callable([]) is False
         assert wff_callable([EnvProps.EVENT_A]) is True
         assert wff_callable([EnvProps.EVENT_B]) is True
@@ -150,7 +162,7 @@ class TestWffCallableConstruction:
     def test_wff_callable_construction_case_insensitive_and(self) -> None:
         """Test WFF callable construction with case-insensitive AND."""
         wff_expr = "EVENT_A AND EVENT_B"
-        wff_callable = _construct_wff_callable(wff_expr, EnvProps)
+        wff_callable = _construct_wff_callable(wff_expr)
         assert wff_callable([]) is False
         assert wff_callable([EnvProps.EVENT_A]) is False
         assert wff_callable([EnvProps.EVENT_B]) is False
@@ -159,7 +171,7 @@ class TestWffCallableConstruction:
     def test_wff_callable_construction_mixed_case_operators(self) -> None:
         """Test WFF callable construction with mixed case operators."""
         wff_expr = "NOT (EVENT_A Or EVENT_B)"
-        wff_callable = _construct_wff_callable(wff_expr, EnvProps)
+        wff_callable = _construct_wff_callable(wff_expr)
         # This should be equivalent to: not (EVENT_A or EVENT_B)
         assert wff_callable([]) is True
         assert wff_callable([EnvProps.EVENT_A]) is False
@@ -0,0 +1,217 @@
+import copy
+from itertools import chain, combinations, product
+
+import pytest
+
+from pycrm.automaton import CountingRewardMachine, RmToCrmAdapter
+from pycrm.label import props_to_bitmask
+from tests.conftest import EnvProps
+
+
+def prop_sets() -> list[set[EnvProps]]:
+    """Return every subset of the environment propositions."""
+    members = list(EnvProps)
+    return [
+        set(s)
+        for s in chain.from_iterable(
+            combinations(members, n) for n in range(len(members) + 1)
+        )
+    ]
+
+
+class TwoCounterCRM(CountingRewardMachine):
+    """Counting reward machine with two counters and mixed counter guards."""
+
+    def __init__(self) -> None:
+        """Initialise the counting reward machine."""
+        super().__init__(env_prop_enum=EnvProps)
+
+    @property
+    def u_0(self) -> int:
+        """Return the initial state of the machine."""
+        return 0
+
+    @property
+    def c_0(self) -> tuple[int, ...]:
+        """Return the initial counter configuration of the machine."""
+        return (0, 0)
+
+    def _get_state_transition_function(self) -> dict:
+        """Return the state transition function."""
+        return {
+            0: {
+                "EVENT_A and EVENT_B / (NZ,NZ)": -1,
+                "EVENT_A / (-,Z)": 0,
+                "EVENT_A / (Z,NZ)": 1,
+                "EVENT_B / (NZ,-)": 1,
+                "/ (-,-)": 0,
+            },
+            1: {
+                "EVENT_B / (-,NZ)": 0,
+                "not EVENT_A / (-,-)": 1,
+                "/ (-,-)": 1,
+            },
+        }
+
+    def _get_counter_transition_function(self) -> dict:
+        """Return the counter transition function."""
+        return {
+            0: {
+                "EVENT_A and EVENT_B / (NZ,NZ)": (0, 0),
+                "EVENT_A / (-,Z)": (1, 1),
+                "EVENT_A / (Z,NZ)": (0, -1),
+                "EVENT_B / (NZ,-)": (-1, 0),
+                "/ (-,-)": (0, 0),
+            },
+            1: {
+                "EVENT_B / (-,NZ)": (0, -1),
+                "not EVENT_A / (-,-)": (0, 0),
+                "/ (-,-)": (1, 0),
+            },
+        }
+
+    def _get_reward_transition_function(self) -> dict:
+        """Return the reward transition function."""
+        return {
+            0: {
+                "EVENT_A and EVENT_B / (NZ,NZ)": 1,
+                "EVENT_A / (-,Z)": 0,
+                "EVENT_A / (Z,NZ)": 0,
+                "EVENT_B / (NZ,-)": 0,
+                "/ (-,-)": 0,
+            },
+            1: {
+                "EVENT_B / (-,NZ)": 0,
+                "not EVENT_A / (-,-)": 0,
+                "/ (-,-)": 0,
+            },
+        }
+
+    def sample_counter_configurations(self) -> list[tuple[int, ...]]:
+        """Return sample counter configurations for counterfactual experience."""
+        return list(product(range(3), repeat=2))
+
+
+class TestCompiledTransition:
+    """Test the compiled transition table."""
+
+    def test_compile_returns_machine(self, crm: CountingRewardMachine) -> None:
+        """Test that compiling returns the machine and marks it compiled."""
+        assert not crm.is_compiled
+        assert crm.compile() is crm
+        assert crm.is_compiled
+
+    @pytest.mark.parametrize("c", [(0,), (1,), (2,), (5,)])
+    def test_compiled_matches_interpreted(
+        self, crm: CountingRewardMachine, c: tuple[int]
+    ) -> None:
+        """Test compiled transitions match the interpreted transitions."""
+        compiled = copy.deepcopy(crm).compile()
+
+        for u in crm.U:
+            for props in prop_sets():
+                try:
+                    expected = crm.transition(u, c, props)
+                except ValueError:
+                    with pytest.raises(ValueError):
+                        compiled.transition(u, c, props)
+                    continue
+
+                u_next, c_next, reward_fn = compiled.transition(u, c, props)
+                assert u_next == expected[0]
+                assert c_next == expected[1]
+                assert reward_fn(None, None, None) == expected[2](None, None, None)
+
+    def test_compiled_adapter_matches_interpreted(
+        self, rm_to_crm_adapter: RmToCrmAdapter
+    ) -> None:
+        """Test compiled transitions match for the reward machine adapter."""
+        compiled = copy.deepcopy(rm_to_crm_adapter).compile()
+
+        for u in rm_to_crm_adapter.U:
+            for props in prop_sets():
+                expected = rm_to_crm_adapter.transition(u, (0,), props)
+                u_next, c_next, _ = compiled.transition(u, (0,), props)
+                assert u_next == expected[0]
+                assert c_next == expected[1]
+
+    def test_compiled_terminal_state_error(self, crm: CountingRewardMachine) -> None:
+        """Test that transitioning from a terminal state raises an error."""
+        crm.compile()
+
+        with pytest.raises(ValueError) as exc_info:
+            crm.transition(crm.F[0], (0,), set())
+        assert "is terminal or not defined" in str(exc_info.value)
+
+    def test_compiled_undefined_transition_error(
+        self, crm: CountingRewardMachine
+    ) -> None:
+        """Test that undefined transitions raise an error when compiled."""
+        crm.compile()
+
+        # State 0 has no transition for EVENT_B with a zero counter
+        with pytest.raises(ValueError) as exc_info:
+            crm.transition(0, (0,), {EnvProps.EVENT_B})
+        assert "Transition not defined" in str(exc_info.value)
+
+    def test_compile_table_size_limit(self, crm: CountingRewardMachine) -> None:
+        """Test that oversized lookup tables are rejected."""
+        with pytest.raises(ValueError) as exc_info:
+            crm.compile(max_table_size=1)
+        assert "exceeds the maximum size" in str(exc_info.value)
+        assert not crm.is_compiled
+
+    def test_build_transition_table(self, crm: CountingRewardMachine) -> None:
+        """Test building a lookup table leaves the machine uncompiled."""
+        table = crm.build_transition_table()
+
+        assert not crm.is_compiled
+        assert table.lookup(0, (1,), {EnvProps.EVENT_B}) == 2
+
+    @pytest.mark.parametrize("compiled", [False, True])
+    def test_bitmask_props(self, crm: CountingRewardMachine, compiled: bool) -> None:
+        """Test bitmask propositions give the same transitions as sets."""
+        if compiled:
+            crm.compile()
+
+        for u in crm.U:
+            for props in prop_sets():
+                mask = props_to_bitmask(props, EnvProps)
+                try:
+                    expected = crm.transition(u, (1,), props)
+                except ValueError:
+                    with pytest.raises(ValueError):
+                        crm.transition(u, (1,), mask)
+                    continue
+
+                u_next, c_next, _ = crm.transition(u, (1,), mask)
+                assert u_next == expected[0]
+                assert c_next == expected[1]
+
+    def test_multiple_counters(self) -> None:
+        """Test compiled and interpreted transitions agree with two counters.
+
+        Next counter configurations are tuples of plain ints on both paths.
+        """
+        crm = TwoCounterCRM()
+        compiled = TwoCounterCRM().compile()
+        table = compiled.transition_table
+
+        for u in crm.U:
+            for c in crm.sample_counter_configurations():
+                for props in prop_sets():
+                    mask = props_to_bitmask(props, EnvProps)
+                    u_next, c_next, reward_fn = crm.transition(u, c, props)
+
+                    for machine, p in product((crm, compiled), (props, mask)):
+                        result = machine.transition(u, c, p)
+                        assert result[0] == u_next
+                        assert result[1] == c_next
+                        assert all(type(c_i) is int for c_i in result[1])
+                        assert result[2](None, None, None) == reward_fn(
+                            None, None, None
+                        )
+                    c_mask = sum(1 << i for i, c_i in enumerate(c) if c_i)
+                    edge = table.next_edge[u, mask, c_mask]
+                    assert table.lookup(u, c, props) == edge
+                    assert table.lookup(u, c, mask) == edge
@@ -0,0 +1,63 @@
+from itertools import product
+
+import numpy as np
+
+from pycrm.automaton import CountingRewardMachine
+from tests.conftest import EnvProps
+
+
+def bitmask_to_props(mask: int) -> set[EnvProps]:
+    """Return the propositions encoded by a bitmask."""
+    return {p for i, p in enumerate(EnvProps) if mask & (1 << i)}
+
+
+class TestTransitionBatch:
+    """Test the vectorised transition function."""
+
+    def test_batch_matches_scalar(self, crm: CountingRewardMachine) -> None:
+        """Test batched transitions match scalar transitions row by row."""
+        configurations = list(
+            product(crm.U, [(0,), (1,), (3,)], range(1 << len(EnvProps)))
+        )
+        u = np.array([u for u, _, _ in configurations])
+        c = np.array([c for _, c, _ in configurations])
+        props = np.array([p for _, _, p in configurations])
+
+        u_next, c_next, reward_idx = crm.transition_batch(u, c, props)
+
+        assert u_next.shape == (len(configurations),)
+        assert c_next.shape == (len(configurations), 1)
+        assert reward_idx.shape == (len(configurations),)
+
+        reward_fns = crm.transition_table.reward_fns
+        for i, (u_i, c_i, p_i) in enumerate(configurations):
+            try:
+                expected = crm.transition(u_i, c_i, bitmask_to_props(p_i))
+            except ValueError:
+                assert reward_idx[i] == -1
+                assert u_next[i] == -1
+                assert tuple(c_next[i]) == c_i
+                continue
+
+            assert u_next[i] == expected[0]
+            assert tuple(c_next[i]) == expected[1]
+            assert reward_fns[reward_idx[i]](None, None, None) == expected[2](
+                None, None, None
+            )
+
+    def test_batch_terminal_state(self, crm: CountingRewardMachine) -> None:
+        """Test terminal states are reported as undefined transitions."""
+        u_next, c_next, reward_idx = crm.transition_batch(
+            np.array([crm.F[0], 0]), np.array([[2], [0]]), np.array([0, 0])
+        )
+
+        assert u_next.tolist() == [-1, 0]
+        assert c_next.tolist() == [[2], [0]]
+        assert reward_idx[0] == -1
+        assert reward_idx[1] >= 0
+
+    def test_batch_compiles_machine(self, crm: CountingRewardMachine) -> None:
+        """Test the machine is compiled on first batched transition."""
+        assert not crm.is_compiled
+        crm.transition_batch(np.array([0]), np.array([[0]]), np.array([0]))
+        assert crm.is_compiled
@@ -0,0 +1,133 @@
+import gc
+import weakref
+
+import numpy as np
+import pytest
+
+from pycrm.automaton import CountingRewardMachine, generate_machine
+from pycrm.automaton.compiler import _compile_transition_expression
+from pycrm.label import LabellingFunction
+from pycrm.label.bitmask import prop_bits
+
+
+class TestGenerateMachine:
+    """Test the synthetic machine generator."""
+
+    def test_machine(self):
+        """Test the generated machine has the requested size."""
+        synthetic = generate_machine(
+            n_states=100, n_props=5, n_counters=3, edges_per_state=4, seed=0
+        )
+        crm = synthetic.machine()
+
+        assert isinstance(crm, CountingRewardMachine)
+        assert crm.U == list(range(100))
+        assert crm.F == [100]
+        assert crm.c_0 == (0, 0, 0)
+        assert len(synthetic.props) == 5
+        assert all(len(edges) == 4 for edges in crm.delta_u.values())
+        assert len(crm.sample_counter_configurations()) == 27
+
+    def test_complete(self):
+        """Test every configuration has a transition and counters stay valid."""
+        synthetic = generate_machine(
+            n_states=20, n_props=3, n_counters=2, edges_per_state=5, seed=1
+        )
+        crm = synthetic.machine()
+
+        configurations = [
+            (u, c, props)
+            for u in crm.U
+            for c in crm.sample_counter_configurations()
+            for props in range(1 << 3)
+        ]
+        u, c, props = map(np.array, zip(*configurations, strict=True))
+        u_next, c_next, edges = crm.transition_batch(u, c, props)
+
+        assert np.all(edges >= 0)
+        assert np.all(c_next >= 0)
+        assert set(u_next.tolist()) <= set(crm.U + crm.F)
+
+    def test_reachable(self):
+        """Test every state leads to the next on some propositions."""
+        synthetic = generate_machine(n_states=30, n_props=4, seed=2)
+        crm = synthetic.machine()
+
+        for u in crm.U:
+            successors = {crm.transition(u, crm.c_0, p)[0] for p in range(1 << 4)}
+            assert u + 1 in successors
+
+    def test_guard_weights(self):
+        """Test random edges only use guards with a non-zero weight."""
+        synthetic = generate_machine(
+            n_states=10,
+            n_props=4,
+            n_counters=2,
+            edges_per_state=6,
+            guard_weights=(1.0, 0.0, 0.0),
+            seed=3,
+        )
+
+        for edges in synthetic.machine.edges.values():
+            _, *random_edges, _ = edges
+            for expr in random_edges:
+                assert expr.endswith("/ (Z,Z)")
+
+    def test_seed(self):
+        """Test machines generated with the same seed are equal."""
+        first = generate_machine(n_states=50, n_props=4, seed=4)
+        second = generate_machine(n_states=50, n_props=4, seed=4)
+        third = generate_machine(n_states=50, n_props=4, seed=5)
+
+        assert first.machine.edges == second.machine.edges
+        assert first.machine.edges != third.machine.edges
+
+    def test_labelling_functions(self):
+        """Test the labelling functions label proposition indicators."""
+        synthetic = generate_machine(n_states=5, n_props=3, seed=0)
+        lf = synthetic.labelling_function()
+        batch_lf = synthetic.batch_labelling_function()
+        next_obs = np.array([[1, 0, 1], [0, 0, 0], [0, 1, 0]])
+        props = synthetic.props
+        obs = np.zeros(3)
+
+        assert isinstance(lf, LabellingFunction)
+        assert lf(obs, 0, next_obs[0]) == {props.P0, props.P2}  # type: ignore
+        assert lf(obs, 0, next_obs[1]) == set()
+        assert np.array_equal(
+            batch_lf.batch(np.zeros((3, 3)), np.zeros(3), next_obs), [5, 0, 2]
+        )
+        assert [lf.bitmask(obs, 0, o) for o in next_obs] == [5, 0, 2]
+
+    def test_released(self):
+        """Test propositions are only kept alive by the bounded compiler caches."""
+        synthetic = generate_machine(n_states=10, n_props=3, seed=0)
+        crm = synthetic.machine()
+        crm.compile()
+        synthetic.batch_labelling_function().batch(
+            np.zeros((1, 3)), np.zeros(1), np.ones((1, 3))
+        )
+        props = weakref.ref(synthetic.props)
+        del synthetic, crm
+
+        assert _compile_transition_expression.cache_info().maxsize is not None
+        assert prop_bits.cache_info().maxsize is not None
+        _compile_transition_expression.cache_clear()
+        prop_bits.cache_clear()
+        gc.collect()
+        assert props() is None
+
+    @pytest.mark.parametrize(
+        "kwargs",
+        [
+            {"n_states": 0},
+            {"edges_per_state": 1},
+            {"guard_weights": (0.0, 0.0, 0.0)},
+            {"guard_weights": (1.0, -1.0, 1.0)},
+            {"n_props": 1, "edges_per_state": 20},
+        ],
+    )
+    def test_invalid(self, kwargs):
+        """Test invalid arguments are rejected."""
+        with pytest.raises(ValueError):
+            generate_machine(**{"n_states": 5, "n_props": 3, **kwargs})
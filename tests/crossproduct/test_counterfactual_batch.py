@@ -0,0 +1,185 @@
+import numpy as np
+import pytest
+
+from pycrm.automaton import TransitionTable
+from pycrm.crossproduct import CounterfactualBuffer, CrossProduct
+from pycrm.crossproduct.crossproduct import edge_rewards
+from tests.crossproduct.conftest import CrossProductMDP, DefaultCrossProduct
+
+
+def generate_batch(
+    cross_product: CrossProduct, out: CounterfactualBuffer | None = None
+) -> tuple:
+    """Generate a counterfactual batch for a fixed ground transition."""
+    return cross_product.generate_counterfactual_batch(
+        ground_obs=np.array([0]),
+        action=0,
+        next_ground_obs=np.array([1]),
+        out=out,
+    )
+
+
+class TestCounterfactualBatch:
+    """Test counterfactual experience generation into preallocated buffers."""
+
+    def test_batch_matches_experience(self, cross_product_mdp: CrossProductMDP) -> None:
+        """Test the batch matches the copied counterfactual experience."""
+        obs, actions, next_obs, rewards, dones, n = generate_batch(cross_product_mdp)
+        expected = cross_product_mdp.generate_counterfactual_experience(
+            ground_obs=np.array([0]),
+            action=0,
+            next_ground_obs=np.array([1]),
+        )
+
+        assert n == 6
+        np.testing.assert_array_equal(obs, expected[0])
+        np.testing.assert_array_equal(actions, expected[1])
+        np.testing.assert_array_equal(next_obs, expected[2])
+        np.testing.assert_array_equal(rewards, expected[3])
+        np.testing.assert_array_equal(dones, expected[4])
+
+    def test_internal_buffer_reused(self, cross_product_mdp: CrossProductMDP) -> None:
+        """Test the internal buffer is reused across calls."""
+        first = generate_batch(cross_product_mdp)
+        second = generate_batch(cross_product_mdp)
+
+        assert np.shares_memory(first[0], second[0])
+        assert np.shares_memory(first[2], second[2])
+
+    def test_experience_copies_are_independent(
+        self, cross_product_mdp: CrossProductMDP
+    ) -> None:
+        """Test copied experience is not overwritten by later calls."""
+        obs = cross_product_mdp.generate_counterfactual_experience(
+            ground_obs=np.array([0]), action=0, next_ground_obs=np.array([1])
+        )[0]
+        batch_obs = generate_batch(cross_product_mdp)[0]
+
+        assert not np.shares_memory(obs, batch_obs)
+
+    def test_caller_buffer(self, cross_product_mdp: CrossProductMDP) -> None:
+        """Test experiences are written to a caller-provided buffer."""
+        out = CounterfactualBuffer(capacity=8, obs_shape=(3,), obs_dtype=np.int64)
+
+        obs, _, next_obs, _, _, n = generate_batch(cross_product_mdp, out=out)
+
+        assert n == 6
+        assert np.shares_memory(obs, out.obs)
+        assert np.shares_memory(next_obs, out.next_obs)
+        assert out.obs[:n, 1].tolist() == [0, 0, 0, 1, 1, 1]
+
+    def test_caller_buffer_too_small(self, cross_product_mdp: CrossProductMDP) -> None:
+        """Test a buffer without capacity for every experience is rejected."""
+        out = CounterfactualBuffer(capacity=2, obs_shape=(3,))
+
+        with pytest.raises(ValueError) as exc_info:
+            generate_batch(cross_product_mdp, out=out)
+        assert "cannot hold 6 experiences" in str(exc_info.value)
+
+    def test_default_layout_matches_get_obs(
+        self, default_cross_product: DefaultCrossProduct
+    ) -> None:
+        """Test column-wise filling matches the default observation per row."""
+        obs, _, next_obs, _, _, n = generate_batch(default_cross_product)
+        u, c = default_cross_product.counterfactual_sources()
+
+        for i in range(n):
+            expected = default_cross_product._get_obs(
+                np.array([0]), int(u[i]), tuple(c[i].tolist())
+            )
+            np.testing.assert_array_equal(obs[i], expected)
+        assert next_obs[:, 0].tolist() == [1] * n
+
+    def test_scalar_fallback_matches_table(
+        self, cross_product_mdp: CrossProductMDP
+    ) -> None:
+        """Test scalar transitions give the same experiences as the table."""
+        expected = [a.copy() for a in generate_batch(cross_product_mdp)[:5]]
+
+        cross_product_mdp._transition_table_available = False
+        actual = generate_batch(cross_product_mdp)
+
+        assert actual[5] == 6
+        for a, e in zip(actual[:5], expected, strict=True):
+            np.testing.assert_array_equal(a, e)
+
+    def test_machine_not_compiled(self, cross_product_mdp: CrossProductMDP) -> None:
+        """Test counterfactual experience does not compile the machine."""
+        generate_batch(cross_product_mdp)
+
+        assert not cross_product_mdp.crm.is_compiled
+        assert cross_product_mdp._counterfactual_table() is not None
+
+    def test_compiled_table_shared(self, cross_product_mdp: CrossProductMDP) -> None:
+        """Test the table of a compiled machine is used for counterfactuals."""
+        expected = [a.copy() for a in generate_batch(cross_product_mdp)[:5]]
+
+        cross_product_mdp.crm.compile()
+        actual = generate_batch(cross_product_mdp)
+
+        table = cross_product_mdp._counterfactual_table()
+        assert table is cross_product_mdp.crm.transition_table
+        for a, e in zip(actual[:5], expected, strict=True):
+            np.testing.assert_array_equal(a, e)
+
+    def test_table_size_limit(self, cross_product_mdp: CrossProductMDP) -> None:
+        """Test machines with oversized tables fall back to scalar transitions."""
+        expected = [a.copy() for a in generate_batch(cross_product_mdp)[:5]]
+
+        cross_product_mdp._transition_table = None
+        cross_product_mdp.counterfactual_table_size = 1
+        actual = generate_batch(cross_product_mdp)
+
+        assert cross_product_mdp._counterfactual_table() is None
+        for a, e in zip(actual[:5], expected, strict=True):
+            np.testing.assert_array_equal(a, e)
+
+
+class TestEdgeRewards:
+    """Test rewards of taken transition table edges."""
+
+    @pytest.fixture
+    def calls(self) -> list[tuple[int, int]]:
+        """Return the record of reward function calls."""
+        return []
+
+    @pytest.fixture
+    def table(
+        self, cross_product_mdp: CrossProductMDP, calls: list[tuple[int, int]]
+    ) -> TransitionTable:
+        """Return a transition table whose reward functions record their calls."""
+        table = cross_product_mdp.crm.build_transition_table()
+
+        def reward_fn(e: int):
+            def fn(obs, action, next_obs):
+                calls.append((e, int(obs[0])))
+                return 10 * e + float(obs[0])
+
+            return fn
+
+        table.reward_fns = [reward_fn(e) for e in range(len(table.reward_fns))]
+        return table
+
+    def test_single_transition(
+        self, table: TransitionTable, calls: list[tuple[int, int]]
+    ) -> None:
+        """Test each distinct edge is evaluated once on a single transition."""
+        edges = np.array([2, 0, 2, 2, 0])
+
+        rewards = edge_rewards(table, edges, np.array([1]), 0, np.array([2]))
+
+        assert rewards.tolist() == [21, 1, 21, 21, 1]
+        assert sorted(calls) == [(0, 1), (2, 1)]
+
+    def test_copies(self, table: TransitionTable, calls: list[tuple[int, int]]) -> None:
+        """Test each distinct edge is evaluated once per copy."""
+        edges = np.array([1, 1, 0, 1, 0])
+        copy = np.array([0, 0, 1, 1, 1])
+        ground_obs = np.array([[3], [4]])
+
+        rewards = edge_rewards(
+            table, edges, ground_obs, np.zeros(2), ground_obs, copy=copy
+        )
+
+        assert rewards.tolist() == [13, 13, 4, 14, 4]
+        assert sorted(calls) == [(0, 4), (1, 3), (1, 4)]
@@ -0,0 +1,95 @@
+from unittest.mock import patch
+
+import numpy as np
+
+from tests.crossproduct.conftest import CrossProductMDP
+
+
+def generate(cross_product: CrossProductMDP) -> tuple[np.ndarray, ...]:
+    """Generate counterfactual experience for a fixed ground transition."""
+    return cross_product.generate_counterfactual_experience(
+        ground_obs=np.array([0]),
+        action=0,
+        next_ground_obs=np.array([1]),
+    )
+
+
+class TestCounterfactualSources:
+    """Test the cached counterfactual source configurations."""
+
+    def test_sources_enumerate_states_and_counters(
+        self, cross_product_mdp: CrossProductMDP
+    ) -> None:
+        """Test sources are ordered by machine state, then counter configuration."""
+        u, c = cross_product_mdp.counterfactual_sources()
+
+        assert u.tolist() == [0, 0, 0, 1, 1, 1]
+        assert c.tolist() == [[0], [1], [2], [0], [1], [2]]
+
+    def test_sources_are_cached(self, cross_product_mdp: CrossProductMDP) -> None:
+        """Test counter configurations are sampled once across steps."""
+        crm = cross_product_mdp.crm
+        with patch.object(
+            crm,
+            "sample_counter_configurations",
+            wraps=crm.sample_counter_configurations,
+        ) as sample:
+            generate(cross_product_mdp)
+            generate(cross_product_mdp)
+
+        assert sample.call_count == 1
+
+    def test_sources_rebuilt_after_invalidation(
+        self, cross_product_mdp: CrossProductMDP
+    ) -> None:
+        """Test the table is rebuilt once the machine invalidates its samples."""
+        crm = cross_product_mdp.crm
+        cross_product_mdp.counterfactual_sources()
+
+        with patch.object(crm, "sample_counter_configurations", return_value=[(4,)]):
+            _, c = cross_product_mdp.counterfactual_sources()
+            assert c.tolist() == [[0], [1], [2], [0], [1], [2]]
+
+            crm.invalidate_counter_samples()
+            u, c = cross_product_mdp.counterfactual_sources()
+
+        assert u.tolist() == [0, 1]
+        assert c.tolist() == [[4], [4]]
+
+    def test_counter_values_are_python_ints(
+        self, cross_product_mdp: CrossProductMDP
+    ) -> None:
+        """Test scalar transitions receive counter configurations of plain integers."""
+        cross_product_mdp._transition_table_available = False
+        crm = cross_product_mdp.crm
+        with patch.object(crm, "transition", wraps=crm.transition) as transition:
+            generate(cross_product_mdp)
+
+        assert transition.call_count == 6
+        for call in transition.call_args_list:
+            u, c, _ = call.args
+            assert type(u) is int
+            assert all(type(c_i) is int for c_i in c)
+
+    def test_random_subsample(self, cross_product_mdp: CrossProductMDP) -> None:
+        """Test counterfactual experience is generated from a random subsample."""
+        cross_product_mdp.counterfactual_sample_size = 4
+        cross_product_mdp.reset(seed=0)
+
+        obs, _, obs_next, _, _, _ = generate(cross_product_mdp)
+        sources = {(0, 0), (0, 1), (0, 2), (1, 0), (1, 1), (1, 2)}
+
+        assert len(obs) == 4
+        assert len(obs_next) == 4
+        assert {(int(o[1]), int(o[2])) for o in obs} <= sources
+
+    def test_subsample_larger_than_sources(
+        self, cross_product_mdp: CrossProductMDP
+    ) -> None:
+        """Test a subsample size above the number of sources uses every source."""
+        cross_product_mdp.counterfactual_sample_size = 100
+
+        obs, *_ = generate(cross_product_mdp)
+
+        assert obs[:, 1].tolist() == [0, 0, 0, 1, 1, 1]
+        assert obs[:, 2].tolist() == [0, 1, 2, 0, 1, 2]
@@ -1,7 +1,12 @@
+from enum import Enum
+from typing import cast
 from unittest.mock import MagicMock
 
 import numpy as np
+import pytest
 
+from pycrm.crossproduct import crossproduct
+from pycrm.label import LabellingFunction
 from tests.crossproduct.conftest import CrossProductMDP, DefaultCrossProduct
 
 
@@ -45,6 +50,68 @@ class TestCrossProductEnvironment:
         cross_product_mdp.ground_env.render.assert_called_once()
 
 
+class TestPropositionLabels:
+    """Test the propositions passed from the labelling function to the machine."""
+
+    @pytest.mark.parametrize("compiled", [False, True])
+    def test_no_proposition_set_per_step(
+        self,
+        cross_product_mdp: CrossProductMDP,
+        monkeypatch: pytest.MonkeyPatch,
+        compiled: bool,
+    ) -> None:
+        """Test steps and counterfactual batches label with bitmasks only."""
+        if compiled:
+            cross_product_mdp.crm.compile()
+
+        def fail(*args, **kwargs) -> None:
+            raise AssertionError("Proposition set built")
+
+        monkeypatch.setattr(LabellingFunction, "__call__", fail)
+        monkeypatch.setattr(crossproduct, "bitmask_to_props", fail)
+
+        cross_product_mdp.reset()
+        _, reward, _, _, _ = cross_product_mdp.step(0)
+        *_, n = cross_product_mdp.generate_counterfactual_batch(
+            np.array([0]), 0, np.array([1])
+        )
+
+        assert reward == 1
+        assert cross_product_mdp.u == 1
+        assert n == 6
+
+    def test_props(self, cross_product_mdp: CrossProductMDP) -> None:
+        """Test the propositions of the last step are exposed as a set."""
+        cross_product_mdp.reset()
+        cross_product_mdp.step(0)
+
+        events = cross_product_mdp.crm.env_prop_enum
+        assert cross_product_mdp.props == {events["EVENT_A"]}
+
+    def test_set_labelling_function(self, cross_product_mdp: CrossProductMDP) -> None:
+        """Test labelling functions overriding the set interface are respected."""
+        event_b = cast(Enum, cross_product_mdp.crm.env_prop_enum["EVENT_B"])
+
+        class SetLabelFunction(type(cross_product_mdp.lf)):
+            def __call__(
+                self, obs: np.ndarray, action: np.ndarray, next_obs: np.ndarray
+            ) -> set[Enum]:
+                return {event_b}
+
+        env = CrossProductMDP(
+            ground_env=cross_product_mdp.ground_env,
+            machine=cross_product_mdp.crm,
+            lf=SetLabelFunction(),
+            max_steps=10,
+        )
+        env.reset()
+        _, reward, _, _, _ = env.step(0)
+
+        assert env.props == {event_b}
+        assert env.u == 0
+        assert reward == 0
+
+
 class TestDefaultObservation:
     """Test the default _get_obs and to_ground_obs implementations."""
 
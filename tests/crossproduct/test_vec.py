@@ -0,0 +1,139 @@
+import numpy as np
+import pytest
+
+from pycrm.crossproduct import CrossProductVecEnv
+from tests.crossproduct.conftest import (
+    CRM,
+    RM,
+    DefaultCrossProduct,
+    Events,
+    GroundEnv,
+    LabelFunction,
+)
+
+
+class TerminatingGroundEnv(GroundEnv):
+    """Ground environment labelled with EVENT_A on every step."""
+
+    def step(self, action: np.ndarray) -> tuple[np.ndarray, float, bool, bool, dict]:
+        """Step the ground environment."""
+        return np.array([0]), 0.0, False, False, {}
+
+
+GROUND_ENVS = [GroundEnv, TerminatingGroundEnv, GroundEnv, TerminatingGroundEnv]
+
+
+def make_vec_env(machine: CRM | RM | None = None) -> CrossProductVecEnv:
+    """Return a vectorised cross product of the test ground environments."""
+    return CrossProductVecEnv(
+        ground_envs=[env_cls() for env_cls in GROUND_ENVS],
+        machine=CRM(env_prop_enum=Events) if machine is None else machine,
+        lf=LabelFunction(),
+        max_steps=10,
+    )
+
+
+def make_cross_products() -> list[DefaultCrossProduct]:
+    """Return a cross product for each of the test ground environments."""
+    return [
+        DefaultCrossProduct(
+            ground_env=env_cls(),
+            machine=CRM(env_prop_enum=Events),
+            lf=LabelFunction(),
+            max_steps=10,
+        )
+        for env_cls in GROUND_ENVS
+    ]
+
+
+class TestCrossProductVecEnv:
+    """Test the vectorised cross product environment."""
+
+    def test_step_matches_cross_product(self) -> None:
+        """Test every copy follows the corresponding cross product."""
+        vec_env = make_vec_env()
+        cross_products = make_cross_products()
+
+        obs, _ = vec_env.reset()
+        expected_obs = np.stack([env.reset()[0] for env in cross_products])
+        np.testing.assert_array_equal(obs, expected_obs)
+        assert vec_env.observation_space.shape == obs.shape
+
+        actions = np.zeros((len(cross_products), 1))
+        for _ in range(25):
+            obs, rewards, terminated, truncated, infos = vec_env.step(actions)
+
+            for i, env in enumerate(cross_products):
+                env_obs, reward, env_terminated, env_truncated, _ = env.step(actions[i])
+                assert rewards[i] == reward
+                assert terminated[i] == env_terminated
+                assert truncated[i] == env_truncated
+                if env_terminated or env_truncated:
+                    key = vec_env.final_obs_key
+                    assert infos["_" + key][i]
+                    np.testing.assert_array_equal(infos[key][i], env_obs)
+                    env_obs, _ = env.reset()
+                np.testing.assert_array_equal(obs[i], env_obs)
+                assert vec_env.u[i] == env.u
+                assert tuple(vec_env.c[i].tolist()) == env.c
+
+    def test_counterfactual_batch_matches_cross_product(self) -> None:
+        """Test counterfactual experience of all copies matches each cross product."""
+        vec_env = make_vec_env()
+        cross_products = make_cross_products()
+
+        ground_obs = np.array([[0], [1], [1], [0]])
+        actions = np.zeros((4, 1))
+        next_ground_obs = np.array([[1], [1], [0], [0]])
+        batch = vec_env.generate_counterfactual_batch(
+            ground_obs, actions, next_ground_obs
+        )
+
+        expected = [
+            env.generate_counterfactual_batch(
+                ground_obs[i], actions[i], next_ground_obs[i]
+            )[:5]
+            for i, env in enumerate(cross_products)
+        ]
+        for actual, *fields in zip(batch[:5], *expected, strict=True):
+            np.testing.assert_array_equal(actual, np.concatenate(fields))
+        np.testing.assert_array_equal(
+            batch[5], np.repeat(np.arange(4), [len(fields[0]) for fields in expected])
+        )
+
+    def test_reward_machine(self) -> None:
+        """Test reward machines are adapted to counting reward machines."""
+        vec_env = make_vec_env(RM(env_prop_enum=Events))
+        vec_env.reset()
+        _, rewards, terminated, _, _ = vec_env.step(np.zeros((4, 1)))
+
+        np.testing.assert_array_equal(rewards, [1, 1, 1, 1])
+        assert not terminated.any()
+
+    def test_machine_not_compiled(self) -> None:
+        """Test the machine is left uncompiled, with its table shared once compiled."""
+        vec_env = make_vec_env()
+        assert not vec_env.crm.is_compiled
+
+        crm = CRM(env_prop_enum=Events)
+        crm.compile()
+        vec_env = make_vec_env(crm)
+        assert vec_env._table is crm.transition_table
+
+    def test_reset_seeds(self) -> None:
+        """Test a seed must be given for every copy."""
+        vec_env = make_vec_env()
+        vec_env.reset(seed=[0, 1, 2, 3])
+
+        with pytest.raises(ValueError, match="Expected 4 seeds"):
+            vec_env.reset(seed=[0, 1])
+
+    def test_no_ground_envs(self) -> None:
+        """Test at least one ground environment is required."""
+        with pytest.raises(ValueError, match="at least one ground env"):
+            CrossProductVecEnv(
+                ground_envs=[],
+                machine=CRM(env_prop_enum=Events),
+                lf=LabelFunction(),
+                max_steps=10,
+            )
@@ -0,0 +1,132 @@
+"""Tests for the parallel experiment runner."""
+
+import gymnasium as gym
+import numpy as np
+import pytest
+
+from pycrm.agents.sb3.dqn import CounterfactualDQN
+from pycrm.agents.tabular import CounterfactualQLearningAgent, QLearningAgent
+from pycrm.experiment import load_results, make_grid, run_experiments, run_job
+from pycrm.experiment.cli import load_grid
+from tests.crossproduct.conftest import (
+    CRM,
+    DefaultCrossProduct,
+    Events,
+    GroundEnv,
+    LabelFunction,
+)
+
+
+def make_env() -> DefaultCrossProduct:
+    """Return a cross product with a discrete action space."""
+    cross_product = DefaultCrossProduct(
+        ground_env=GroundEnv(),
+        machine=CRM(env_prop_enum=Events),
+        lf=LabelFunction(),
+        max_steps=10,
+    )
+    cross_product.observation_space = gym.spaces.Box(
+        low=-np.inf, high=np.inf, shape=(5,), dtype=np.float64
+    )
+    cross_product.action_space = gym.spaces.Discrete(2)
+    return cross_product
+
+
+def grid():
+    """Return a small grid of tabular and deep agents."""
+    return [
+        *make_grid(
+            "ql",
+            make_env,
+            QLearningAgent,
+            seeds=[0, 1],
+            learn_kwargs={"total_episodes": 5},
+            learning_rate=[0.1, 0.5],
+            epsilon=[0.1],
+        ),
+        *make_grid(
+            "cdqn",
+            make_env,
+            CounterfactualDQN,
+            seeds=[0],
+            learn_kwargs={"total_timesteps": 30},
+            policy=["MlpPolicy"],
+            learning_starts=[10],
+            batch_size=[4],
+            device=["cpu"],
+        ),
+    ]
+
+
+class TestExperimentRunner:
+    """Test the parallel experiment runner."""
+
+    def test_make_grid(self):
+        """Test a job is created for every configuration and seed."""
+        jobs = make_grid(
+            "ql",
+            make_env,
+            QLearningAgent,
+            seeds=range(3),
+            learning_rate=[0.1, 0.5],
+            epsilon=[0.1],
+        )
+
+        assert len(jobs) == 6
+        assert [job.seed for job in jobs] == [0, 1, 2, 0, 1, 2]
+        assert jobs[0].name == "ql[learning_rate=0.1]"
+        assert jobs[-1].hyperparameters == {"epsilon": 0.1, "learning_rate": 0.5}
+
+    @pytest.mark.parametrize(
+        "agent_cls", [QLearningAgent, CounterfactualQLearningAgent]
+    )
+    def test_run_job(self, agent_cls):
+        """Test a job returns the return of every episode reproducibly."""
+        (job,) = make_grid(
+            "ql",
+            make_env,
+            agent_cls,
+            seeds=[3],
+            learn_kwargs={"total_episodes": 7},
+            epsilon=[0.5],
+        )
+
+        returns = run_job(job)
+        assert returns.shape == (7,)
+        assert np.array_equal(returns, run_job(job))
+
+    def test_run_experiments(self, tmp_path):
+        """Test the returns of every job are written to the results file."""
+        jobs = grid()
+        run_experiments(jobs, tmp_path / "results.csv", max_workers=2)
+
+        results = load_results(tmp_path / "results.csv")
+        assert set(results) == {
+            "job",
+            "agent",
+            "seed",
+            "batch_size",
+            "device",
+            "epsilon",
+            "learning_rate",
+            "learning_starts",
+            "policy",
+            "episode",
+            "return",
+        }
+        for job in jobs:
+            mask = (results["job"] == job.name) & (results["seed"] == job.seed)
+            assert np.array_equal(results["return"][mask], run_job(job))
+            assert np.array_equal(results["episode"][mask], np.arange(mask.sum()))
+        assert np.all(results["agent"][results["job"] == "cdqn"] == "CounterfactualDQN")
+
+    def test_threads_per_worker(self, tmp_path):
+        """Test the number of threads per worker must be positive."""
+        with pytest.raises(ValueError, match="must be positive"):
+            run_experiments(grid(), tmp_path / "results.csv", threads_per_worker=0)
+
+    def test_load_grid(self):
+        """Test grids are loaded from a module and attribute."""
+        assert len(load_grid("tests.experiment.test_runner:grid")) == 5
+        with pytest.raises(ValueError, match="module:attribute"):
+            load_grid("tests.experiment.test_runner")
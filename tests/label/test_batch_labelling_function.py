@@ -0,0 +1,86 @@
+import pickle
+from enum import Enum
+
+import numpy as np
+import pytest
+
+from pycrm.label import LabellingFunction
+from tests.conftest import EnvProps
+
+
+class MixedLabellingFunction(LabellingFunction[np.ndarray, np.ndarray]):
+    """Labelling function with a batch event and a scalar event."""
+
+    @LabellingFunction.batch_event(EnvProps.EVENT_A)
+    def test_event_a(
+        self, obs: np.ndarray, action: np.ndarray, next_obs: np.ndarray
+    ) -> np.ndarray:
+        """Return where the first next observation feature is positive."""
+        return next_obs[:, 0] > 0
+
+    @LabellingFunction.event
+    def test_event_b(
+        self, obs: np.ndarray, action: np.ndarray, next_obs: np.ndarray
+    ) -> Enum | None:
+        """Return event B if the action is positive."""
+        if action[0] > 0:
+            return EnvProps.EVENT_B
+        return None
+
+
+@pytest.fixture
+def mixed_labelling_function() -> MixedLabellingFunction:
+    """Fixture for a labelling function with batch and scalar events."""
+    return MixedLabellingFunction()
+
+
+class TestBatchLabellingFunction:
+    """Test batched labelling of transitions."""
+
+    def test_batch(self, mixed_labelling_function: MixedLabellingFunction) -> None:
+        """Test batch labelling returns a bitmask per transition."""
+        obs = np.zeros((4, 2))
+        action = np.array([[0.0], [1.0], [0.0], [1.0]])
+        next_obs = np.array([[0.0, 0.0], [0.0, 0.0], [1.0, 0.0], [1.0, 0.0]])
+
+        masks = mixed_labelling_function.batch(obs, action, next_obs)
+
+        assert masks.shape == (4,)
+        assert masks.tolist() == [0b00, 0b10, 0b01, 0b11]
+
+    def test_batch_matches_scalar(
+        self, mixed_labelling_function: MixedLabellingFunction
+    ) -> None:
+        """Test batch labelling agrees with labelling transitions one at a time."""
+        rng = np.random.default_rng(0)
+        obs = rng.normal(size=(16, 2))
+        action = rng.normal(size=(16, 1))
+        next_obs = rng.normal(size=(16, 2))
+
+        masks = mixed_labelling_function.batch(obs, action, next_obs)
+
+        for i in range(16):
+            assert masks[i] == mixed_labelling_function.bitmask(
+                obs[i], action[i], next_obs[i]
+            )
+            events = mixed_labelling_function(obs[i], action[i], next_obs[i])
+            assert (EnvProps.EVENT_A in events) == bool(masks[i] & 0b01)
+            assert (EnvProps.EVENT_B in events) == bool(masks[i] & 0b10)
+
+    def test_batch_empty(
+        self, mixed_labelling_function: MixedLabellingFunction
+    ) -> None:
+        """Test batch labelling of zero transitions."""
+        masks = mixed_labelling_function.batch(
+            np.zeros((0, 2)), np.zeros((0, 1)), np.zeros((0, 2))
+        )
+        assert masks.shape == (0,)
+
+    def test_pickle(self, mixed_labelling_function: MixedLabellingFunction) -> None:
+        """Test labelling functions with batch events can be pickled after use."""
+        mixed_labelling_function(np.zeros(2), np.ones(1), np.ones(2))
+        lf = pickle.loads(pickle.dumps(mixed_labelling_function))
+        assert lf(np.zeros(2), np.ones(1), np.ones(2)) == {
+            EnvProps.EVENT_A,
+            EnvProps.EVENT_B,
+        }
@@ -0,0 +1,50 @@
+import numpy as np
+
+from pycrm.label import (
+    LabellingFunction,
+    bitmask_to_props,
+    prop_bits,
+    props_to_bitmask,
+)
+from tests.conftest import EnvProps
+
+
+class TestBitmask:
+    """Test the proposition bitmask representation."""
+
+    def test_prop_bits(self) -> None:
+        """Test bits are assigned in Enum definition order."""
+        assert prop_bits(EnvProps) == {EnvProps.EVENT_A: 1, EnvProps.EVENT_B: 2}
+
+    def test_round_trip(self) -> None:
+        """Test encoding and decoding propositions are inverse operations."""
+        for props in [set(), {EnvProps.EVENT_A}, {EnvProps.EVENT_A, EnvProps.EVENT_B}]:
+            mask = props_to_bitmask(props, EnvProps)
+            assert bitmask_to_props(mask, EnvProps) == props
+
+    def test_all_events_bitmask(
+        self, all_events_labelling_function: LabellingFunction
+    ) -> None:
+        """Test all events are encoded in the bitmask."""
+        mask = all_events_labelling_function.bitmask(
+            obs=np.zeros(1), action=np.zeros(1), next_obs=np.zeros(1)
+        )
+        assert mask == 0b11
+
+    def test_one_event_bitmask(
+        self, one_event_labelling_function: LabellingFunction
+    ) -> None:
+        """Test a single event is encoded in the bitmask."""
+        mask = one_event_labelling_function.bitmask(
+            obs=np.zeros(1), action=np.zeros(1), next_obs=np.zeros(1)
+        )
+        assert mask == 0b01
+
+    def test_no_events_bitmask(
+        self, no_events_labelling_function: LabellingFunction
+    ) -> None:
+        """Test no events produce an empty bitmask."""
+        mask = no_events_labelling_function.bitmask(
+            obs=np.zeros(1), action=np.zeros(1), next_obs=np.zeros(1)
+        )
+        assert mask == 0
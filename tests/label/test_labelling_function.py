@@ -1,3 +1,5 @@
+import pickle
+
 import numpy as np
 
 from pycrm.label import LabellingFunction
@@ -38,3 +40,40 @@ class TestLabellingFunction:
         assert len(events) == 1
         assert EnvProps.EVENT_A in events
         assert EnvProps.EVENT_B not in events
+
+    def test_event_methods_discovered_per_class(
+        self, all_events_labelling_function: LabellingFunction
+    ) -> None:
+        """Test event methods are discovered when the class is defined."""
+        assert type(all_events_labelling_function)._event_method_names == (
+            "test_event_a",
+            "test_event_b",
+        )
+
+    def test_event_methods_inherited(
+        self, one_event_labelling_function: LabellingFunction
+    ) -> None:
+        """Test subclasses inherit and extend the event methods of their parent."""
+
+        class ExtendedLabellingFunction(type(one_event_labelling_function)):
+            @LabellingFunction.event
+            def test_event_c(self, obs, action, next_obs) -> None:
+                """Return no event."""
+                return None
+
+            def helper(self) -> None:
+                """Non-event method."""
+
+        lf = ExtendedLabellingFunction()
+        assert lf._event_method_names == (
+            "test_event_a",
+            "test_event_b",
+            "test_event_c",
+        )
+        assert lf(np.zeros(1), np.zeros(1), np.zeros(1)) == {EnvProps.EVENT_A}
+
+    def test_pickle(self, one_event_labelling_function: LabellingFunction) -> None:
+        """Test labelling functions can be pickled after being called."""
+        one_event_labelling_function(np.zeros(1), np.zeros(1), np.zeros(1))
+        lf = pickle.loads(pickle.dumps(one_event_labelling_function))
+        assert lf(np.zeros(1), np.zeros(1), np.zeros(1)) == {EnvProps.EVENT_A}
@@ -0,0 +1,160 @@
+import numpy as np
+import pytest
+from gymnasium import spaces
+
+from pycrm.agents.sb3.buffer import CounterfactualReplayBuffer
+
+OBS_SPACE = spaces.Box(low=-np.inf, high=np.inf, shape=(3,), dtype=np.float32)
+
+
+def make_buffer(
+    buffer_size: int = 5, n_envs: int = 2, action_space: spaces.Space | None = None
+) -> CounterfactualReplayBuffer:
+    """Return an empty counterfactual replay buffer."""
+    return CounterfactualReplayBuffer(
+        buffer_size * n_envs,
+        OBS_SPACE,
+        action_space or spaces.Discrete(4),
+        device="cpu",
+        n_envs=n_envs,
+    )
+
+
+def make_block(k: int, n_envs: int = 2, offset: int = 0) -> dict[str, np.ndarray]:
+    """Return a block of K transitions with distinct values per row."""
+    rows = np.arange(offset, offset + k * n_envs, dtype=np.float32)
+    rows = rows.reshape(k, n_envs)
+    infos = np.empty((k, n_envs), dtype=object)
+    for i in range(k):
+        for j in range(n_envs):
+            infos[i, j] = {"TimeLimit.truncated": (i + j) % 2 == 0}
+    return {
+        "obs": np.repeat(rows[..., None], 3, axis=2),
+        "next_obs": np.repeat(rows[..., None], 3, axis=2) + 0.5,
+        "action": (rows % 4).astype(np.int64),
+        "reward": rows * 2,
+        "done": rows % 3 == 0,
+        "infos": infos,
+    }
+
+
+def assert_buffers_equal(
+    actual: CounterfactualReplayBuffer, expected: CounterfactualReplayBuffer
+) -> None:
+    """Assert two replay buffers hold the same transitions."""
+    assert actual.pos == expected.pos
+    assert actual.full == expected.full
+    for name in (
+        "observations",
+        "next_observations",
+        "actions",
+        "rewards",
+        "dones",
+        "timeouts",
+    ):
+        np.testing.assert_array_equal(getattr(actual, name), getattr(expected, name))
+
+
+def add_sequentially(buffer: CounterfactualReplayBuffer, block: dict) -> None:
+    """Insert a block one row at a time with the standard ``add``."""
+    for i in range(len(block["obs"])):
+        buffer.add(**{key: value[i] for key, value in block.items()})
+
+
+class TestCounterfactualReplayBuffer:
+    """Test bulk insertion into the counterfactual replay buffer."""
+
+    @pytest.mark.parametrize("sizes", [[3], [3, 4], [2, 2, 2, 2], [12], [5, 5]])
+    def test_extend_matches_add(self, sizes: list[int]) -> None:
+        """Test bulk insertion matches sequential insertion, including wrap-around."""
+        actual, expected = make_buffer(), make_buffer()
+
+        offset = 0
+        for k in sizes:
+            block = make_block(k, offset=offset)
+            actual.extend(**block)
+            add_sequentially(expected, block)
+            offset += k * 2
+
+        assert_buffers_equal(actual, expected)
+
+    def test_extend_continuous_actions(self) -> None:
+        """Test bulk insertion of multi-dimensional actions."""
+        action_space = spaces.Box(low=-1, high=1, shape=(2,), dtype=np.float32)
+        actual = make_buffer(action_space=action_space)
+        expected = make_buffer(action_space=action_space)
+        block = make_block(4)
+        block["action"] = np.stack([block["reward"], -block["reward"]], axis=2)
+
+        actual.extend(**block)
+        add_sequentially(expected, block)
+
+        assert_buffers_equal(actual, expected)
+
+    def test_extend_without_infos(self) -> None:
+        """Test transitions without info dicts are not treated as timeouts."""
+        buffer = make_buffer()
+        block = make_block(3)
+        del block["infos"]
+
+        buffer.extend(**block)
+
+        assert buffer.pos == 3
+        assert not buffer.timeouts.any()
+
+    def test_extend_empty(self) -> None:
+        """Test an empty block leaves the buffer unchanged."""
+        buffer = make_buffer()
+        block = make_block(0)
+
+        buffer.extend(**block)
+
+        assert buffer.pos == 0
+        assert not buffer.full
+
+    def test_optimize_memory_usage_rejected(self) -> None:
+        """Test memory optimisation is rejected."""
+        with pytest.raises(ValueError) as exc_info:
+            CounterfactualReplayBuffer(
+                10,
+                OBS_SPACE,
+                spaces.Discrete(4),
+                optimize_memory_usage=True,
+                handle_timeout_termination=False,
+            )
+        assert "does not support optimize_memory_usage" in str(exc_info.value)
+
+    def test_extend_rows_stores_every_transition(self) -> None:
+        """Test variable-length blocks are stored without padding or truncation."""
+        buffer = make_buffer(buffer_size=10, n_envs=3)
+        block = make_block(14, n_envs=1)
+        flat = {key: value[:, 0] for key, value in block.items()}
+
+        stored = [
+            buffer.extend_rows(**{key: value[i:j] for key, value in flat.items()})
+            for i, j in ((0, 4), (4, 5), (5, 12), (12, 14))
+        ]
+
+        assert stored == [3, 0, 9, 0]
+        assert buffer.n_generated == 14
+        assert buffer.n_stored == 12
+        assert buffer.pos == 4
+        np.testing.assert_array_equal(
+            buffer.observations[:4].reshape(12, 3), flat["obs"][:12]
+        )
+        np.testing.assert_array_equal(
+            buffer.actions[:4].reshape(12), flat["action"][:12]
+        )
+        np.testing.assert_array_equal(
+            buffer.timeouts[:4].reshape(12), [i % 2 == 0 for i in range(12)]
+        )
+
+    def test_extend_rows_single_env(self) -> None:
+        """Test every transition is stored immediately with a single environment."""
+        buffer = make_buffer(n_envs=1)
+        block = make_block(3, n_envs=1)
+        flat = {key: value[:, 0] for key, value in block.items()}
+
+        assert buffer.extend_rows(**flat) == 3
+        assert buffer.n_generated == buffer.n_stored == 3
+        np.testing.assert_array_equal(buffer.rewards[:3, 0], flat["reward"])
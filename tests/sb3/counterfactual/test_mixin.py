@@ -0,0 +1,190 @@
+from pathlib import Path
+
+import gymnasium as gym
+import numpy as np
+import pytest
+from stable_baselines3.common.buffers import ReplayBuffer
+from stable_baselines3.common.callbacks import CheckpointCallback
+
+from pycrm.agents.sb3.buffer import CounterfactualReplayBuffer
+from pycrm.agents.sb3.ddpg import CounterfactualDDPG
+from pycrm.agents.sb3.dqn import CounterfactualDQN
+from pycrm.agents.sb3.sac import CounterfactualSAC
+from pycrm.agents.sb3.td3 import CounterfactualTD3
+from pycrm.agents.sb3.wrapper import DispatchDummyVecEnv, DispatchSubprocVecEnv
+from tests.crossproduct.conftest import (
+    CRM,
+    DefaultCrossProduct,
+    Events,
+    GroundEnv,
+    LabelFunction,
+)
+
+
+def make_discrete_cross_product() -> DefaultCrossProduct:
+    """Return a cross product with a discrete action space."""
+    return make_cross_product(discrete=True)
+
+
+def make_cross_product(discrete: bool) -> DefaultCrossProduct:
+    """Return a cross product with a discrete or continuous action space."""
+    cross_product = DefaultCrossProduct(
+        ground_env=GroundEnv(),
+        machine=CRM(env_prop_enum=Events),
+        lf=LabelFunction(),
+        max_steps=10,
+    )
+    cross_product.observation_space = gym.spaces.Box(
+        low=-np.inf, high=np.inf, shape=(5,), dtype=np.float64
+    )
+    if discrete:
+        cross_product.action_space = gym.spaces.Discrete(2)
+    else:
+        cross_product.action_space = gym.spaces.Box(low=-1, high=1, shape=(1,))
+    return cross_product
+
+
+CounterfactualAgent = (
+    CounterfactualDQN | CounterfactualSAC | CounterfactualTD3 | CounterfactualDDPG
+)
+
+AGENTS = [
+    (CounterfactualDQN, True),
+    (CounterfactualSAC, False),
+    (CounterfactualTD3, False),
+    (CounterfactualDDPG, False),
+]
+
+
+class TestCounterfactualMixin:
+    """Test counterfactual rollouts shared by the SB3 agents."""
+
+    @pytest.mark.parametrize("agent_cls,discrete", AGENTS)
+    def test_counterfactual_rollouts(
+        self, agent_cls: type[CounterfactualAgent], discrete: bool
+    ) -> None:
+        """Test every generated counterfactual transition is stored."""
+        agent = agent_cls(
+            "MlpPolicy",
+            make_cross_product(discrete),
+            learning_starts=1000,
+            device="cpu",
+            seed=0,
+        )
+        agent.learn(total_timesteps=15)
+
+        assert isinstance(agent.replay_buffer, CounterfactualReplayBuffer)
+        assert agent.counterfactual_generated == agent.num_timesteps * 6
+        assert agent.counterfactual_stored == agent.counterfactual_generated
+        assert agent.replay_buffer.pos == agent.counterfactual_stored
+
+    @pytest.mark.parametrize("agent_cls,discrete", AGENTS)
+    def test_pipeline_opt_in(
+        self, agent_cls: type[CounterfactualAgent], discrete: bool
+    ) -> None:
+        """Test counterfactual generation is only pipelined when requested."""
+        env = make_cross_product(discrete)
+
+        assert not agent_cls("MlpPolicy", env).pipeline_counterfactuals
+        assert agent_cls(
+            "MlpPolicy", env, pipeline_counterfactuals=True
+        ).pipeline_counterfactuals
+
+    @pytest.mark.parametrize("agent_cls,discrete", AGENTS)
+    def test_standard_replay_buffer(
+        self, agent_cls: type[CounterfactualAgent], discrete: bool
+    ) -> None:
+        """Test counterfactual transitions are added to a standard replay buffer."""
+        agent = agent_cls(
+            "MlpPolicy",
+            make_cross_product(discrete),
+            learning_starts=1000,
+            replay_buffer_class=ReplayBuffer,
+            device="cpu",
+            seed=0,
+        )
+        agent.learn(total_timesteps=5)
+
+        assert type(agent.replay_buffer) is ReplayBuffer
+        assert agent.counterfactual_stored == agent.num_timesteps * 6
+        assert agent.replay_buffer.pos == agent.counterfactual_stored
+
+    @pytest.mark.parametrize("pipeline", [False, True])
+    def test_dispatch_subproc_vec_env(self, pipeline: bool) -> None:
+        """Test counterfactual experience generated by workers is stored."""
+        env = DispatchSubprocVecEnv([make_discrete_cross_product] * 2)
+        try:
+            agent = CounterfactualDQN(
+                "MlpPolicy",
+                env,
+                learning_starts=1000,
+                device="cpu",
+                seed=0,
+                pipeline_counterfactuals=pipeline,
+            )
+            agent.learn(total_timesteps=16)
+        finally:
+            env.close()
+
+        assert agent.counterfactual_generated == agent.num_timesteps * 6
+        assert agent.counterfactual_stored == agent.counterfactual_generated
+
+    @pytest.mark.parametrize("n_threads", [None, 2])
+    def test_dispatch_dummy_vec_env(self, n_threads: int | None) -> None:
+        """Test counterfactual experience generated in-process is stored."""
+        env = DispatchDummyVecEnv([make_discrete_cross_product] * 2, n_threads)
+        try:
+            agent = CounterfactualDQN(
+                "MlpPolicy", env, learning_starts=1000, device="cpu", seed=0
+            )
+            agent.learn(total_timesteps=16)
+        finally:
+            env.close()
+
+        assert agent.counterfactual_generated == agent.num_timesteps * 6
+        assert agent.counterfactual_stored == agent.counterfactual_generated
+
+    @pytest.mark.parametrize("n_threads", [None, 2])
+    def test_pipeline_learning_starts_zero(self, n_threads: int | None) -> None:
+        """Test pending experience is stored before training on an empty buffer."""
+        env = DispatchDummyVecEnv([make_discrete_cross_product] * 2, n_threads)
+        try:
+            agent = CounterfactualDQN(
+                "MlpPolicy",
+                env,
+                learning_starts=0,
+                train_freq=1,
+                batch_size=4,
+                device="cpu",
+                seed=0,
+                pipeline_counterfactuals=True,
+            )
+            agent.learn(total_timesteps=16)
+        finally:
+            env.close()
+
+        assert agent._n_updates > 0
+        assert agent.counterfactual_stored == agent.counterfactual_generated
+
+    def test_save_during_learn(self, tmp_path: Path) -> None:
+        """Test agents can be saved while counterfactual experience is pending."""
+        env = DispatchDummyVecEnv([make_discrete_cross_product] * 2, n_threads=2)
+        try:
+            agent = CounterfactualDQN(
+                "MlpPolicy",
+                env,
+                learning_starts=1000,
+                device="cpu",
+                seed=0,
+                pipeline_counterfactuals=True,
+            )
+            agent.learn(
+                total_timesteps=16,
+                callback=CheckpointCallback(save_freq=3, save_path=str(tmp_path)),
+            )
+        finally:
+            env.close()
+
+        assert len(list(tmp_path.glob("*.zip"))) == 2
+        loaded = CounterfactualDQN.load(next(tmp_path.glob("*.zip")), device="cpu")
+        assert loaded._pending_counterfactuals is None
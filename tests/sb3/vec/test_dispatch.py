@@ -1,7 +1,18 @@
+from multiprocessing.shared_memory import SharedMemory
+from typing import cast
+
 import gymnasium as gym
+import numpy as np
 import pytest
+from stable_baselines3.common.vec_env import DummyVecEnv
 
 from pycrm.agents.sb3.wrapper import DispatchSubprocVecEnv
+from pycrm.agents.sb3.wrapper.memory import (
+    SharedCounterfactualBatch,
+    counterfactual_layout,
+)
+from pycrm.agents.sb3.wrapper.step import CounterfactualStepWrapper
+from pycrm.crossproduct import CrossProduct
 
 
 def mock_env_callable() -> gym.Env:
@@ -51,3 +62,132 @@ def test_dispatched_env_method(dispatch_env: DispatchSubprocVecEnv):
     # Assert that the results are as expected
     assert len(results) == 3
     assert results == [2, 3, 4]
+
+
+def test_dispatch_async(dispatch_env: DispatchSubprocVecEnv):
+    """Test asynchronous dispatch returns a handle to the results."""
+    future = dispatch_env.dispatch_async("increment_number", (1, 2, 3))
+
+    # Further commands wait for the outstanding replies
+    assert dispatch_env.env_method("increment_number", 10) == [11, 11, 11]
+    assert future.done()
+    assert future.result() == [2, 3, 4]
+
+
+def cross_product_callable() -> gym.Env:
+    """Create a cross product environment."""
+    from tests.sb3.counterfactual.test_mixin import make_cross_product
+
+    return make_cross_product(discrete=True)
+
+
+@pytest.mark.parametrize(
+    "shared_memory,asynchronous", [(False, False), (True, False), (True, True)]
+)
+def test_step_counterfactual(shared_memory: bool, asynchronous: bool):
+    """Test fused steps match a step followed by counterfactual generation."""
+    fused_env = DispatchSubprocVecEnv(
+        env_fns=[cross_product_callable] * 2, shared_memory=shared_memory
+    )
+    env = DummyVecEnv(env_fns=[cross_product_callable] * 2)
+    cross_products = [cast(CrossProduct, e) for e in env.envs]
+    try:
+        last_obs = env.reset()
+        assert isinstance(last_obs, np.ndarray)
+        fused_env.reset()
+
+        for _ in range(12):
+            actions = np.array([0, 1])
+            if asynchronous:
+                obs, rewards, dones, infos, future = (
+                    fused_env.step_counterfactual_async(actions, actions)
+                )
+                counterfactuals = future.result()
+            else:
+                obs, rewards, dones, infos, counterfactuals = (
+                    fused_env.step_counterfactual(actions, actions)
+                )
+            expected_obs, expected_rewards, expected_dones, expected_infos = env.step(
+                actions
+            )
+            assert isinstance(expected_obs, np.ndarray)
+
+            obs_next = expected_obs.copy()
+            for i, done in enumerate(expected_dones):
+                if done:
+                    obs_next[i] = expected_infos[i]["terminal_observation"]
+            expected_counterfactuals = [
+                cross_product.generate_counterfactual_experience(
+                    cross_product.to_ground_obs(last_obs[i]),
+                    actions[i],
+                    cross_product.to_ground_obs(obs_next[i]),
+                )
+                for i, cross_product in enumerate(cross_products)
+            ]
+            last_obs = expected_obs
+
+            np.testing.assert_array_equal(obs, expected_obs)
+            np.testing.assert_array_equal(rewards, expected_rewards)
+            np.testing.assert_array_equal(dones, expected_dones)
+            assert [i.keys() for i in infos] == [i.keys() for i in expected_infos]
+            for actual, expected in zip(
+                counterfactuals, expected_counterfactuals, strict=True
+            ):
+                if shared_memory:
+                    assert actual[-1] is None
+                    actual, expected = actual[:-1], expected[:-1]
+                for a, e in zip(actual, expected, strict=True):
+                    np.testing.assert_array_equal(a, e)
+    finally:
+        fused_env.close()
+        env.close()
+
+
+def test_set_attr():
+    """Test attributes set on the vectorised env reach the cross products."""
+    env = DispatchSubprocVecEnv(env_fns=[cross_product_callable] * 2)
+    try:
+        env.set_attr("max_steps", 3)
+        assert env.get_attr("max_steps") == [3, 3]
+
+        env.reset()
+        dones = [env.step(np.array([0, 1]))[2] for _ in range(3)]
+        assert [d.tolist() for d in dones] == [[False, False]] * 2 + [[True, True]]
+    finally:
+        env.close()
+
+
+def test_shared_memory_overflow():
+    """Test batches larger than a shared memory slot are returned directly."""
+    env = CounterfactualStepWrapper(cross_product_callable())
+    env.reset()
+    capacity, obs_shape, obs_dtype = env.counterfactual_spec()
+    action = np.asarray(0)
+
+    for slot_capacity, expected_type in (
+        (capacity, SharedCounterfactualBatch),
+        (1, tuple),
+    ):
+        layout, size = counterfactual_layout(
+            2, slot_capacity, obs_shape, obs_dtype, action.shape, action.dtype.str
+        )
+        shared_memory = SharedMemory(create=True, size=size)
+        try:
+            env.attach_counterfactual_memory(shared_memory.name, layout)
+            *_, counterfactuals = env.step_counterfactual(action, action)
+            assert type(counterfactuals) is expected_type
+            env.close()
+        finally:
+            shared_memory.unlink()
+            shared_memory.close()
+
+
+@pytest.mark.parametrize("n_shared_memory_slots", [0, 1])
+def test_invalid_shared_memory_slots(n_shared_memory_slots: int):
+    """Test a shared memory ring needs a slot to read while the next is written."""
+    with pytest.raises(ValueError, match="n_shared_memory_slots"):
+        DispatchSubprocVecEnv(
+            env_fns=[cross_product_callable],
+            shared_memory=True,
+            n_shared_memory_slots=n_shared_memory_slots,
+        )
@@ -0,0 +1,119 @@
+from typing import cast
+
+import numpy as np
+import pytest
+from stable_baselines3.common.vec_env import DummyVecEnv
+
+from pycrm.agents.sb3.wrapper import DispatchDummyVecEnv
+from pycrm.crossproduct import CrossProduct
+from tests.sb3.vec.test_dispatch import cross_product_callable, mock_env_callable
+
+
+@pytest.mark.parametrize("n_threads", [None, 2])
+def test_dispatched_env_method(n_threads: int | None):
+    """Test method calls are dispatched with one argument set per environment."""
+    env = DispatchDummyVecEnv([mock_env_callable] * 3, n_threads=n_threads)
+    try:
+        assert env.dispatched_env_method("increment_number", (1, 2, 3)) == [2, 3, 4]
+
+        future = env.dispatch_async("increment_number", (4, 5, 6))
+        assert env.env_method("increment_number", 10) == [11, 11, 11]
+        assert future.result() == [5, 6, 7]
+    finally:
+        env.close()
+
+
+def test_invalid_n_threads():
+    """Test the thread pool needs at least one thread."""
+    with pytest.raises(ValueError, match="n_threads"):
+        DispatchDummyVecEnv([mock_env_callable], n_threads=0)
+
+
+@pytest.mark.parametrize(
+    "n_threads,asynchronous", [(None, False), (None, True), (2, False), (2, True)]
+)
+def test_step_counterfactual(n_threads: int | None, asynchronous: bool):
+    """Test fused steps match a step followed by counterfactual generation."""
+    fused_env = DispatchDummyVecEnv([cross_product_callable] * 2, n_threads=n_threads)
+    env = DummyVecEnv([cross_product_callable] * 2)
+    cross_products = [cast(CrossProduct, e) for e in env.envs]
+    try:
+        last_obs = env.reset()
+        assert isinstance(last_obs, np.ndarray)
+        np.testing.assert_array_equal(fused_env.reset(), last_obs)
+
+        for _ in range(12):
+            actions = np.array([0, 1])
+            if asynchronous:
+                obs, rewards, dones, infos, future = (
+                    fused_env.step_counterfactual_async(actions, actions)
+                )
+                counterfactuals = future.result()
+            else:
+                obs, rewards, dones, infos, counterfactuals = (
+                    fused_env.step_counterfactual(actions, actions)
+                )
+            expected_obs, expected_rewards, expected_dones, expected_infos = env.step(
+                actions
+            )
+            assert isinstance(expected_obs, np.ndarray)
+
+            obs_next = expected_obs.copy()
+            for i, done in enumerate(expected_dones):
+                if done:
+                    obs_next[i] = expected_infos[i]["terminal_observation"]
+            expected_counterfactuals = [
+                cross_product.generate_counterfactual_experience(
+                    cross_product.to_ground_obs(last_obs[i]),
+                    actions[i],
+                    cross_product.to_ground_obs(obs_next[i]),
+                )
+                for i, cross_product in enumerate(cross_products)
+            ]
+            last_obs = expected_obs
+
+            np.testing.assert_array_equal(obs, expected_obs)
+            np.testing.assert_array_equal(rewards, expected_rewards)
+            np.testing.assert_array_equal(dones, expected_dones)
+            assert [i.keys() for i in infos] == [i.keys() for i in expected_infos]
+            for actual, expected in zip(
+                counterfactuals, expected_counterfactuals, strict=True
+            ):
+                for a, e in zip(actual[:-1], expected[:-1], strict=True):
+                    np.testing.assert_array_equal(a, e)
+    finally:
+        fused_env.close()
+        env.close()
+
+
+def test_step():
+    """Test plain steps match those of a DummyVecEnv."""
+    fused_env = DispatchDummyVecEnv([cross_product_callable] * 2, n_threads=2)
+    env = DummyVecEnv([cross_product_callable] * 2)
+    try:
+        np.testing.assert_array_equal(fused_env.reset(), env.reset())
+        for _ in range(12):
+            actions = np.array([1, 0])
+            obs, rewards, dones, infos = fused_env.step(actions)
+            expected_obs, expected_rewards, expected_dones, expected_infos = env.step(
+                actions
+            )
+
+            np.testing.assert_array_equal(obs, expected_obs)
+            np.testing.assert_array_equal(rewards, expected_rewards)
+            np.testing.assert_array_equal(dones, expected_dones)
+            assert [i.keys() for i in infos] == [i.keys() for i in expected_infos]
+    finally:
+        fused_env.close()
+        env.close()
+
+
+def test_set_attr():
+    """Test attributes set on the vectorised env reach the cross products."""
+    env = DispatchDummyVecEnv([cross_product_callable] * 2)
+    try:
+        env.set_attr("max_steps", 3, indices=[1])
+        assert env.get_attr("max_steps") == [10, 3]
+        assert [e.unwrapped.max_steps for e in env.envs] == [10, 3]  # type: ignore
+    finally:
+        env.close()